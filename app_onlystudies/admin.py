@@ -1,6 +1,17 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.forms.models import BaseInlineFormSet
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
 from django.utils.html import format_html
+from django.views.decorators.http import require_POST
+from .exports import ExportMixin
 from .models import Category, SubCategory, BlogPost, Notification, ForumQuestion, ForumAnswer, Task, Appointment
+from .pagination import EstimatedCountPaginator
 
 
 class SubCategoryInline(admin.TabularInline):
@@ -21,6 +32,7 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     inlines = [SubCategoryInline]
     search_fields = ('name', 'description')
+    show_full_result_count = False
 
 
 @admin.register(SubCategory)
@@ -30,17 +42,34 @@ class SubCategoryAdmin(admin.ModelAdmin):
     """
     list_display = ('name', 'category', 'slug', 'created_at')
     list_filter = ('category',)
+    list_select_related = ('category',)
+    autocomplete_fields = ('category',)
+    show_full_result_count = False
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name', 'category__name')
 
+    def get_queryset(self, request):
+        """
+        Fetch the category __str__ shows with each subcategory
+        """
+        return super().get_queryset(request).select_related('category')
+
 
 @admin.register(BlogPost)
-class BlogPostAdmin(admin.ModelAdmin):
+class BlogPostAdmin(ExportMixin, admin.ModelAdmin):
     """
     Admin for BlogPost model
     """
     list_display = ('title', 'author', 'category', 'image_preview', 'is_published', 'created_at')
     list_filter = ('is_published', 'category', 'created_at')
+    list_select_related = ('author', 'category')
+    autocomplete_fields = ('author', 'category')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    export_fields = (
+        'id', 'title', 'slug', 'author__username', 'category__name',
+        'is_published', 'featured_image', 'created_at', 'updated_at',
+    )
     prepopulated_fields = {'slug': ('title',)}
     search_fields = ('title', 'content', 'author__username')
     readonly_fields = ('created_at', 'updated_at', 'image_preview_large')
@@ -51,83 +80,32 @@ class BlogPostAdmin(admin.ModelAdmin):
         """
         Display image preview in list view
         """
-        try:
-            if not obj.featured_image:
-                return '—'
-            
-            # Get the URL - handle both ImageField and direct URL strings
-            img_str = str(obj.featured_image)
-            
-            # Check if it's already a full URL (starts with http/https)
-            if img_str.startswith(('http://', 'https://')):
-                img_url = img_str
-            elif hasattr(obj.featured_image, 'url'):
-                # It's an ImageField, get the URL
-                img_url = obj.featured_image.url
-            else:
-                img_url = img_str
-            
-            if img_url and img_url.strip() and not img_url.startswith('/media/http'):
-                return format_html(
-                    '<img src="{}" width="50" height="50" style="object-fit: cover; border-radius: 4px;" />',
-                    img_url
-                )
-        except Exception:
-            pass
-        return '—'
+        img_url = obj.featured_image_url
+        if not img_url:
+            return '—'
+        return format_html(
+            '<img src="{}" width="50" height="50" style="object-fit: cover; border-radius: 4px;" />',
+            img_url
+        )
     image_preview.short_description = 'Image'
     
     def image_preview_large(self, obj):
         """
         Display large image preview in detail view
         """
-        try:
-            if not obj.featured_image:
-                return format_html(
-                    '<div style="padding: 10px; background-color: #f9f9f9; border-radius: 4px; border: 1px dashed #ccc;">'
-                    '<p style="margin: 0; color: #999;">No image uploaded yet</p>'
-                    '</div>'
-                )
-            
-            # Get the URL - handle both ImageField and direct URL strings
-            img_str = str(obj.featured_image)
-            
-            # Check if it's already a full URL (starts with http/https)
-            if img_str.startswith(('http://', 'https://')):
-                img_url = img_str
-            elif hasattr(obj.featured_image, 'url'):
-                # It's an ImageField, try to get URL but fallback to string
-                try:
-                    url_value = obj.featured_image.url
-                    # Check if Django mangled it by adding /media/
-                    if url_value.startswith('/media/http'):
-                        img_url = img_str  # Use original string
-                    else:
-                        img_url = url_value
-                except:
-                    img_url = img_str
-            else:
-                img_url = img_str
-            
-            if img_url and img_url.strip():
-                return format_html(
-                    '<div style="margin: 10px 0;">'
-                    '<img src="{}" style="max-width: 400px; max-height: 300px; object-fit: cover; border-radius: 4px; border: 1px solid #ddd; padding: 8px;" onerror="this.style.display=\'none\';this.nextElementSibling.style.display=\'block\';" />'
-                    '<p style="display: none; margin: 10px 0; padding: 10px; background: #fff3cd; border-radius: 4px; color: #856404;">Image failed to load. Check URL.</p>'
-                    '</div>',
-                    img_url
-                )
-        except Exception as e:
+        img_url = obj.featured_image_url if obj else ''
+        if not img_url:
             return format_html(
-                '<div style="padding: 10px; background-color: #fff3cd; border: 1px solid #ffc107; border-radius: 4px;">'
-                '<p style="margin: 0; color: #856404;">Error loading image preview</p>'
+                '<div style="padding: 10px; background-color: #f9f9f9; border-radius: 4px; border: 1px dashed #ccc;">'
+                '<p style="margin: 0; color: #999;">No image uploaded yet</p>'
                 '</div>'
             )
-        
         return format_html(
-            '<div style="padding: 10px; background-color: #f9f9f9; border-radius: 4px; border: 1px dashed #ccc;">'
-            '<p style="margin: 0; color: #999;">No image uploaded yet</p>'
-            '</div>'
+            '<div style="margin: 10px 0;">'
+            '<img src="{}" style="max-width: 400px; max-height: 300px; object-fit: cover; border-radius: 4px; border: 1px solid #ddd; padding: 8px;" onerror="this.style.display=\'none\';this.nextElementSibling.style.display=\'block\';" />'
+            '<p style="display: none; margin: 10px 0; padding: 10px; background: #fff3cd; border-radius: 4px; color: #856404;">Image failed to load. Check URL.</p>'
+            '</div>',
+            img_url
         )
     image_preview_large.short_description = 'Image Preview'
     
@@ -142,12 +120,20 @@ class BlogPostAdmin(admin.ModelAdmin):
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(ExportMixin, admin.ModelAdmin):
     """
     Admin for Notification model
     """
     list_display = ('user', 'title', 'notification_type', 'is_read', 'created_at')
     list_filter = ('notification_type', 'is_read', 'created_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    export_fields = (
+        'id', 'user__username', 'title', 'message',
+        'notification_type', 'is_read', 'related_url', 'created_at',
+    )
     search_fields = ('user__username', 'title', 'message')
     fieldsets = (
         ('Notification Details', {
@@ -166,23 +152,76 @@ class NotificationAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
 
 
+# Answers editable in the question change form; the rest are loaded on demand
+ANSWERS_PER_PAGE = 20
+ANSWERS_MAX_PAGE = 100
+# Pages of answers in the admin follow creation order, which accepting an answer does not change
+ANSWER_ORDERING = ('created_at', 'pk')
+
+
+class FirstAnswersFormSet(BaseInlineFormSet):
+    """
+    Inline formset over the first ANSWERS_PER_PAGE answers of a question, so
+    the change form of a large thread renders and validates one page of rows.
+    A submitted form binds to the answers it was rendered with, whatever the
+    first page holds by then.
+    """
+    per_page = ANSWERS_PER_PAGE
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset().order_by(*ANSWER_ORDERING)
+            if self.is_bound:
+                pk_name = self.model._meta.pk.name
+                submitted = (
+                    self.data.get(f'{self.add_prefix(i)}-{pk_name}', '') for i in range(self.initial_form_count())
+                )
+                queryset = queryset.filter(pk__in=[pk for pk in submitted if pk.isdigit()])
+            self._queryset = queryset[:self.per_page]
+        return self._queryset
+
+    @cached_property
+    def has_more(self):
+        """True if the question has answers beyond the first page"""
+        if self.instance.pk is None or len(self.get_queryset()) < self.per_page:
+            return False
+        return self.model._default_manager.filter(question=self.instance)[self.per_page:].exists()
+
+
 class ForumAnswerInline(admin.TabularInline):
     """
-    Inline admin for forum answers
+    Inline admin for forum answers; further answers load through
+    ForumQuestionAdmin.answers_view
     """
     model = ForumAnswer
+    formset = FirstAnswersFormSet
+    template = 'admin/app_onlystudies/forumanswer_inline.html'
     extra = 0
     readonly_fields = ('author', 'created_at')
     fields = ('author', 'content', 'is_accepted', 'created_at')
 
+    def get_queryset(self, request):
+        """
+        Fetch what __str__ shows with the answers
+        """
+        return super().get_queryset(request).select_related('author', 'question')
+
 
 @admin.register(ForumQuestion)
-class ForumQuestionAdmin(admin.ModelAdmin):
+class ForumQuestionAdmin(ExportMixin, admin.ModelAdmin):
     """
     Admin for ForumQuestion model
     """
     list_display = ('title', 'author', 'category', 'is_answered', 'views', 'created_at')
     list_filter = ('is_answered', 'category', 'created_at')
+    list_select_related = ('author', 'category')
+    autocomplete_fields = ('author', 'category')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    export_fields = (
+        'id', 'title', 'slug', 'author__username', 'category__name',
+        'is_answered', 'views', 'created_at', 'updated_at',
+    )
     search_fields = ('title', 'content', 'author__username')
     readonly_fields = ('slug', 'views', 'created_at', 'updated_at')
     inlines = [ForumAnswerInline]
@@ -203,16 +242,105 @@ class ForumQuestionAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_urls(self):
+        """
+        Add the JSON views behind "load more" of the answers inline
+        """
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                '<path:object_id>/answers/',
+                self.admin_site.admin_view(self.answers_view),
+                name='%s_%s_answers' % info,
+            ),
+            path(
+                '<path:object_id>/answers/<int:answer_id>/accept/',
+                self.admin_site.admin_view(require_POST(self.accept_answer_view)),
+                name='%s_%s_accept_answer' % info,
+            ),
+        ] + super().get_urls()
+
+    def get_question(self, request, object_id):
+        question = self.get_object(request, object_id)
+        if question is None:
+            raise Http404
+        if not self.has_view_or_change_permission(request, question):
+            raise PermissionDenied
+        return question
+
+    def answers_view(self, request, object_id):
+        """
+        A page of answers to the question, after the first `offset`:
+        ?offset=20&limit=20
+        """
+        question = self.get_question(request, object_id)
+        try:
+            offset = max(int(request.GET.get('offset', ANSWERS_PER_PAGE)), 0)
+            limit = min(max(int(request.GET.get('limit', ANSWERS_PER_PAGE)), 1), ANSWERS_MAX_PAGE)
+        except ValueError:
+            return JsonResponse({'error': 'offset and limit must be integers'}, status=400)
+        answers = list(
+            ForumAnswer.objects.filter(question=question).select_related('author')
+            .order_by(*ANSWER_ORDERING)[offset:offset + limit + 1]
+        )
+        can_change = self.has_change_permission(request, question)
+        return JsonResponse({
+            'answers': [
+                {
+                    'id': answer.pk,
+                    'author': answer.author.username,
+                    'content': answer.content,
+                    'is_accepted': answer.is_accepted,
+                    'created_at': answer.created_at.isoformat(),
+                    'change_url': reverse('admin:app_onlystudies_forumanswer_change', args=[answer.pk]),
+                    'accept_url': reverse(
+                        'admin:app_onlystudies_forumquestion_accept_answer', args=[question.pk, answer.pk],
+                    ) if can_change else None,
+                }
+                for answer in answers[:limit]
+            ],
+            'next_offset': offset + limit if len(answers) > limit else None,
+        })
+
+    def accept_answer_view(self, request, object_id, answer_id):
+        """
+        Set is_accepted of one answer from the posted `is_accepted` ("true"/"false")
+        """
+        question = self.get_question(request, object_id)
+        if not self.has_change_permission(request, question):
+            raise PermissionDenied
+        answer = get_object_or_404(ForumAnswer, pk=answer_id, question=question)
+        is_accepted = request.POST.get('is_accepted') == 'true'
+        if answer.is_accepted != is_accepted:
+            answer.is_accepted = is_accepted
+            answer.save(update_fields=['is_accepted', 'updated_at'])
+            self.log_change(request, answer, [{'changed': {'fields': ['is_accepted']}}])
+        return JsonResponse({'id': answer.pk, 'is_accepted': answer.is_accepted})
+
 
 @admin.register(ForumAnswer)
-class ForumAnswerAdmin(admin.ModelAdmin):
+class ForumAnswerAdmin(ExportMixin, admin.ModelAdmin):
     """
     Admin for ForumAnswer model
     """
     list_display = ('question', 'author', 'is_accepted', 'created_at')
     list_filter = ('is_accepted', 'created_at')
+    list_select_related = ('question', 'author')
+    autocomplete_fields = ('question', 'author')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    export_fields = (
+        'id', 'question_id', 'question__title', 'author__username',
+        'is_accepted', 'content', 'created_at', 'updated_at',
+    )
     search_fields = ('content', 'author__username', 'question__title')
     readonly_fields = ('created_at', 'updated_at')
+
+    def get_queryset(self, request):
+        """
+        Fetch what __str__ shows with each answer
+        """
+        return super().get_queryset(request).select_related('author', 'question')
     
     fieldsets = (
         ('Answer Information', {
@@ -229,26 +357,55 @@ class ForumAnswerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(ExportMixin, admin.ModelAdmin):
     """
     Admin for Task model
     """
     list_display = ('title', 'created_by', 'category', 'priority', 'due_date', 'created_at')
     list_filter = ('priority', 'category', 'due_date', 'created_at')
+    list_select_related = ('created_by', 'category')
+    autocomplete_fields = ('created_by', 'category')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    export_fields = (
+        'id', 'title', 'description', 'category__name', 'priority',
+        'due_date', 'created_by__username', 'created_at', 'updated_at',
+    )
     search_fields = ('title', 'description', 'created_by__username')
     readonly_fields = ('created_at',)
     fields = ('title', 'description', 'category', 'priority', 'due_date', 'created_by')
 
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(ExportMixin, admin.ModelAdmin):
     """
     Admin for Appointment model
     """
-    list_display = ('title', 'created_by', 'appointment_datetime', 'created_at')
+    list_display = ('title', 'created_by', 'appointment_datetime', 'end_datetime', 'created_at')
     list_filter = ('appointment_datetime', 'created_at')
+    list_select_related = ('created_by',)
+    autocomplete_fields = ('created_by',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    export_fields = (
+        'id', 'title', 'notes', 'appointment_datetime',
+        'duration_minutes', 'end_datetime', 'created_by__username',
+        'created_at',
+    )
     search_fields = ('title', 'notes', 'created_by__username')
-    readonly_fields = ('created_at',)
-    fields = ('title', 'notes', 'appointment_datetime', 'created_by')
+    readonly_fields = ('end_datetime', 'created_at')
+    fields = ('title', 'notes', 'appointment_datetime', 'duration_minutes', 'end_datetime', 'created_by')
+
 
+admin.site.unregister(User)
 
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    """
+    Admin for User model, also serving the user autocomplete of the other admins
+    """
+    search_fields = ('username', 'first_name', 'last_name', 'email')
+    ordering = ('username',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
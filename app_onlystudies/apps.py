@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppOnlystudiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_onlystudies'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .taxonomy import get_taxonomy
+
+
+def taxonomy(request):
+    """
+    Expose the cached category tree to every template as `nav_categories`
+    Lazy, so pages that never render the navbar do not even read the cache.
+    """
+    return {'nav_categories': SimpleLazyObject(lambda: get_taxonomy().categories)}
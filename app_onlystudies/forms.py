@@ -2,7 +2,9 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from .models import ForumQuestion, ForumAnswer, Appointment, BlogPost, Task
+from .models import (
+    ForumQuestion, ForumAnswer, Appointment, BlogPost, Task, MAX_APPOINTMENT_MINUTES, MIN_APPOINTMENT_MINUTES,
+)
 
 
 class SignUpForm(forms.ModelForm):
@@ -164,10 +166,16 @@ class ForumAnswerForm(forms.ModelForm):
 class AppointmentForm(forms.ModelForm):
     """
     Form for booking appointments/events/services at a specific date and time.
+    Duration bounds and overlaps are checked by Appointment.clean().
     """
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None and self.instance.created_by_id is None:
+            self.instance.created_by = user
+
     class Meta:
         model = Appointment
-        fields = ('title', 'notes', 'appointment_datetime')
+        fields = ('title', 'notes', 'appointment_datetime', 'duration_minutes')
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -183,6 +191,12 @@ class AppointmentForm(forms.ModelForm):
                 'class': 'form-control',
                 'type': 'datetime-local',
                 'required': True
+            }),
+            'duration_minutes': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': MIN_APPOINTMENT_MINUTES,
+                'max': MAX_APPOINTMENT_MINUTES,
+                'step': 5,
             })
         }
 
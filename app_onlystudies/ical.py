@@ -0,0 +1,147 @@
+"""
+Minimal iCalendar (RFC 5545) serialisation for tasks and appointments.
+
+Only the handful of properties calendar clients need are emitted, and every
+component is produced line by line so a feed can be streamed straight from a
+queryset iterator.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.utils import timezone
+
+from .models import CalendarFeedKey
+
+PRODID = '-//OnlyStudies//Calendar Feed//EN'
+FEED_TOKEN_SALT = 'app_onlystudies.calendar-feed'
+
+
+def make_feed_token(user):
+    """
+    Return the signed token identifying a user's calendar feed. It carries
+    the user's CalendarFeedKey version, so rotating the key revokes it.
+    """
+    return signing.Signer(salt=FEED_TOKEN_SALT).sign(f'{user.pk}.{CalendarFeedKey.version_for(user.pk)}')
+
+
+def read_feed_token(token):
+    """
+    Return the user id encoded in a feed token, or None if it is invalid or
+    revoked. Tokens from before versioning (the bare user id) count as
+    version 0, so they work until the user first rotates their key.
+    """
+    try:
+        user_id, _, version = signing.Signer(salt=FEED_TOKEN_SALT).unsign(token).partition('.')
+        user_id, version = int(user_id), int(version or 0)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if version != CalendarFeedKey.version_for(user_id):
+        return None
+    return user_id
+
+
+def escape_text(value):
+    """Escape a TEXT property value"""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def format_datetime(value):
+    """Format an aware datetime as a UTC DATE-TIME value"""
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold_line(line):
+    """Fold a content line to 75 octets as required by RFC 5545"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _component(name, properties):
+    yield fold_line(f'BEGIN:{name}')
+    for key, value in properties:
+        yield fold_line(f'{key}:{value}')
+    yield fold_line(f'END:{name}')
+
+
+def appointment_event(appointment, host):
+    """Yield the lines of a VEVENT for an appointment"""
+    properties = [
+        ('UID', f'appointment-{appointment.pk}@{host}'),
+        ('DTSTAMP', format_datetime(appointment.updated_at)),
+        ('DTSTART', format_datetime(appointment.appointment_datetime)),
+        ('DTEND', format_datetime(appointment.end_datetime)),
+        ('SUMMARY', escape_text(appointment.title)),
+    ]
+    if appointment.notes:
+        properties.append(('DESCRIPTION', escape_text(appointment.notes)))
+    properties.append(('LAST-MODIFIED', format_datetime(appointment.updated_at)))
+    return _component('VEVENT', properties)
+
+
+def task_todo(task, host):
+    """Yield the lines of a VTODO for a task with a due date"""
+    properties = [
+        ('UID', f'task-{task.pk}@{host}'),
+        ('DTSTAMP', format_datetime(task.updated_at)),
+        ('DUE', format_datetime(task.due_date)),
+        ('SUMMARY', escape_text(task.title)),
+        ('PRIORITY', {'high': 1, 'medium': 5, 'low': 9}.get(task.priority, 0)),
+    ]
+    if task.description:
+        properties.append(('DESCRIPTION', escape_text(task.description)))
+    if task.category_id:
+        properties.append(('CATEGORIES', escape_text(task.category.name)))
+    properties.append(('LAST-MODIFIED', format_datetime(task.updated_at)))
+    return _component('VTODO', properties)
+
+
+def iter_calendar(appointments, tasks, host, name='OnlyStudies'):
+    """
+    Yield a complete VCALENDAR, one content line at a time.
+    `appointments` and `tasks` may be any iterables, typically queryset iterators.
+    """
+    yield fold_line('BEGIN:VCALENDAR')
+    yield fold_line('VERSION:2.0')
+    yield fold_line(f'PRODID:{PRODID}')
+    yield fold_line('CALSCALE:GREGORIAN')
+    yield fold_line(f'X-WR-CALNAME:{escape_text(name)}')
+    yield fold_line('X-PUBLISHED-TTL:PT15M')
+    for appointment in appointments:
+        yield from appointment_event(appointment, host)
+    for task in tasks:
+        yield from task_todo(task, host)
+    yield fold_line('END:VCALENDAR')
+
+
+def feed_window(now=None, past_days=30, future_days=365):
+    """
+    Return the (start, end) datetimes a feed covers.
+    Bounds are aligned to midnight so the window, and therefore the ETag, stays
+    stable for a whole day.
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (
+        today - timedelta(days=past_days),
+        today + timedelta(days=future_days + 1),
+    )
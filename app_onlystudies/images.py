@@ -0,0 +1,394 @@
+"""
+Responsive derivatives of blog featured images.
+
+Every uploaded featured image gets downscaled copies at fixed width buckets,
+stored next to the original:
+
+    blog/heroimage.png
+    blog/variants/heroimage/320w.png
+    blog/variants/heroimage/640w.png
+    ...
+
+and a manifest of them in BlogPost.image_variants:
+
+    {"source": "blog/heroimage.png", "width": 1600, "height": 900, "format": "png",
+     "variants": {"png": [[320, "blog/variants/heroimage/320w.png"], ...]}}
+
+"format" names the variants in the original's format, which the fallback
+<img> offers (the database may not keep the keys of "variants" in order).
+
+Besides copies in the original format, every width (and the full size) is
+also encoded as AVIF and WebP when Pillow supports them:
+
+     "variants": {"png": [...], "avif": [[320, ".../320w.avif"], ..., [1600, ".../1600w.avif"]],
+                  "webp": [...]}
+
+Templates turn the manifest into a <picture> with one <source> per modern
+format plus srcset/sizes on the fallback <img> (see templatetags/image_tags.py),
+so browsers download the smallest copy in the best format they accept. Only
+widths smaller than the original are produced. Images given as absolute URLs
+(Cloudinary links pasted into the field) are left alone.
+
+The manifest also carries a placeholder: the image shrunk to 16px wide and
+inlined as a data: URI (a few hundred bytes),
+
+     "placeholder": "data:image/jpeg;base64,/9j/4AAQ..."
+
+which templates paint as the background of the <img>, sized by its intrinsic
+width and height, so cards show a preview of the right shape before (or
+instead of) the lazy image request.
+
+Static images get the same treatment without resizing: `manage.py
+convert_static_images` writes .avif/.webp siblings next to each PNG/JPEG,
+which the {% static_sources %} tag offers when they exist.
+
+Variants of a new upload are made once its transaction commits, on a
+background thread of the web process (IMAGE_VARIANT_WORKERS threads; 0
+encodes in the committing thread instead), so saving a post never waits
+for AVIF/WebP encodes. Until they are done, and if the process stops
+before they are, pages show the plain image: templates ignore manifests of
+another image (post_manifest). `manage.py generate_image_variants` fills
+in whatever is missing and makes variants of existing posts, spreading the
+work over a process pool.
+"""
+
+import base64
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from .storage import media_url
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 480, 640, 960, 1280)
+VARIANT_DIR = 'variants'
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_OPTIONS = {'quality': 40, 'optimize': True}
+
+# Source format -> (Pillow format, extension, save options); GIFs become PNGs
+OUTPUT_FORMATS = {
+    'JPEG': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'PNG': ('PNG', 'png', {'optimize': True}),
+    'GIF': ('PNG', 'png', {'optimize': True}),
+    'WEBP': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+}
+DEFAULT_FORMAT = OUTPUT_FORMATS['PNG']
+
+# Formats offered ahead of the original, best compression first
+MODERN_FORMATS = tuple(
+    (extension, pillow_format, options)
+    for extension, pillow_format, options in (
+        ('avif', 'AVIF', {'quality': 55, 'speed': 6}),
+        ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    )
+    if features.check(pillow_format.lower())
+)
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'png': 'image/png', 'jpg': 'image/jpeg'}
+
+
+def is_remote(name):
+    """True if the image field holds an absolute URL instead of a storage name"""
+    return name.startswith(('http://', 'https://'))
+
+
+def variant_name(name, width, extension):
+    """Storage name of the `width` variant of `name`"""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, VARIANT_DIR, stem, f'{width}w.{extension}')
+
+
+def save_image(storage, name, image, pillow_format, options):
+    """Encode `image` and store it under exactly `name`, replacing an older copy"""
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def open_image(stream):
+    """Decode an image upright and in a mode every encoder accepts; returns (image, source format)"""
+    image = Image.open(stream)
+    source_format = image.format
+    image = ImageOps.exif_transpose(image)
+    if image.mode == 'P':
+        # Resample in full colour, then let the encoder pick the palette again
+        image = image.convert('RGBA')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image, source_format
+
+
+def make_placeholder(image):
+    """Tiny JPEG preview of `image` as a data: URI, flattened onto white"""
+    preview = image.copy()
+    preview.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4), Image.LANCZOS)
+    if preview.mode == 'RGBA':
+        background = Image.new('RGB', preview.size, 'white')
+        background.paste(preview, mask=preview.getchannel('A'))
+        preview = background
+    buffer = io.BytesIO()
+    preview.convert('RGB').save(buffer, 'JPEG', **PLACEHOLDER_OPTIONS)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def generate_variants(name, storage=None, widths=VARIANT_WIDTHS):
+    """Create the width and format variants of the image stored as `name`; returns its manifest"""
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as stream:
+        image, source_format = open_image(stream)
+    pillow_format, extension, options = OUTPUT_FORMATS.get(source_format, DEFAULT_FORMAT)
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    formats = [(extension, pillow_format, options)]
+    formats += [modern for modern in MODERN_FORMATS if modern[0] != extension]
+
+    variants = {fmt[0]: [] for fmt in formats}
+    for width in sorted(set(widths) | {image.width}):
+        if width > image.width:
+            break
+        if width == image.width:
+            resized = image
+        else:
+            resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        for variant_extension, variant_format, variant_options in formats:
+            if width == image.width and variant_extension == extension:
+                # The original itself serves this one
+                continue
+            stored = save_image(
+                storage, variant_name(name, width, variant_extension), resized, variant_format, variant_options,
+            )
+            variants[variant_extension].append([width, stored])
+    return {
+        'source': name,
+        'width': image.width,
+        'height': image.height,
+        'placeholder': make_placeholder(image),
+        'format': extension,
+        'variants': variants,
+    }
+
+
+def convert_static_image(path):
+    """
+    Write .avif/.webp siblings of the static image at `path` unless they are
+    up to date; returns the paths written
+    """
+    written = []
+    source_mtime = path.stat().st_mtime_ns
+    image = None
+    for extension, pillow_format, options in MODERN_FORMATS:
+        target = path.with_suffix(f'.{extension}')
+        if target.exists() and target.stat().st_mtime_ns >= source_mtime:
+            continue
+        if image is None:
+            with open(path, 'rb') as stream:
+                image = open_image(stream)[0]
+        image.save(target, pillow_format, **options)
+        written.append(target)
+    return written
+
+
+def delete_variants(manifest, storage=None):
+    """Delete the files listed in `manifest`"""
+    storage = storage or default_storage
+    for variants in manifest.get('variants', {}).values():
+        for width, name in variants:
+            storage.delete(name)
+
+
+def delete_unused_variants(manifest, others, storage=None):
+    """Delete the files listed in `manifest` unless a post in `others` still shows its source"""
+    if manifest and not others.filter(featured_image=manifest['source']).exists():
+        delete_variants(manifest, storage)
+
+
+def post_manifest(post):
+    """
+    post.image_variants if it describes the image the post shows now, else {}
+    (the field was rewritten without a save, e.g. by a bulk update)
+    """
+    manifest = post.image_variants or {}
+    if manifest.get('source', '') != (post.featured_image.name or ''):
+        return {}
+    return manifest
+
+
+def with_placeholder(manifest, storage=None):
+    """
+    `manifest` with a placeholder (and the intrinsic size) added, decoding
+    only the source image; an unreadable source gets an empty placeholder
+    """
+    storage = storage or default_storage
+    try:
+        with storage.open(manifest['source'], 'rb') as stream:
+            image = open_image(stream)[0]
+    except (OSError, Image.UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning('Could not create a placeholder for %s: %s', manifest['source'], e)
+        return {**manifest, 'placeholder': ''}
+    return {**manifest, 'width': image.width, 'height': image.height, 'placeholder': make_placeholder(image)}
+
+
+def has_placeholder(manifest):
+    """False for manifests of local images made before placeholders existed"""
+    return 'placeholder' in manifest or 'width' not in manifest
+
+
+def is_current(manifest, name):
+    """True if `manifest` describes the image `name` in every format this Pillow can write"""
+    manifest = manifest or {}
+    if manifest.get('source', '') != (name or ''):
+        return False
+    if 'width' not in manifest:
+        # Remote or unreadable: nothing to add
+        return True
+    variants = manifest.get('variants', {})
+    return all(extension in variants for extension, pillow_format, options in MODERN_FORMATS)
+
+
+def variants_for(name, storage=None):
+    """
+    Manifest for the image `name`. Remote and unreadable images get one
+    without variants, so they are not retried on every save.
+    """
+    if not name:
+        return {}
+    if is_remote(name):
+        return {'source': name}
+    try:
+        return generate_variants(name, storage)
+    except (OSError, Image.UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning('Could not create variants of %s: %s', name, e)
+        return {'source': name}
+
+
+def init_worker():
+    """
+    Set up a process of an image pool (generate_image_variants): pool
+    workers resize images only and never touch the database
+    """
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def process_job(job):
+    """Manifest for one (name, manifest) job: a placeholder added to `manifest` if given, else new variants"""
+    name, manifest = job
+    return with_placeholder(manifest) if manifest else variants_for(name)
+
+
+def refresh_image_variants(post, storage=None):
+    """
+    Bring post.image_variants in line with post.featured_image, creating
+    variants of a new image and deleting those of the image it replaced
+    (unless another post still shows it). Returns True if the manifest changed.
+    """
+    name = post.featured_image.name or ''
+    current = post.image_variants or {}
+    if current.get('source', '') == name:
+        return False
+    delete_unused_variants(current, type(post).objects.exclude(pk=post.pk), storage)
+    post.image_variants = variants_for(name, storage)
+    # A later save may have replaced the image while this one was encoded
+    type(post).objects.filter(pk=post.pk, featured_image=name).update(image_variants=post.image_variants)
+    return True
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Thread pool encoding variants in the background of this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants',
+            )
+        return _executor
+
+
+def refresh_post_variants(pk):
+    """Refresh the variants of the post `pk` as it is stored now"""
+    from .models import BlogPost
+    post = BlogPost.objects.filter(pk=pk).first()
+    if post is not None:
+        refresh_image_variants(post)
+
+
+def refresh_in_background(pk):
+    try:
+        refresh_post_variants(pk)
+    except Exception:
+        logger.exception('Could not refresh the image variants of post %s', pk)
+    finally:
+        # The connections of this pool thread
+        connections.close_all()
+
+
+def schedule_image_variants(post):
+    """
+    Refresh the variants of `post` once the current transaction commits,
+    on the background pool unless IMAGE_VARIANT_WORKERS is 0
+    """
+    pk = post.pk
+    if settings.IMAGE_VARIANT_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(refresh_in_background, pk))
+    else:
+        transaction.on_commit(lambda: refresh_post_variants(pk))
+
+
+def fallback_format(manifest):
+    """Extension of the variants in the original's format (those of the fallback <img>), or None"""
+    variants = manifest.get('variants', {}) if manifest else {}
+    if not variants:
+        return None
+    if manifest.get('format'):
+        return manifest['format']
+    # Manifests made before "format" was stored: the original's copies are the
+    # only non-modern ones, unless the original was itself WebP
+    modern = {extension for extension, pillow_format, options in MODERN_FORMATS} | {'avif', 'webp'}
+    legacy = sorted(set(variants) - modern)
+    return legacy[0] if legacy else 'webp' if 'webp' in variants else min(variants)
+
+
+def srcset(manifest, storage=None, extension=None):
+    """
+    srcset value for one format of a manifest (by default the original's):
+    every variant by width, plus the original itself for its own format.
+    Empty when the manifest has no such variants.
+    """
+    storage = storage or default_storage
+    variants = manifest.get('variants', {}) if manifest else {}
+    original = fallback_format(manifest)
+    extension = extension or original
+    candidates = variants.get(extension)
+    if not candidates:
+        return ''
+    entries = [f'{media_url(name, storage)} {width}w' for width, name in candidates]
+    if extension == original:
+        entries.append(f'{media_url(manifest["source"], storage)} {manifest["width"]}w')
+    return ', '.join(entries)
+
+
+def modern_sources(manifest, storage=None):
+    """(MIME type, srcset) of each modern format in `manifest`, best first"""
+    variants = manifest.get('variants', {}) if manifest else {}
+    original = fallback_format(manifest)
+    return [
+        (MIME_TYPES[extension], srcset(manifest, storage, extension))
+        for extension, pillow_format, options in MODERN_FORMATS
+        if variants.get(extension) and extension != original
+    ]
@@ -1,32 +1,109 @@
-from django.core.management.base import BaseCommand
+"""
+Django management command that clears featured images from blog posts.
+Usage: python manage.py clear_featured_images [--missing-only] [--category SLUG]
+       [--author USERNAME] [--since DATE] [--until DATE] [--dry-run]
+
+The matching posts are cleared with a single UPDATE of the image columns
+only, so updated_at (and everything keyed on it) is left alone. The
+incremental static export keys post pages on the image fields too, so it
+still re-renders them. With --missing-only, each distinct image name is
+first checked against the storage on a thread pool and only references to
+missing files are cleared.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils.dateparse import parse_date
+from app_onlystudies.images import is_remote
 from app_onlystudies.models import BlogPost
+from app_onlystudies.storage import adjust_references
 
 
 class Command(BaseCommand):
-    help = 'Clear all featured images from blog posts to fix 404 errors on Heroku'
+    help = 'Clear featured images from blog posts, e.g. to fix 404 errors on Heroku'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', type=str, help='Only posts in the category with this slug')
+        parser.add_argument('--author', type=str, help='Only posts by this username')
+        parser.add_argument('--since', type=str, help='Only posts created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', type=str, help='Only posts created on or before this date (YYYY-MM-DD)')
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only clear images whose file is missing from storage',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=16,
+            help='Concurrent storage lookups for --missing-only (default: 16)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be cleared without changing anything',
+        )
 
     def handle(self, *args, **options):
         """
-        Clear the featured_image field from all BlogPost instances.
+        Clear the featured_image field of the selected BlogPost instances.
         This is useful when migrating to Cloudinary or when local media files
         are not available on the deployment server.
         """
-        blog_posts = BlogPost.objects.exclude(featured_image='')
-        count = blog_posts.count()
-        
-        if count == 0:
-            self.stdout.write(
-                self.style.WARNING('No blog posts with featured images found.')
-            )
-            return
-        
-        # Clear all featured images
-        for post in blog_posts:
-            post.featured_image = ''
-            post.save()
-        
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        blog_posts = self.select_posts(options)
+
+        if options['missing_only']:
+            names = list(blog_posts.order_by().values_list('featured_image', flat=True).distinct())
+            missing = self.find_missing(names, options['workers'])
+            self.stdout.write(f'{len(missing)} of {len(names)} image file(s) missing from storage')
+            blog_posts = blog_posts.filter(featured_image__in=missing)
+
+        with transaction.atomic():
+            references = list(blog_posts.order_by().values('featured_image').annotate(posts=Count('pk')))
+            count = sum(row['posts'] for row in references)
+            if count == 0:
+                self.stdout.write(self.style.WARNING('No blog posts with featured images found.'))
+                return
+            if options['dry_run']:
+                for row in references[:20]:
+                    self.stdout.write(f'  {row["featured_image"]} ({row["posts"]} post(s))')
+                self.stdout.write(self.style.SUCCESS(f'Would clear featured images from {count} blog post(s).'))
+                return
+
+            cleared = blog_posts.update(featured_image='', image_variants={})
+            for row in references:
+                adjust_references(removed=row['featured_image'], count=row['posts'])
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully cleared featured images from {count} blog post(s).'
+                f'Successfully cleared featured images from {cleared} blog post(s).'
             )
         )
+
+    def select_posts(self, options):
+        """Posts with an image, narrowed by the filter options"""
+        blog_posts = BlogPost.objects.exclude(featured_image='').exclude(featured_image__isnull=True)
+        if options['category']:
+            blog_posts = blog_posts.filter(category__slug=options['category'])
+        if options['author']:
+            blog_posts = blog_posts.filter(author__username=options['author'])
+        for option, lookup in (('since', 'created_at__date__gte'), ('until', 'created_at__date__lte')):
+            if options[option]:
+                day = parse_date(options[option])
+                if day is None:
+                    raise CommandError(f'--{option} must be a date like 2025-01-31')
+                blog_posts = blog_posts.filter(**{lookup: day})
+        return blog_posts
+
+    def find_missing(self, names, workers):
+        """Names (of local storage objects) that do not exist, checked concurrently"""
+        storage = BlogPost._meta.get_field('featured_image').storage
+        local = [name for name in names if not is_remote(name)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            exists = list(executor.map(storage.exists, local))
+        return [name for name, found in zip(local, exists) if not found]
@@ -0,0 +1,63 @@
+"""
+Django management command that writes AVIF and WebP copies of the PNG/JPEG
+images in STATICFILES_DIRS (see app_onlystudies/images.py).
+Usage: python manage.py convert_static_images [--workers 4]
+
+Copies sit next to their source (img/logo.png -> img/logo.avif, img/logo.webp)
+and are rewritten only when the source is newer. Templates offer them
+through {% static_sources %}.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from app_onlystudies.images import MODERN_FORMATS, convert_static_image
+from app_onlystudies.static_export.sync import source_files
+
+SOURCE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+
+
+class Command(BaseCommand):
+    help = 'Write AVIF/WebP copies of static PNG and JPEG images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes converting images (default: number of CPUs)',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        if not MODERN_FORMATS:
+            raise CommandError('This Pillow build can write neither AVIF nor WebP')
+        started = time.perf_counter()
+        sources = [
+            path for name, path in source_files(settings.STATICFILES_DIRS).items()
+            if path.suffix.lower() in SOURCE_SUFFIXES
+        ]
+
+        written = 0
+        for source, paths in zip(sources, self.run(sources, options['workers'])):
+            for path in paths:
+                written += 1
+                self.stdout.write(
+                    f'  ✓ {path.name}: {source.stat().st_size // 1024} KB -> {path.stat().st_size // 1024} KB'
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {written} file(s) written for {len(sources)} image(s) in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def run(self, sources, workers):
+        """Yield the paths written for each source, in order"""
+        if workers == 1 or len(sources) <= 1:
+            yield from map(convert_static_image, sources)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(convert_static_image, sources)
@@ -0,0 +1,106 @@
+"""
+Django management command that moves media stored before content
+addressing to content-addressed names (see app_onlystudies/storage.py).
+Usage: python manage.py dedupe_media [--dry-run] [--keep-originals]
+
+Every featured image with a legacy name (blog/heroimage_DNTqn0O.png) is
+hashed and stored under its content name, which identical files share;
+posts are repointed, reference counts set, and the original deleted.
+Unreferenced legacy files in the same directories that duplicate a stored
+object are deleted too. Run generate_image_variants afterwards, then
+generate_static_site --incremental: exported post pages are keyed on their
+image fields, so the ones still linking to deleted originals are re-rendered
+even though repointing leaves updated_at alone.
+"""
+
+import posixpath
+
+from django.core.management.base import BaseCommand
+from app_onlystudies.images import delete_variants, is_remote
+from app_onlystudies.models import BlogPost, MediaBlob
+from app_onlystudies.storage import (
+    adjust_references, content_addressed_storage, content_name, file_digest, is_content_name,
+)
+
+
+class Command(BaseCommand):
+    help = 'Move existing media files to content-addressed names, merging duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be moved and deleted without changing anything',
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Leave the legacy files in place after repointing posts',
+        )
+
+    def handle(self, *args, **options):
+        storage = content_addressed_storage
+        dry_run = options['dry_run']
+        names = sorted(
+            name for name in BlogPost.objects.exclude(featured_image='').exclude(featured_image__isnull=True)
+            .order_by().values_list('featured_image', flat=True).distinct()
+            if not is_remote(name) and not is_content_name(name)
+        )
+        self.stdout.write(f'{len(names)} legacy file(s) referenced by posts')
+
+        targets = {}  # content name -> legacy names merged into it
+        digests = set(MediaBlob.objects.values_list('sha256', flat=True))
+        removed_bytes = 0
+        directories = set()
+        for name in names:
+            if not storage.exists(name):
+                self.stdout.write(self.style.WARNING(f'  ✗ {name}: missing from storage'))
+                continue
+            directories.add(posixpath.dirname(name))
+            digest, size = file_digest(storage, name)
+            target = content_name(posixpath.dirname(name), digest, posixpath.splitext(name)[1])
+            if digest in digests:
+                removed_bytes += size
+            digests.add(digest)
+            targets.setdefault(target, []).append(name)
+            self.stdout.write(f'  {name} -> {target}')
+            if dry_run:
+                continue
+
+            with storage.open(name, 'rb') as stream:
+                stored = storage.save(name, stream)
+            posts = BlogPost.objects.filter(featured_image=name)
+            manifests = [manifest for manifest in posts.values_list('image_variants', flat=True) if manifest]
+            moved = posts.update(featured_image=stored, image_variants={})
+            adjust_references(added=stored, count=moved)
+            if manifests:
+                delete_variants(manifests[0])
+            if not options['keep_originals']:
+                storage.delete(name)
+
+        duplicates = 0
+        handled = set(names) | set(BlogPost.objects.values_list('featured_image', flat=True))
+        for directory in sorted(directories):
+            for filename in storage.listdir(directory)[1]:
+                name = posixpath.join(directory, filename)
+                if name in handled or is_content_name(name):
+                    continue
+                digest, size = file_digest(storage, name)
+                if digest not in digests:
+                    continue
+                duplicates += 1
+                removed_bytes += size
+                self.stdout.write(f'  duplicate {name}')
+                if not dry_run:
+                    storage.delete(name)
+
+        verb = 'Would merge' if dry_run else 'Merged'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb} {sum(map(len, targets.values()))} file(s) into {len(targets)} object(s), '
+            f'{duplicates} unreferenced duplicate(s); {removed_bytes // 1024} KB of duplicates removed'
+        ))
+        if targets and not dry_run:
+            self.stdout.write(
+                'Run generate_image_variants to rebuild the variants of moved images, then re-export the '
+                'static site so its pages link to the new names.'
+            )
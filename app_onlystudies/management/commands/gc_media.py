@@ -0,0 +1,93 @@
+"""
+Django management command that deletes content-addressed media objects no
+model field references any more (see app_onlystudies/storage.py).
+Usage: python manage.py gc_media [--grace-hours 24] [--recount] [--dry-run]
+
+Objects younger than the grace period are kept even at zero references:
+an upload is stored before the form saving it commits its row.
+"""
+
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+from app_onlystudies.images import VARIANT_DIR
+from app_onlystudies.models import BlogPost, MediaBlob
+from app_onlystudies.storage import content_addressed_storage
+
+# (model, field) pairs whose values are MediaBlob names
+REFERENCING_FIELDS = [(BlogPost, 'featured_image')]
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media files that are no longer referenced'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Keep unreferenced objects younger than this (default: 24)',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute every reference count from the referencing fields first',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be deleted without deleting it',
+        )
+
+    def handle(self, *args, **options):
+        if options['grace_hours'] < 0:
+            raise CommandError('--grace-hours cannot be negative')
+        if options['recount']:
+            self.recount()
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        orphans = MediaBlob.objects.filter(refcount__lte=0, created_at__lt=cutoff).order_by('pk')
+        deleted = freed = 0
+        for blob in orphans.iterator():
+            if options['dry_run']:
+                self.stdout.write(f'  would delete {blob.name} ({blob.size // 1024} KB)')
+            elif not self.delete_blob(blob):
+                continue
+            deleted += 1
+            freed += blob.size
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'✓ {verb} {deleted} object(s), {freed // 1024} KB'))
+
+    def recount(self):
+        """Set each refcount to the number of fields that point at its object"""
+        counts = {}
+        for model, field in REFERENCING_FIELDS:
+            rows = model.objects.exclude(**{field: ''}).values(field).annotate(references=Count('pk'))
+            for row in rows:
+                counts[row[field]] = counts.get(row[field], 0) + row['references']
+        fixed = 0
+        for pk, name, refcount in MediaBlob.objects.values_list('pk', 'name', 'refcount').iterator():
+            if counts.get(name, 0) != refcount:
+                MediaBlob.objects.filter(pk=pk).update(refcount=counts.get(name, 0))
+                fixed += 1
+        self.stdout.write(f'Recounted references: {fixed} corrected')
+
+    def delete_blob(self, blob):
+        """Delete an object's row, then its file and the variants made from it; False if it was taken meanwhile"""
+        deleted, _ = MediaBlob.objects.filter(pk=blob.pk, refcount__lte=0).delete()
+        if not deleted:
+            return False
+        storage = content_addressed_storage
+        directory, filename = posixpath.split(blob.name)
+        variants = posixpath.join(directory, VARIANT_DIR, posixpath.splitext(filename)[0])
+        try:
+            for name in storage.listdir(variants)[1]:
+                storage.delete(posixpath.join(variants, name))
+        except FileNotFoundError:
+            pass
+        storage.delete(blob.name)
+        return True
@@ -0,0 +1,117 @@
+"""
+Django management command that creates responsive width and format variants
+and the inline placeholder for blog featured images that do not have them yet
+(see app_onlystudies/images.py).
+Usage: python manage.py generate_image_variants [--workers 4] [--force]
+
+New uploads get their variants in the background once the post is saved;
+this backfills existing posts and uploads whose encode never finished. Each distinct image is decoded and resized once, on a
+process pool, and the parent process writes the manifest of the posts
+showing it as its result comes in. Images whose variants are current but
+predate placeholders only get the placeholder added.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from app_onlystudies.images import delete_variants, has_placeholder, init_worker, is_current, process_job
+from app_onlystudies.models import BlogPost
+
+# Workers start from a fresh server process, not a fork of the parent (which
+# reconnects to the database to save each manifest while the pool grows)
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class Command(BaseCommand):
+    help = 'Create responsive width and format variants of blog featured images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes resizing images (default: number of CPUs)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants even for images that already have them',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        started = time.perf_counter()
+
+        pending = {}  # image name -> pks of the posts showing it
+        placeholders = {}  # image name -> manifest that only lacks the placeholder
+        regenerate = set()
+        cleared = 0
+        in_use = set()
+        stale = []
+        rows = BlogPost.objects.order_by('pk').values_list('pk', 'featured_image', 'image_variants')
+        for pk, name, manifest in rows.iterator():
+            name = name or ''
+            manifest = manifest or {}
+            in_use.add(name)
+            if is_current(manifest, name) and not (options['force'] and name):
+                if has_placeholder(manifest):
+                    continue
+                placeholders.setdefault(name, manifest)
+            else:
+                regenerate.add(name)
+            if manifest.get('source', '') != name:
+                stale.append(manifest)
+            if name:
+                pending.setdefault(name, []).append(pk)
+            else:
+                BlogPost.objects.filter(pk=pk).update(image_variants={})
+                cleared += 1
+        for manifest in stale:
+            # Variants of an image no post shows any more
+            if manifest.get('source') not in in_use:
+                delete_variants(manifest)
+        for name in regenerate:
+            placeholders.pop(name, None)
+        self.stdout.write(
+            f'{len(pending)} image(s) to process ({len(placeholders)} only need a placeholder), '
+            f'{cleared} stale manifest(s) cleared'
+        )
+
+        created = failed = 0
+        jobs = [(name, placeholders.get(name)) for name in pending]
+        for (name, pks), manifest in zip(pending.items(), self.run(jobs, options['workers'])):
+            BlogPost.objects.filter(pk__in=pks).update(image_variants=manifest)
+            widths = [width for variants in manifest.get('variants', {}).values() for width, _ in variants]
+            if 'width' not in manifest:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'  ✗ {name}: not a readable local image'))
+            elif name in placeholders:
+                if self.verbosity >= 2:
+                    self.stdout.write(f'  ✓ {name}: placeholder')
+            else:
+                created += len(widths)
+                if self.verbosity >= 2:
+                    self.stdout.write(f'  ✓ {name}: {", ".join(f"{width}w" for width in widths) or "already small"}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {created} variant(s) for {len(pending) - failed} image(s), {failed} skipped, '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def run(self, jobs, workers):
+        """Yield the manifest of each job, in order"""
+        if workers == 1 or len(jobs) <= 1:
+            yield from map(process_job, jobs)
+            return
+        # Children must not share sockets
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context(POOL_START_METHOD), initializer=init_worker,
+        ) as executor:
+            yield from executor.map(process_job, jobs, chunksize=4)
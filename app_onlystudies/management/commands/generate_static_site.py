@@ -1,17 +1,38 @@
 """
 Django management command to generate a complete static site export.
 Exports all public pages to static HTML files that can be hosted without Django.
+
+With --incremental the existing export is kept and only pages whose source
+data changed since the previous run are re-rendered (see
+static_export/manifest.py); pages of deleted objects are removed.
+
+Assets get content-hashed names (referenced from the exported HTML), and
+HTML/CSS/JS/SVG files get precompressed .gz/.br siblings that the generated
+_headers and .htaccess serve with long-lived caching. A sharded search
+index and search.html give the export client-side search.
+
+With --archive out.zip|out.tar.zst the same export is streamed straight into
+a reproducible archive instead of a directory (see static_export/archive.py).
 """
 
-import os
+import heapq
 import shutil
+import time
 from pathlib import Path
-from django.core.management.base import BaseCommand
-from django.core.management import call_command
-from django.test import Client
-from django.urls import reverse
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from app_onlystudies.models import Category, SubCategory, BlogPost
+from app_onlystudies.static_export.archive import ARCHIVE_SUFFIXES, ArchiveWriter, is_archive_path
+from app_onlystudies.static_export.assets import (
+    fingerprint_assets, is_generated_asset, precompress, source_asset_entries,
+)
+from app_onlystudies.static_export.manifest import ExportManifest, build_fingerprint
+from app_onlystudies.static_export.pages import iter_pages
+from app_onlystudies.static_export.rendering import (
+    RENDER_MODES, SEARCH_PAGE, init_worker, render_pages, render_template_page,
+)
+from app_onlystudies.static_export.search import build_search_index
+from app_onlystudies.static_export.sitemap import SitemapWriter
+from app_onlystudies.static_export.sync import source_files, sync_tree
 
 
 class Command(BaseCommand):
@@ -24,12 +45,51 @@ class Command(BaseCommand):
             default='static_export',
             help='Output directory for static site (default: static_export)',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes used to render pages (default: 1)',
+        )
+        parser.add_argument(
+            '--render',
+            choices=RENDER_MODES,
+            default='direct',
+            help='direct: call views without middleware (default); client: full request cycle via the test client',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Keep the existing export and re-render only pages whose data changed',
+        )
+        parser.add_argument(
+            '--base-url',
+            type=str,
+            default=settings.STATIC_EXPORT_BASE_URL,
+            help='Public URL the export will be hosted at, used in the sitemap',
+        )
+        parser.add_argument(
+            '--no-hardlinks',
+            action='store_true',
+            help='Always copy static files instead of hardlinking them from STATICFILES_DIRS',
+        )
+        parser.add_argument(
+            '--archive',
+            type=str,
+            help=f'Stream the export into this archive instead of --output ({", ".join(ARCHIVE_SUFFIXES)})',
+        )
 
     def handle(self, *args, **options):
         output_dir = Path(options['output'])
+        self.verbosity = options['verbosity']
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        if options['archive']:
+            self.export_archive(Path(options['archive']), options)
+            return
         
         # Create output directory
-        if output_dir.exists():
+        if output_dir.exists() and not options['incremental']:
             self.stdout.write(self.style.WARNING(f'Removing existing {output_dir} directory...'))
             shutil.rmtree(output_dir)
         
@@ -38,118 +98,202 @@ class Command(BaseCommand):
 
         # Step 1: Collect static files
         self.stdout.write(self.style.HTTP_INFO('Step 1: Collecting static files...'))
-        self.collect_static_files(output_dir)
+        names = self.collect_static_files(output_dir, link=not options['no_hardlinks'])
+        asset_map = fingerprint_assets(output_dir / 'static', names)
+        self.stdout.write(self.style.SUCCESS(f'  ✓ {len(asset_map)} assets fingerprinted'))
 
         # Step 2: Generate static HTML pages
         self.stdout.write(self.style.HTTP_INFO('Step 2: Generating static HTML pages...'))
-        self.generate_static_pages(output_dir)
+        self.generate_static_pages(
+            output_dir,
+            workers=options['workers'],
+            incremental=options['incremental'],
+            base_url=options['base_url'],
+            asset_map=asset_map,
+            mode=options['render'],
+        )
+
+        # Step 3: Build the search index
+        self.stdout.write(self.style.HTTP_INFO('Step 3: Building search index...'))
+        self.build_search(output_dir, asset_map)
 
-        # Step 3: Create index and sitemap
-        self.stdout.write(self.style.HTTP_INFO('Step 3: Creating index and configuration files...'))
-        self.create_config_files(output_dir)
+        # Step 4: Create index and configuration files
+        self.stdout.write(self.style.HTTP_INFO('Step 4: Creating index and configuration files...'))
+        self.create_config_files(output_dir, asset_map)
+
+        # Step 5: Precompress text files
+        self.stdout.write(self.style.HTTP_INFO('Step 5: Precompressing HTML, CSS, JS, SVG and JSON...'))
+        files, original, compressed = precompress(output_dir, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'  ✓ {files} files compressed ({original // 1024} KB -> {compressed // 1024} KB written)'
+        ))
 
         self.stdout.write(self.style.SUCCESS(f'\n✓ Static site export complete!'))
         self.stdout.write(f'Static site location: {output_dir.absolute()}')
         self.stdout.write(f'Open: {(output_dir / "index.html").absolute()}\n')
 
-    def collect_static_files(self, output_dir):
-        """Collect all static files to the output directory"""
-        static_dir = output_dir / 'static'
-        static_dir.mkdir(exist_ok=True)
-
-        # Copy static files from Django's static directories
-        for static_location in settings.STATICFILES_DIRS:
-            if Path(static_location).exists():
-                for item in Path(static_location).iterdir():
-                    dest = static_dir / item.name
-                    if item.is_dir():
-                        if dest.exists():
-                            shutil.rmtree(dest)
-                        shutil.copytree(item, dest)
+    def export_archive(self, archive_path, options):
+        """Stream every asset and page into `archive_path` without writing an export tree"""
+        if options['incremental']:
+            raise CommandError('--archive cannot be combined with --incremental')
+        if not is_archive_path(archive_path):
+            raise CommandError(f'--archive must end with one of: {", ".join(ARCHIVE_SUFFIXES)}')
+        try:
+            archive = ArchiveWriter(archive_path)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        try:
+            with archive:
+                # Step 1: Fingerprint assets in memory and stream them from their sources
+                self.stdout.write(self.style.HTTP_INFO('Step 1: Adding static files...'))
+                asset_map, entries = source_asset_entries(source_files(settings.STATICFILES_DIRS))
+                for name, source in entries:
+                    if isinstance(source, bytes):
+                        archive.write(f'static/{name}', source)
                     else:
-                        shutil.copy2(item, dest)
+                        archive.add_file(f'static/{name}', source)
+                self.stdout.write(self.style.SUCCESS(f'  ✓ {len(entries)} static files, {len(asset_map)} fingerprinted'))
+
+                # Step 2: Generate static HTML pages
+                self.stdout.write(self.style.HTTP_INFO('Step 2: Generating static HTML pages...'))
+                self.generate_static_pages(
+                    None,
+                    workers=options['workers'],
+                    base_url=options['base_url'],
+                    asset_map=asset_map,
+                    mode=options['render'],
+                    archive=archive,
+                )
 
-        self.stdout.write(self.style.SUCCESS(f'  ✓ Static files collected'))
+                # Step 3: Build the search index
+                self.stdout.write(self.style.HTTP_INFO('Step 3: Building search index...'))
+                self.build_search(None, asset_map, archive=archive)
+
+                # Step 4: Create index and configuration files
+                self.stdout.write(self.style.HTTP_INFO('Step 4: Creating index and configuration files...'))
+                self.create_config_files(None, asset_map, archive=archive)
+        except BaseException:
+            # Never leave a truncated archive behind
+            archive_path.unlink(missing_ok=True)
+            raise
+
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Static site archive complete!'))
+        self.stdout.write(
+            f'{archive.members} files ({archive.bytes_written // 1024} KB uncompressed) '
+            f'in {archive_path.absolute()}\n'
+        )
 
-    def generate_static_pages(self, output_dir):
-        """Generate static HTML pages for all public URLs"""
-        client = Client()
-        
-        # List of public URLs to export
-        public_urls = [
-            ('', 'index.html'),  # Home
-            ('about/', 'about.html'),  # About
-            ('blog/', 'blog.html'),  # Blog Feed
-            ('forum/', 'forum.html'),  # Forum
-        ]
-
-        # Generate public pages
-        for url_path, filename in public_urls:
-            try:
-                response = client.get(f'/{url_path}')
-                if response.status_code == 200:
-                    output_file = output_dir / filename
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(response.content.decode('utf-8'))
-                    self.stdout.write(f'  ✓ Generated {filename}')
+    def collect_static_files(self, output_dir, link=True):
+        """
+        Sync static files into the output directory, copying only files that
+        changed and deleting ones whose source is gone; returns their names
+        """
+        names, stats = sync_tree(
+            settings.STATICFILES_DIRS, output_dir / 'static', keep=is_generated_asset, link=link,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'  ✓ Static files collected: {stats.copied + stats.linked} updated '
+            f'({stats.linked} hardlinked), {stats.skipped} unchanged, {stats.deleted} removed'
+        ))
+        self.stdout.write(
+            f'    {stats.bytes_copied / 1024:.0f} KB copied, {stats.bytes_skipped / 1024:.0f} KB skipped'
+        )
+        return names
+
+    def generate_static_pages(
+        self, output_dir, workers=1, incremental=False, base_url='', asset_map=None, mode='direct',
+        archive=None,
+    ):
+        """
+        Generate static HTML pages for all public URLs and the sitemap listing
+        them, into `output_dir` or, when given, `archive`
+        """
+        started = time.perf_counter()
+        manifest = None
+        if archive is None:
+            manifest = ExportManifest.load(output_dir, build_fingerprint(asset_map))
+            if not incremental:
+                manifest.pages = {}
+        stats = {'generated': 0, 'failed': 0, 'unchanged': 0, 'removed': 0, 'render_time': 0.0}
+        seen = set()
+        sitemap = SitemapWriter(output_dir, base_url, archive=archive)
+
+        def pending_pages():
+            for page in iter_pages():
+                seen.add(page.path)
+                sitemap.add(page.path, page.sources[0][2] if page.sources else None)
+                if manifest is not None and manifest.is_current(page):
+                    stats['unchanged'] += 1
                 else:
-                    self.stdout.write(
-                        self.style.WARNING(f'  ⚠ Failed to generate {filename} (status: {response.status_code})')
-                    )
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'  ✗ Error generating {filename}: {str(e)}'))
-
-        # Generate category pages
-        self.stdout.write('  Generating category pages...')
-        categories = Category.objects.all()
-        for category in categories:
-            try:
-                response = client.get(reverse('category', args=[category.slug]))
-                if response.status_code == 200:
-                    cat_dir = output_dir / 'categories'
-                    cat_dir.mkdir(exist_ok=True)
-                    output_file = cat_dir / f'{category.slug}.html'
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(response.content.decode('utf-8'))
-                    self.stdout.write(f'    ✓ Generated category: {category.name}')
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'    ⚠ Error generating {category.slug}: {str(e)}'))
-
-        # Generate subcategory pages
-        self.stdout.write('  Generating subcategory pages...')
-        subcategories = SubCategory.objects.all()
-        for subcategory in subcategories:
-            try:
-                response = client.get(
-                    reverse('subcategory', args=[subcategory.category.slug, subcategory.slug])
-                )
-                if response.status_code == 200:
-                    subcat_dir = output_dir / 'subcategories'
-                    subcat_dir.mkdir(exist_ok=True)
-                    output_file = subcat_dir / f'{subcategory.slug}.html'
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(response.content.decode('utf-8'))
-                    self.stdout.write(f'    ✓ Generated subcategory: {subcategory.name}')
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'    ⚠ Error generating {subcategory.slug}: {str(e)}'))
-
-        # Generate blog post detail pages
-        self.stdout.write('  Generating blog post pages...')
-        blog_posts = BlogPost.objects.all()
-        for post in blog_posts:
-            try:
-                response = client.get(reverse('blog_detail', args=[post.slug]))
-                if response.status_code == 200:
-                    blog_dir = output_dir / 'blog'
-                    blog_dir.mkdir(exist_ok=True)
-                    output_file = blog_dir / f'{post.slug}.html'
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(response.content.decode('utf-8'))
-                    self.stdout.write(f'    ✓ Generated blog post: {post.title}')
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'    ⚠ Error generating {post.slug}: {str(e)}'))
-
-    def create_config_files(self, output_dir):
+                    yield page
+
+        slowest = []  # min-heap of the slowest (elapsed, url) pairs
+        for result in render_pages(
+            pending_pages(), output_dir, workers=workers, asset_map=asset_map, mode=mode,
+        ):
+            self.report_page(result)
+            if result.status == 200 and not result.error:
+                stats['generated'] += 1
+                if archive is not None:
+                    archive.write(result.page.path, result.content)
+                else:
+                    manifest.record(result.page, result.digest)
+            else:
+                stats['failed'] += 1
+                if manifest is not None:
+                    manifest.forget(result.page.path)
+            stats['render_time'] += result.elapsed
+            heapq.heappush(slowest, (result.elapsed, result.page.url))
+            if len(slowest) > 5:
+                heapq.heappop(slowest)
+
+        if manifest is not None:
+            for path in manifest.prune(seen):
+                stats['removed'] += 1
+                if self.verbosity >= 1:
+                    self.stdout.write(f'  - Removed {path}')
+            manifest.save()
+        sitemap.close()
+        self.stdout.write(f'  ✓ Sitemap: {sitemap.urls} URLs in {sitemap.shards} shard(s)')
+        self.report_summary(stats, sorted(slowest, reverse=True), time.perf_counter() - started, workers)
+
+    def report_page(self, result):
+        """Report one rendered page as soon as its result arrives (in order)"""
+        if result.error:
+            self.stdout.write(self.style.ERROR(f'  ✗ Error generating {result.page.path}: {result.error}'))
+        elif result.status != 200:
+            self.stdout.write(
+                self.style.WARNING(f'  ⚠ Failed to generate {result.page.path} (status: {result.status})')
+            )
+        elif self.verbosity >= 1:
+            self.stdout.write(f'  ✓ Generated {result.page.path} ({result.elapsed * 1000:.0f} ms)')
+
+    def report_summary(self, stats, slowest, total_time, workers):
+        """Summarise the run: counts, throughput and the slowest pages"""
+        total = stats['generated'] + stats['failed']
+        rate = total / total_time if total_time else 0
+        self.stdout.write(
+            f"  Pages: {stats['generated']} generated, {stats['failed']} failed, "
+            f"{stats['unchanged']} unchanged, {stats['removed']} removed in {total_time:.2f}s "
+            f"({rate:.1f} pages/s, {workers} worker{'s' if workers != 1 else ''})"
+        )
+        if total:
+            self.stdout.write(f"  Mean render time: {stats['render_time'] / total * 1000:.0f} ms/page")
+            self.stdout.write('  Slowest pages:')
+            for elapsed, url in slowest:
+                self.stdout.write(f'    {elapsed * 1000:8.0f} ms  {url}')
+
+    def build_search(self, output_dir, asset_map=None, archive=None):
+        """Write the client-side search index and the search page that loads it"""
+        documents, shards = build_search_index(output_dir, write=archive and archive.write)
+        init_worker(output_dir, close_connections=False, asset_map=asset_map)
+        content = render_template_page('static_search.html', SEARCH_PAGE, {'page_title': 'Search'})
+        if archive is not None:
+            archive.write(SEARCH_PAGE, content)
+        self.stdout.write(self.style.SUCCESS(f'  ✓ Search index: {documents} documents in {shards} shards'))
+
+    def create_config_files(self, output_dir, asset_map=None, archive=None):
         """Create additional configuration files"""
         # Create a README for the static site
         readme_content = """# OnlyStudies Static Site Export
@@ -160,12 +304,20 @@ This is a static HTML version of the OnlyStudies application.
 
 - `index.html` - Home page
 - `about.html` - About page
-- `blog.html` - Blog feed
-- `forum.html` - Forum
+- `blog.html` - Blog feed (further pages in `blog/page/`)
+- `forum.html` - Forum (further pages in `forum/page/`)
 - `static/` - CSS, JavaScript, and images
-- `categories/` - Category pages
-- `subcategories/` - Subcategory pages
+- `categories/` - Category pages, with subcategory pages in `categories/<category>/`
 - `blog/` - Individual blog post pages
+- `forum/` - Individual forum threads
+- `sitemap.xml` - Sitemap index pointing at the `sitemap-<n>.xml` shards
+- `search.html` / `search/` - Client-side search page and its sharded index
+- `*.gz` / `*.br` - Precompressed copies of HTML, CSS, JS, SVG and JSON files
+- `_headers` / `.htaccess` - Caching and precompressed-file rules for
+  Netlify/Cloudflare Pages and Apache
+
+Files in `static/` named like `style.55e7cbb9ba48.css` carry a hash of their
+content and are served with immutable caching.
 
 ## Hosting
 
@@ -184,7 +336,6 @@ This is a static export and includes only read-only content. The following featu
 - Appointments
 - Forum posting/answering
 - Blog post creation/editing
-- Search functionality (requires backend)
 
 To use these features, deploy the full Django application.
 
@@ -192,17 +343,45 @@ To use these features, deploy the full Django application.
 
 Generated at: {timestamp}
 """
-        from datetime import datetime
-        readme_file = output_dir / 'README.md'
-        with open(readme_file, 'w', encoding='utf-8') as f:
-            f.write(readme_content.format(timestamp=datetime.now().isoformat()))
+        from datetime import datetime, timezone
+        # Archives are reproducible, so they carry their fixed build time
+        generated = datetime.now() if archive is None else datetime.fromtimestamp(archive.epoch, timezone.utc)
+        self.write_output(output_dir, archive, 'README.md', readme_content.format(timestamp=generated.isoformat()))
 
         self.stdout.write(f'  ✓ Created README.md')
 
         # Create a .htaccess file for Apache servers
-        htaccess_content = """# Enable GZIP compression
-<IfModule mod_deflate.c>
-  AddOutputFilterByType DEFLATE text/html text/plain text/xml text/css text/javascript application/javascript
+        htaccess_content = """# Serve the precompressed .br/.gz siblings written next to each file
+<IfModule mod_rewrite.c>
+  RewriteEngine On
+  RewriteCond %{HTTP:Accept-Encoding} br
+  RewriteCond %{REQUEST_FILENAME}.br -s
+  RewriteRule ^(.+)\\.(html|css|js|svg|json)$ $1.$2.br [L]
+  RewriteCond %{HTTP:Accept-Encoding} gzip
+  RewriteCond %{REQUEST_FILENAME}.gz -s
+  RewriteRule ^(.+)\\.(html|css|js|svg|json)$ $1.$2.gz [L]
+
+  # Keep the original type and stop mod_deflate compressing them again
+  RewriteRule \\.html\\.(br|gz)$ - [T=text/html,E=no-gzip:1]
+  RewriteRule \\.css\\.(br|gz)$ - [T=text/css,E=no-gzip:1]
+  RewriteRule \\.js\\.(br|gz)$ - [T=application/javascript,E=no-gzip:1]
+  RewriteRule \\.svg\\.(br|gz)$ - [T=image/svg+xml,E=no-gzip:1]
+  RewriteRule \\.json\\.(br|gz)$ - [T=application/json,E=no-gzip:1]
+</IfModule>
+
+<IfModule mod_headers.c>
+  <FilesMatch "\\.br$">
+    Header set Content-Encoding br
+    Header append Vary Accept-Encoding
+  </FilesMatch>
+  <FilesMatch "\\.gz$">
+    Header set Content-Encoding gzip
+    Header append Vary Accept-Encoding
+  </FilesMatch>
+  # Fingerprinted assets (name.<hash>.ext) never change
+  <FilesMatch "\\.[0-9a-f]{12}\\.[^.]+(\\.(br|gz))?$">
+    Header set Cache-Control "public, max-age=31536000, immutable"
+  </FilesMatch>
 </IfModule>
 
 # Set proper caching
@@ -227,8 +406,24 @@ Generated at: {timestamp}
   RewriteRule ^(.*)$ index.html [L]
 </IfModule>
 """
-        htaccess_file = output_dir / '.htaccess'
-        with open(htaccess_file, 'w', encoding='utf-8') as f:
-            f.write(htaccess_content)
+        self.write_output(output_dir, archive, '.htaccess', htaccess_content)
 
         self.stdout.write(f'  ✓ Created .htaccess')
+
+        # Create a _headers file for Netlify / Cloudflare Pages
+        static_url = settings.STATIC_URL
+        headers = ''.join(
+            f'{static_url}{hashed_name}\n  Cache-Control: public, max-age=31536000, immutable\n'
+            for hashed_name in sorted((asset_map or {}).values())
+        )
+        self.write_output(output_dir, archive, '_headers', headers)
+
+        self.stdout.write(f'  ✓ Created _headers')
+
+    def write_output(self, output_dir, archive, name, content):
+        """Write a text file to the export directory or archive"""
+        if archive is not None:
+            archive.write(name, content)
+        else:
+            with open(output_dir / name, 'w', encoding='utf-8') as f:
+                f.write(content)
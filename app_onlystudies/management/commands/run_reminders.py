@@ -0,0 +1,141 @@
+"""
+Django management command that sends reminder notifications for upcoming
+appointments and task due dates.
+Usage: python manage.py run_reminders [--interval 60]
+
+Each run scans only:
+- items whose due time entered the lead window since the previous run
+  (due time between the stored high-water mark and now + lead), and
+- items created or rescheduled since the previous run that fall inside the
+  lead window.
+Both are index range scans. Candidates are processed in batches with one
+marker lookup and two bulk inserts per batch, so cost grows with the number
+of reminders sent, not with the number of users.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from app_onlystudies.models import Appointment, Notification, ReminderCursor, SentReminder, Task
+
+
+class Command(BaseCommand):
+    help = 'Send reminder notifications for upcoming appointments and due tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--appointment-lead',
+            type=int,
+            default=60,
+            help='Minutes before an appointment to send its reminder (default: 60)',
+        )
+        parser.add_argument(
+            '--task-lead',
+            type=int,
+            default=24 * 60,
+            help='Minutes before a task is due to send its reminder (default: 1440)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows fetched and written per batch (default: 2000)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running, sleeping this many seconds between runs (default: run once)',
+        )
+
+    def handle(self, *args, **options):
+        sources = [
+            ('appointment', Appointment, 'appointment_datetime', timedelta(minutes=options['appointment_lead'])),
+            ('task', Task, 'due_date', timedelta(minutes=options['task_lead'])),
+        ]
+        while True:
+            for kind, model, due_field, lead in sources:
+                sent = self.run_kind(kind, model, due_field, lead, options['batch_size'])
+                self.stdout.write(f'{kind}: sent {sent} reminder(s)')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def run_kind(self, kind, model, due_field, lead, batch_size):
+        """Scan one source for due reminders and send them; returns the number sent"""
+        now = timezone.now()
+        upper = now + lead
+        with transaction.atomic():
+            # Row lock serialises concurrent workers for this kind
+            cursor, _ = ReminderCursor.objects.select_for_update().get_or_create(
+                kind=kind, defaults={'scanned_until': now},
+            )
+            window = Q(**{f'{due_field}__gt': max(cursor.scanned_until, now), f'{due_field}__lte': upper})
+            if cursor.changes_since:
+                window |= Q(**{
+                    'updated_at__gte': cursor.changes_since,
+                    f'{due_field}__gt': now,
+                    f'{due_field}__lte': upper,
+                })
+            candidates = (
+                model.objects.filter(window)
+                .order_by()
+                .values_list('pk', 'created_by_id', 'title', due_field)
+                .iterator(chunk_size=batch_size)
+            )
+
+            sent = 0
+            batch = []
+            for row in candidates:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    sent += self.send_batch(kind, batch)
+                    batch = []
+            if batch:
+                sent += self.send_batch(kind, batch)
+
+            cursor.scanned_until = max(cursor.scanned_until, upper)
+            cursor.changes_since = now
+            cursor.save(update_fields=['scanned_until', 'changes_since', 'updated_at'])
+        return sent
+
+    def send_batch(self, kind, rows):
+        """Create notifications and sent-markers for rows not reminded yet"""
+        already_sent = set(
+            SentReminder.objects.filter(kind=kind, object_id__in=[row[0] for row in rows])
+            .values_list('object_id', 'due_at')
+        )
+        markers = []
+        notifications = []
+        for pk, user_id, title, due_at in rows:
+            if (pk, due_at) in already_sent:
+                continue
+            markers.append(SentReminder(kind=kind, object_id=pk, due_at=due_at, user_id=user_id))
+            notifications.append(self.build_notification(kind, pk, user_id, title, due_at))
+
+        SentReminder.objects.bulk_create(markers, ignore_conflicts=True)
+        Notification.objects.bulk_create(notifications)
+        return len(notifications)
+
+    def build_notification(self, kind, pk, user_id, title, due_at):
+        when = timezone.localtime(due_at).strftime('%b %d, %Y %I:%M %p')
+        if kind == 'appointment':
+            heading = f'Upcoming appointment: {title}'
+            message = f'Your appointment "{title}" starts at {when}.'
+            url = reverse('edit_appointment', args=[pk])
+        else:
+            heading = f'Task due soon: {title}'
+            message = f'Your task "{title}" is due at {when}.'
+            url = reverse('edit_task', args=[pk])
+        return Notification(
+            user_id=user_id,
+            title=heading[:200],
+            message=message,
+            notification_type='reminder',
+            related_url=url,
+        )
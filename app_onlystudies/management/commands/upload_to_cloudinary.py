@@ -1,56 +1,161 @@
+"""
+Django management command that uploads local blog images to the media
+storage (Cloudinary in production) and attaches them to their posts.
+Usage: python manage.py upload_to_cloudinary [--workers 8] [--target-dir DIR]
+
+Files are matched to posts by slug or title (see app_onlystudies/media_upload.py),
+uploaded concurrently with retries, and recorded in a resume manifest so an
+interrupted backfill picks up where it stopped.
+"""
+
 import os
-from django.core.management.base import BaseCommand
-from django.core.files import File
-from app_onlystudies.models import BlogPost
+import posixpath
+import time
+from pathlib import Path
+
 from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from app_onlystudies.images import delete_unused_variants
+from app_onlystudies.media_upload import (
+    IMAGE_SUFFIXES, MANIFEST_NAME, UploadJob, UploadManifest, build_post_index, get_upload_storage,
+    image_key, upload_files,
+)
+from app_onlystudies.models import BlogPost
+from app_onlystudies.storage import adjust_references
+
+# Save the resume manifest at least this often during a run
+MANIFEST_SAVE_EVERY = 50
+MANIFEST_SAVE_SECONDS = 5
 
 
 class Command(BaseCommand):
     help = 'Upload local media files to Cloudinary and update blog posts'
 
-    def handle(self, *args, **kwargs):
-        media_path = os.path.join(settings.BASE_DIR, 'media', 'blog')
-        
-        if not os.path.exists(media_path):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'media', 'blog'),
+            help='Directory holding the images to upload (default: media/blog)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Concurrent uploads (default: 8)',
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=3,
+            help='Retries per file after a failed upload (default: 3)',
+        )
+        parser.add_argument(
+            '--backoff',
+            type=float,
+            default=0.5,
+            help='Seconds before the first retry, doubled for each further one (default: 0.5)',
+        )
+        parser.add_argument(
+            '--manifest',
+            type=str,
+            help=f'Resume manifest (default: {MANIFEST_NAME} in the source directory)',
+        )
+        parser.add_argument(
+            '--storage',
+            type=str,
+            help='Dotted path of the storage class to upload to (default: the featured_image storage)',
+        )
+        parser.add_argument(
+            '--target-dir',
+            type=str,
+            help='Upload into this local directory instead, e.g. to try a backfill without Cloudinary',
+        )
+
+    def handle(self, *args, **options):
+        media_path = Path(options['source'])
+        self.verbosity = options['verbosity']
+        if not media_path.is_dir():
             self.stdout.write(self.style.ERROR(f'Media path does not exist: {media_path}'))
             return
-        
-        # Get all image files
-        image_files = [f for f in os.listdir(media_path) 
-                      if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))]
-        
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        if options['retries'] < 0:
+            raise CommandError('--retries cannot be negative')
+
+        storage = get_upload_storage(options['storage'], options['target_dir'])
+        manifest = UploadManifest.load(options['manifest'] or media_path / MANIFEST_NAME)
+        upload_to = BlogPost._meta.get_field('featured_image').upload_to
+
+        image_files = sorted(
+            path for path in media_path.iterdir()
+            if path.is_file() and path.suffix.lower() in IMAGE_SUFFIXES
+        )
         self.stdout.write(f'Found {len(image_files)} images in {media_path}')
-        
-        blog_posts = BlogPost.objects.all()
-        
-        for post in blog_posts:
-            # Try to find a matching image
-            for image_file in image_files:
-                # Match by post title or specific image name
-                if (image_file.lower().replace('_', ' ').replace('-', ' ') in post.title.lower() or
-                    'time' in image_file.lower() and 'time' in post.title.lower() or
-                    'lighthouse' in image_file.lower()):
-                    
-                    image_path = os.path.join(media_path, image_file)
-                    
-                    try:
-                        with open(image_path, 'rb') as img_file:
-                            post.featured_image.save(
-                                image_file,
-                                File(img_file),
-                                save=True
-                            )
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'✓ Uploaded {image_file} for "{post.title}"'
-                            )
-                        )
-                        break
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f'✗ Failed to upload {image_file}: {str(e)}'
-                            )
-                        )
-        
-        self.stdout.write(self.style.SUCCESS('\nUpload process completed!'))
+
+        index = build_post_index()
+        jobs = []
+        stats = {'uploaded': 0, 'failed': 0, 'skipped': 0, 'unmatched': 0, 'retried': 0}
+        claimed = set()
+        for path in image_files:
+            post_id = index.get(image_key(path.name))
+            if post_id is None:
+                stats['unmatched'] += 1
+                if self.verbosity >= 2:
+                    self.stdout.write(f'  ? No post matches {path.name}')
+            elif post_id in claimed:
+                # Several files for one post: the first (by name) wins
+                stats['unmatched'] += 1
+                self.stdout.write(self.style.WARNING(f'  ? {path.name} matches a post that already has an image'))
+            elif manifest.is_done(path, post_id):
+                claimed.add(post_id)
+                stats['skipped'] += 1
+            else:
+                claimed.add(post_id)
+                jobs.append(UploadJob(path, post_id, posixpath.join(upload_to, path.name)))
+        self.stdout.write(
+            f'{len(jobs)} to upload, {stats["skipped"]} already uploaded, {stats["unmatched"]} unmatched'
+        )
+
+        started = time.perf_counter()
+        last_save = time.monotonic()
+        unsaved = 0
+        try:
+            for result in upload_files(
+                storage, jobs, options['workers'], options['retries'], options['backoff'],
+            ):
+                if result.error:
+                    stats['failed'] += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'✗ Failed to upload {result.job.path.name} after {result.attempts} attempt(s): {result.error}'
+                    ))
+                    continue
+                # Point the post at the upload before recording it, so a resumed run never skips a file
+                # whose post was not updated
+                post = BlogPost.objects.filter(pk=result.job.post_id)
+                previous, variants = post.values_list('featured_image', 'image_variants').first() or ('', {})
+                # The variants of the old image no longer apply; generate_image_variants makes new ones
+                post.update(featured_image=result.name, image_variants={}, updated_at=timezone.now())
+                adjust_references(added=result.name, removed=previous)
+                delete_unused_variants(variants, BlogPost.objects.exclude(pk=result.job.post_id))
+                manifest.record(result.job.path, result.job.post_id, result.name)
+                stats['uploaded'] += 1
+                stats['retried'] += result.attempts > 1
+                unsaved += 1
+                if self.verbosity >= 1:
+                    self.stdout.write(self.style.SUCCESS(f'✓ Uploaded {result.job.path.name} as {result.name}'))
+                if unsaved >= MANIFEST_SAVE_EVERY or time.monotonic() - last_save >= MANIFEST_SAVE_SECONDS:
+                    manifest.save()
+                    last_save = time.monotonic()
+                    unsaved = 0
+        finally:
+            manifest.save()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nUpload process completed in {time.perf_counter() - started:.1f}s: '
+            f'{stats["uploaded"]} uploaded ({stats["retried"]} after retries), {stats["failed"]} failed, '
+            f'{stats["skipped"]} skipped, {stats["unmatched"]} unmatched'
+        ))
+        if stats['uploaded']:
+            self.stdout.write('Run `manage.py generate_image_variants` to create variants of the uploaded images.')
@@ -0,0 +1,166 @@
+"""
+Bulk upload of local blog images to the media storage.
+
+Image files are matched to blog posts through an index built once from the
+posts' slugs and slugified titles, so `Time_Management.png` goes to the post
+with slug (or title) "time-management" and every lookup is a dict hit.
+
+Uploads run on a bounded thread pool (they are network-bound), each retried
+with exponential backoff. Completed uploads are recorded in a JSON manifest
+next to the source files, so an interrupted run resumes where it stopped:
+files whose size and mtime still match their record are skipped.
+
+The target is any Django storage: the featured_image storage (content
+addressed over Cloudinary in production, see storage.py), a storage class
+given by dotted path, or a local directory standing in for it.
+"""
+
+import json
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+from django.utils.text import slugify
+
+from .models import BlogPost
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+MANIFEST_NAME = '.upload-manifest.json'
+MANIFEST_VERSION = 1
+
+# One file to upload: `name` is the name to store it under
+UploadJob = namedtuple('UploadJob', ['path', 'post_id', 'name'])
+# error is None on success; name is the name the storage actually used
+UploadResult = namedtuple('UploadResult', ['job', 'name', 'attempts', 'error'])
+
+
+def image_key(filename):
+    """Index key of an image file: its slugified stem"""
+    return slugify(Path(filename).stem.replace('_', '-'))
+
+
+def build_post_index():
+    """Map slug and slugified title of every post to its pk; slugs win over titles"""
+    slugs, titles = {}, {}
+    for pk, slug, title in BlogPost.objects.order_by('pk').values_list('pk', 'slug', 'title').iterator():
+        slugs[slug] = pk
+        titles.setdefault(slugify(title), pk)
+    return {**titles, **slugs}
+
+
+def get_upload_storage(storage_path=None, target_dir=None):
+    """
+    The storage to upload to: a local directory, a storage class by dotted
+    path, or by default the (content-addressed) storage of featured_image
+    """
+    if target_dir:
+        return FileSystemStorage(location=target_dir)
+    if storage_path:
+        return import_string(storage_path)()
+    return BlogPost._meta.get_field('featured_image').storage
+
+
+def with_retries(func, retries=3, backoff=0.5, sleep=time.sleep):
+    """
+    Call `func` until it succeeds, at most `retries` extra times, sleeping
+    backoff * 2**attempt (with jitter) in between; returns (result, attempts)
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(), attempt + 1
+        except Exception:
+            if attempt >= retries:
+                raise
+            sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+class UploadManifest:
+    """
+    Uploaded files of one source directory, keyed by file name.
+    Use `UploadManifest.load()`; save() is atomic so a killed run keeps what it recorded.
+    """
+
+    def __init__(self, path, files=None):
+        self.path = Path(path)
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path):
+        try:
+            data = json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get('version') != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get('files'))
+
+    @staticmethod
+    def _stamp(path):
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_done(self, path, post_id):
+        """True if `path` was uploaded to `post_id` and has not changed since"""
+        entry = self.files.get(path.name)
+        return (
+            entry is not None
+            and entry['post'] == post_id
+            and [entry['size'], entry['mtime_ns']] == list(self._stamp(path))
+        )
+
+    def record(self, path, post_id, name):
+        size, mtime_ns = self._stamp(path)
+        self.files[path.name] = {'post': post_id, 'name': name, 'size': size, 'mtime_ns': mtime_ns}
+
+    def save(self):
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        temporary.write_text(
+            json.dumps({'version': MANIFEST_VERSION, 'files': self.files}, sort_keys=True), encoding='utf-8',
+        )
+        os.replace(temporary, self.path)
+
+
+def upload_one(storage, job, retries, backoff):
+    """Upload one file, retrying failures; returns an UploadResult"""
+    def attempt():
+        with open(job.path, 'rb') as stream:
+            return storage.save(job.name, File(stream, name=job.path.name))
+
+    try:
+        name, attempts = with_retries(attempt, retries, backoff)
+    except Exception as e:
+        return UploadResult(job, None, retries + 1, str(e))
+    return UploadResult(job, name, attempts, None)
+
+
+def upload_files(storage, jobs, workers=8, retries=3, backoff=0.5):
+    """
+    Upload `jobs` (any iterable) on `workers` threads and yield an
+    UploadResult for each as it completes. At most 2 * workers uploads are
+    queued at once, so jobs are consumed lazily.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        try:
+            for job in jobs:
+                pending.add(executor.submit(upload_one, storage, job, retries, backoff))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        except BaseException:
+            # Interrupted: drop queued uploads and let the running ones finish
+            executor.shutdown(cancel_futures=True)
+            raise
@@ -0,0 +1,96 @@
+# Generated by Django 5.2a1 on 2026-10-19 10:05
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+EXCLUSION_CONSTRAINT = 'appointment_no_overlap'
+# MIN_APPOINTMENT_MINUTES when this migration was written
+MIN_DURATION_MINUTES = 5
+
+
+def backfill_end_datetime(apps, schema_editor):
+    """
+    Give existing appointments the default one hour duration, trimmed so a
+    user's appointments never overlap (the invariant the exclusion constraint
+    and the conflict check rely on). Durations are never trimmed below the
+    5 minute minimum: an appointment starting sooner than that after the
+    previous one is moved to 5 minutes after its start, noted in its notes.
+    """
+    Appointment = apps.get_model('app_onlystudies', 'Appointment')
+    default = timedelta(minutes=60)
+    minimum = timedelta(minutes=MIN_DURATION_MINUTES)
+    previous = None
+    for appointment in Appointment.objects.order_by('created_by_id', 'appointment_datetime', 'pk').iterator():
+        update_fields = ['duration_minutes', 'end_datetime']
+        if previous is not None and previous.created_by_id == appointment.created_by_id:
+            gap = appointment.appointment_datetime - previous.appointment_datetime
+            if gap < minimum:
+                moved_from = appointment.appointment_datetime
+                appointment.appointment_datetime = previous.appointment_datetime + minimum
+                appointment.notes = (
+                    f'{appointment.notes}\n\n' if appointment.notes else ''
+                ) + f'Moved from {moved_from:%Y-%m-%d %H:%M} UTC to avoid overlapping another appointment.'
+                update_fields += ['appointment_datetime', 'notes']
+                gap = minimum
+            if gap < default:
+                previous.duration_minutes = int(gap.total_seconds() // 60)
+                previous.end_datetime = previous.appointment_datetime + timedelta(minutes=previous.duration_minutes)
+                previous.save(update_fields=['duration_minutes', 'end_datetime'])
+        appointment.duration_minutes = 60
+        appointment.end_datetime = appointment.appointment_datetime + default
+        appointment.save(update_fields=update_fields)
+        previous = appointment
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    """PostgreSQL only: reject overlapping appointments for the same user."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('app_onlystudies', 'Appointment')._meta.db_table
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT {EXCLUSION_CONSTRAINT} '
+        f"EXCLUDE USING gist (created_by_id WITH =, tstzrange(appointment_datetime, end_datetime, '[)') WITH &&)"
+    )
+
+
+def remove_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('app_onlystudies', 'Appointment')._meta.db_table
+    schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {EXCLUSION_CONSTRAINT}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_onlystudies', '0006_task_appointment_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=60),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='end_datetime',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_end_datetime, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='end_datetime',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['created_by', 'appointment_datetime', 'end_datetime'], name='appointment_owner_span_idx'),
+        ),
+        migrations.RunPython(add_exclusion_constraint, remove_exclusion_constraint),
+    ]
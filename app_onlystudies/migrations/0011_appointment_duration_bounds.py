@@ -0,0 +1,19 @@
+# Generated by Django 5.2a1 on 2026-10-19 14:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_onlystudies', '0010_mediablob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(5, 'Duration must be between 5 minutes and 12 hours.'), django.core.validators.MaxValueValidator(720, 'Duration must be between 5 minutes and 12 hours.')]),
+        ),
+    ]
@@ -1,7 +1,14 @@
+from datetime import timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .storage import get_content_storage, media_url
+
 
 class Category(models.Model):
     """
@@ -45,7 +52,9 @@ class BlogPost(models.Model):
     content = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='blog_posts')
-    featured_image = models.ImageField(upload_to='blog/', blank=True, null=True)
+    featured_image = models.ImageField(upload_to='blog/', storage=get_content_storage, blank=True, null=True)
+    # Width variants of featured_image, see images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     slug = models.SlugField(unique=True)
     is_published = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -57,6 +66,15 @@ class BlogPost(models.Model):
     def __str__(self):
         return self.title
 
+    @property
+    def featured_image_url(self):
+        """
+        URL of the featured image, or '' without one. Handles absolute URLs
+        saved in the field, and resolves each stored image only once.
+        """
+        image = self.featured_image
+        return media_url(image.name, image.storage) if image else ''
+
 
 class Notification(models.Model):
     """
@@ -66,6 +84,7 @@ class Notification(models.Model):
         ('course', 'Course Update'),
         ('forum', 'Forum Activity'),
         ('achievement', 'Achievement'),
+        ('reminder', 'Reminder'),
         ('system', 'System Message'),
     ]
     
@@ -155,27 +174,161 @@ class Task(models.Model):
     due_date = models.DateTimeField(null=True, blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['due_date', 'priority', 'title']
+        indexes = [
+            models.Index(fields=['due_date'], name='task_due_date_idx'),
+            models.Index(fields=['updated_at'], name='task_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+# Appointment length bounds; the longest also bounds range scans (see scheduling.py)
+MIN_APPOINTMENT_MINUTES = 5
+MAX_APPOINTMENT_MINUTES = 720
+MAX_APPOINTMENT_DURATION = timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+APPOINTMENT_DURATION_MESSAGE = 'Duration must be between 5 minutes and 12 hours.'
+
+
 class Appointment(models.Model):
     """
     Simple appointment booking for services/events at a specific date and time.
+    A user's appointments never overlap; end_datetime is derived from the duration.
+    clean() enforces both for every ModelForm (booking views and the admin).
     """
     title = models.CharField(max_length=200)
     notes = models.TextField(blank=True)
     appointment_datetime = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField(default=60, validators=[
+        MinValueValidator(MIN_APPOINTMENT_MINUTES, APPOINTMENT_DURATION_MESSAGE),
+        MaxValueValidator(MAX_APPOINTMENT_MINUTES, APPOINTMENT_DURATION_MESSAGE),
+    ])
+    end_datetime = models.DateTimeField(editable=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='appointments')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['appointment_datetime', 'title']
+        indexes = [
+            models.Index(
+                fields=['created_by', 'appointment_datetime', 'end_datetime'],
+                name='appointment_owner_span_idx',
+            ),
+            models.Index(fields=['appointment_datetime'], name='appointment_start_idx'),
+            models.Index(fields=['updated_at'], name='appointment_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} @ {self.appointment_datetime.isoformat()}"
 
+    def clean(self):
+        """Reject a time span overlapping another appointment of the same user"""
+        from .scheduling import find_conflict
+        start, duration = self.appointment_datetime, self.duration_minutes
+        if start is None or self.created_by_id is None or duration is None:
+            return
+        if not MIN_APPOINTMENT_MINUTES <= duration <= MAX_APPOINTMENT_MINUTES:
+            return
+        conflict = find_conflict(self.created_by_id, start, start + timedelta(minutes=duration), exclude_pk=self.pk)
+        if conflict:
+            starts = timezone.localtime(conflict.appointment_datetime)
+            ends = timezone.localtime(conflict.end_datetime)
+            raise ValidationError({
+                'appointment_datetime': f'This overlaps "{conflict.title}" ({starts:%b %d, %H:%M}-{ends:%H:%M}).',
+            })
+
+    def save(self, *args, **kwargs):
+        self.end_datetime = self.appointment_datetime + timedelta(minutes=self.duration_minutes)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'appointment_datetime', 'duration_minutes'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'end_datetime'}
+        super().save(*args, **kwargs)
+
+
+class SentReminder(models.Model):
+    """
+    Marker recording that a reminder was sent for an item due at a given time.
+    Makes reminder runs idempotent; rescheduling an item allows a new reminder.
+    """
+    KIND_CHOICES = [
+        ('appointment', 'Appointment'),
+        ('task', 'Task'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    due_at = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_reminders')
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id', 'due_at'], name='unique_sent_reminder'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} @ {self.due_at.isoformat()}"
+
+
+class ReminderCursor(models.Model):
+    """
+    High-water marks for the reminder scheduler, one row per reminder kind.
+    scanned_until: due times up to here have already been scanned.
+    changes_since: start of the last run; items edited after it are rescanned.
+    """
+    kind = models.CharField(max_length=20, unique=True)
+    scanned_until = models.DateTimeField()
+    changes_since = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} scanned until {self.scanned_until.isoformat()}"
+
+
+class CalendarFeedKey(models.Model):
+    """
+    Version of a user's calendar feed token, signed into the token.
+    Bumping it (rotate()) revokes every link handed out before.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed_key')
+    version = models.PositiveIntegerField(default=0)
+    rotated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user} calendar feed v{self.version}"
+
+    @classmethod
+    def version_for(cls, user_id):
+        """Current token version of a user, 0 until the first rotation"""
+        return cls.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def rotate(cls, user):
+        """Revoke the user's feed tokens and return the new version"""
+        key, created = cls.objects.get_or_create(user=user)
+        cls.objects.filter(pk=key.pk).update(version=models.F('version') + 1, rotated_at=timezone.now())
+        return cls.version_for(user.pk)
+
+
+class MediaBlob(models.Model):
+    """
+    A media file stored under the hash of its content (see storage.py).
+    refcount: number of model file fields pointing at it; objects left at
+    zero are deleted by `manage.py gc_media`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['refcount', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} reference(s))"
@@ -0,0 +1,131 @@
+"""
+Pagination that stays cheap on large tables.
+
+Django's Paginator runs an exact COUNT(*) for every paginated page, which on
+PostgreSQL scans the whole table (or index) once tables reach millions of
+rows. EstimatedCountPaginator asks the planner instead:
+
+- an unfiltered queryset is counted from pg_class.reltuples, the row count
+  maintained by VACUUM/ANALYZE;
+- a filtered one from the row estimate of its EXPLAIN plan.
+
+Estimates below ESTIMATE_THRESHOLD rows are replaced by an exact count, which
+is cheap at that size and keeps small lists exact. Other databases (SQLite in
+development and tests) always count exactly.
+
+Since an estimated page count is not exact, templates show elided page
+ranges (1 2 … 9 10 11 … 5000) and label totals "about" when
+`paginator.is_estimated`. Nor does an estimate bound the pages: pages past
+it open as long as they hold rows, and whether a page has a next one comes
+from the rows actually fetched, not from the estimate.
+"""
+
+import json
+
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+# Below this many (estimated) rows, count exactly
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    """
+    Planner estimate of the number of rows in `queryset`, or None when the
+    database cannot estimate it
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    queryset = queryset.order_by()
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    """Page that knows from its rows whether another page follows an estimated count"""
+
+    has_more = None
+
+    def has_next(self):
+        if self.has_more is None:
+            return super().has_next()
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts large querysets from planner estimates
+    (see the module docstring). `is_estimated` tells if `count` is one.
+    """
+
+    threshold = ESTIMATE_THRESHOLD
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_estimated = False
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= self.threshold:
+                self.is_estimated = True
+                return estimate
+        return super().count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.is_estimated or int(number) < 1:
+                raise
+            # Past the estimate: page() tells if the rows are there
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.is_estimated:
+            return super().page(number)
+        # One row more than a page shows if another page follows
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class EstimatedPaginationMixin:
+    """
+    ListView mixin paginating with EstimatedCountPaginator and putting the
+    elided page range of the current page in the context as `page_range`
+    """
+
+    paginator_class = EstimatedCountPaginator
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if page is not None:
+            context['page_range'] = page.paginator.get_elided_page_range(page.number, on_each_side=2, on_ends=1)
+        return context
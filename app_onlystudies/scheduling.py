@@ -0,0 +1,158 @@
+"""
+Appointment scheduling helpers: conflict detection and free-slot search.
+
+A user's appointments are kept pairwise disjoint (enforced by an exclusion
+constraint on PostgreSQL and by `find_conflict` on every booking). Because of
+that invariant, ordering by start also orders by end, so:
+
+* the only appointment that can overlap [start, end) is the one with the
+  latest start before `end` - a single backwards seek on the
+  (created_by, appointment_datetime, end_datetime) index;
+* an in-memory index over a window is just two sorted arrays searched with
+  `bisect`, which gives the same O(log n) lookups as an interval tree.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import MAX_APPOINTMENT_DURATION, Appointment
+
+SLOT_GRANULARITY = timedelta(minutes=15)
+
+
+def find_conflict(user, start, end, exclude_pk=None):
+    """
+    Return an appointment of `user` overlapping [start, end), or None.
+    Issues one indexed query regardless of how many appointments the user has.
+    """
+    qs = Appointment.objects.filter(created_by=user, appointment_datetime__lt=end)
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+    candidate = qs.order_by('-appointment_datetime', '-end_datetime').first()
+    if candidate is not None and candidate.end_datetime > start:
+        return candidate
+    return None
+
+
+class IntervalIndex:
+    """
+    Sorted index of disjoint half-open [start, end) intervals.
+    Used as the in-memory fallback where the database has no range types.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        # Coalesce on load so rows written before the invariant was enforced
+        # cannot break the ordering the lookups rely on.
+        for start, end in sorted(intervals):
+            if self._ends and start < self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, start, end):
+        """Insert an interval; raises ValueError if it overlaps an existing one"""
+        if self.overlapping(start, end) is not None:
+            raise ValueError('Interval overlaps an existing interval')
+        position = bisect_left(self._starts, start)
+        self._starts.insert(position, start)
+        self._ends.insert(position, end)
+
+    def overlapping(self, start, end):
+        """Return the (start, end) interval overlapping [start, end), or None"""
+        position = bisect_left(self._starts, end) - 1
+        if position >= 0 and self._ends[position] > start:
+            return self._starts[position], self._ends[position]
+        return None
+
+    def gaps(self, start, end):
+        """Yield the free (start, end) gaps inside [start, end)"""
+        cursor = start
+        position = bisect_right(self._ends, start)
+        while position < len(self._starts) and self._starts[position] < end:
+            if self._starts[position] > cursor:
+                yield cursor, self._starts[position]
+            cursor = max(cursor, self._ends[position])
+            position += 1
+        if cursor < end:
+            yield cursor, end
+
+
+def _round_up(value, step=SLOT_GRANULARITY):
+    """Round an aware datetime up to the next multiple of `step`"""
+    epoch = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    remainder = (value - epoch) % step
+    return value if not remainder else value + (step - remainder)
+
+
+def next_free_slots(user, duration, after=None, count=5, horizon=timedelta(days=14)):
+    """
+    Return up to `count` free (start, end) slots of length `duration` for
+    `user`, starting no earlier than `after` and within `horizon` of it.
+    Loads only the appointments inside the horizon, in one range query
+    bounded on both sides of the start (see appointments_between).
+    """
+    after = _round_up(after or timezone.now())
+    until = after + horizon
+    index = IntervalIndex(
+        Appointment.objects.filter(
+            created_by=user,
+            appointment_datetime__gte=after - MAX_APPOINTMENT_DURATION,
+            appointment_datetime__lt=until,
+            end_datetime__gt=after,
+        ).order_by('appointment_datetime').values_list('appointment_datetime', 'end_datetime')
+    )
+
+    slots = []
+    for gap_start, gap_end in index.gaps(after, until):
+        slot_start = _round_up(gap_start)
+        while slot_start + duration <= gap_end and len(slots) < count:
+            slots.append((slot_start, slot_start + duration))
+            slot_start += duration
+        if len(slots) >= count:
+            break
+    return slots
+
+
+def day_start(day):
+    """Return midnight at the start of `day` in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def appointments_between(user, start, end):
+    """
+    Appointments of `user` intersecting [start, end).
+    A bounded range scan on the (created_by, start, end) index, so the cost
+    depends on the window and not on how much history the user has: no
+    appointment lasts longer than MAX_APPOINTMENT_DURATION, so none starting
+    earlier can reach the window.
+    """
+    return Appointment.objects.filter(
+        created_by=user,
+        appointment_datetime__gte=start - MAX_APPOINTMENT_DURATION,
+        appointment_datetime__lt=end,
+        end_datetime__gt=start,
+    ).order_by('appointment_datetime', 'pk')
+
+
+def group_by_day(appointments, first_day, last_day):
+    """
+    Bucket appointments by local date for first_day..last_day (inclusive).
+    An appointment spanning midnight is listed on every day it touches.
+    """
+    days = {first_day + timedelta(days=n): [] for n in range((last_day - first_day).days + 1)}
+    for appointment in appointments:
+        starts_on = timezone.localdate(appointment.appointment_datetime)
+        ends_on = max(starts_on, timezone.localdate(appointment.end_datetime - timedelta(microseconds=1)))
+        day = max(starts_on, first_day)
+        while day <= min(ends_on, last_day):
+            days[day].append(appointment)
+            day += timedelta(days=1)
+    return days
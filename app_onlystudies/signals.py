@@ -0,0 +1,84 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .images import schedule_image_variants
+from .models import BlogPost, Category, SubCategory
+from .storage import adjust_references
+from .taxonomy import invalidate_taxonomy
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def taxonomy_changed(sender, **kwargs):
+    """
+    Bump the taxonomy version whenever a category or subcategory changes
+    """
+    invalidate_taxonomy()
+
+
+@receiver(post_init, sender=BlogPost)
+def remember_featured_image(sender, instance, **kwargs):
+    """
+    Keep the stored featured image name to see what a save replaces
+    """
+    if 'featured_image' not in instance.__dict__:
+        # Deferred (.only()/.defer()): the stored name is unknown until needed
+        instance._saved_featured_image = None
+        return
+    # Rows loaded from the database hold the name; new instances may hold a File
+    value = instance.__dict__['featured_image']
+    instance._saved_featured_image = value if isinstance(value, str) else ''
+
+
+def load_saved_featured_image(instance):
+    """Read the stored name of a post loaded without its featured image"""
+    if instance._saved_featured_image is None:
+        stored = type(instance).objects.filter(pk=instance.pk).values_list('featured_image', flat=True).first()
+        instance._saved_featured_image = stored or ''
+
+
+@receiver(pre_save, sender=BlogPost)
+def featured_image_saving(sender, instance, **kwargs):
+    """
+    Look up the image a save replaces when the post was loaded without it
+    but has been given a new one since
+    """
+    if 'featured_image' in instance.__dict__ and not instance._state.adding:
+        load_saved_featured_image(instance)
+
+
+@receiver(post_save, sender=BlogPost)
+def featured_image_changed(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """
+    Move the media reference count to the new featured image and schedule
+    its width variants
+    """
+    if 'featured_image' not in instance.__dict__ or (
+        update_fields is not None and 'featured_image' not in update_fields
+    ):
+        # The save did not write the featured image
+        return
+    name = instance.featured_image.name or ''
+    # A new row replaces nothing, whatever name it was constructed with
+    adjust_references(added=name, removed='' if created else instance._saved_featured_image)
+    instance._saved_featured_image = name
+    if not raw:
+        schedule_image_variants(instance)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def featured_image_deleting(sender, instance, **kwargs):
+    """
+    Look up the image of a post deleted after being loaded without it
+    """
+    load_saved_featured_image(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def featured_image_released(sender, instance, **kwargs):
+    """
+    Drop the media reference of a deleted post
+    """
+    adjust_references(removed=instance._saved_featured_image)
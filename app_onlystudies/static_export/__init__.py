@@ -0,0 +1,8 @@
+"""
+Building blocks for the generate_static_site management command.
+"""
+
+# WSGI environ key set on every request made by the exporter. Views use it to
+# skip side effects such as view counters. It is not an HTTP_* key, so it can
+# never be sent by a browser.
+EXPORT_ENVIRON_KEY = 'app_onlystudies.static_export'
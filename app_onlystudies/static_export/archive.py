@@ -0,0 +1,157 @@
+"""
+Streaming archive output for the static export.
+
+ArchiveWriter appends members to a .zip, .tar.zst or .tar.gz as they are
+produced, so the export is never staged on disk. Archives are reproducible:
+members keep the order they are written in (which the exporter keeps
+deterministic), and every member gets the same timestamp, owner and
+permissions. The timestamp comes from SOURCE_DATE_EPOCH when set.
+
+Compressible members (HTML, CSS, JS, SVG, JSON) get .gz (and .br when the
+`brotli` package is installed) siblings written right after them, like the
+precompression pass of directory exports.
+"""
+
+import gzip
+import io
+import os
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+
+from whitenoise.compress import Compressor, brotli_installed
+
+from .assets import COMPRESSIBLE_SUFFIXES
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar.zst', '.tar.gz', '.tgz')
+
+# Earliest timestamp a zip member can carry (1980-01-01)
+DEFAULT_EPOCH = 315532800
+
+# Already-compressed formats are stored as-is in zip archives
+STORED_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.woff', '.woff2', '.gz', '.br', '.zip')
+
+
+def archive_epoch():
+    """Timestamp for every member: SOURCE_DATE_EPOCH if set, else 1980-01-01"""
+    return max(int(os.environ.get('SOURCE_DATE_EPOCH', DEFAULT_EPOCH)), DEFAULT_EPOCH)
+
+
+def is_archive_path(path):
+    return str(path).endswith(ARCHIVE_SUFFIXES)
+
+
+def _zstd_writer(raw):
+    """Open a zstd compressing stream over `raw` (Python 3.14+ or the zstandard package)"""
+    try:
+        from compression import zstd
+        return zstd.ZstdFile(raw, 'w')
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('.tar.zst archives need Python 3.14+ or the zstandard package') from None
+    return zstandard.ZstdCompressor(level=19).stream_writer(raw)
+
+
+class ArchiveWriter:
+    """
+    Append-only archive sink used in place of an output directory.
+    Use as a context manager; `write()` adds bytes, `add_file()` streams a
+    file from disk.
+    """
+
+    def __init__(self, path, epoch=None):
+        self.path = Path(path)
+        self.epoch = archive_epoch() if epoch is None else epoch
+        self._zip_date = time.gmtime(self.epoch)[:6]
+        self.names = set()
+        self.members = 0
+        self.bytes_written = 0
+        self._raw = self._compressed = self._tar = self._zip = None
+
+        name = self.path.name
+        if name.endswith('.zip'):
+            self._zip = zipfile.ZipFile(self.path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9)
+        elif name.endswith('.tar.zst'):
+            self._raw = open(self.path, 'wb')
+            self._compressed = _zstd_writer(self._raw)
+            self._tar = tarfile.open(fileobj=self._compressed, mode='w|', format=tarfile.PAX_FORMAT)
+        elif name.endswith(('.tar.gz', '.tgz')):
+            self._raw = open(self.path, 'wb')
+            # No name and mtime=0 keep the gzip header reproducible
+            self._compressed = gzip.GzipFile(filename='', fileobj=self._raw, mode='wb', mtime=0)
+            self._tar = tarfile.open(fileobj=self._compressed, mode='w|', format=tarfile.PAX_FORMAT)
+        else:
+            raise ValueError(f'Unsupported archive type: {name} (use {", ".join(ARCHIVE_SUFFIXES)})')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _claim(self, name):
+        if name in self.names:
+            raise ValueError(f'{name} was already written to the archive')
+        self.names.add(name)
+        self.members += 1
+
+    def _add(self, name, stream, size):
+        self._claim(name)
+        self.bytes_written += size
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=self._zip_date)
+            info.external_attr = 0o644 << 16
+            info.compress_type = zipfile.ZIP_STORED if name.endswith(STORED_SUFFIXES) else zipfile.ZIP_DEFLATED
+            with self._zip.open(info, 'w', force_zip64=size > 0x7FFFFFFF) as member:
+                while chunk := stream.read(1024 * 1024):
+                    member.write(chunk)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = self.epoch
+            info.mode = 0o644
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            self._tar.addfile(info, stream)
+
+    def _add_siblings(self, name, data):
+        if not name.endswith(COMPRESSIBLE_SUFFIXES) or not data:
+            return
+        if brotli_installed:
+            compressed = Compressor.compress_brotli(data)
+            if len(compressed) / len(data) > 0.95:
+                return
+            self._add(name + '.br', io.BytesIO(compressed), len(compressed))
+        compressed = Compressor.compress_gzip(data)
+        if len(compressed) / len(data) <= 0.95:
+            self._add(name + '.gz', io.BytesIO(compressed), len(compressed))
+
+    def write(self, name, data):
+        """Add a member holding `data` (bytes or str) plus its compressed siblings"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._add(name, io.BytesIO(data), len(data))
+        self._add_siblings(name, data)
+
+    def add_file(self, name, source):
+        """Stream the file at `source` into the member `name`"""
+        source = Path(source)
+        if name.endswith(COMPRESSIBLE_SUFFIXES):
+            # Text assets are small; reading them lets us compress them too
+            self.write(name, source.read_bytes())
+            return
+        with open(source, 'rb') as stream:
+            self._add(name, stream, source.stat().st_size)
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+            self._compressed.close()
+            self._raw.close()
+        self._zip = self._tar = None
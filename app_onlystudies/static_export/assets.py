@@ -0,0 +1,212 @@
+"""
+Asset post-processing for the static export.
+
+- fingerprint_assets() gives every collected asset a content-hashed name
+  (css/style.css -> css/style.55e7cbb9ba48.css) using Django's
+  ManifestStaticFilesStorage, so references inside CSS are rewritten too and
+  the hashed files can be cached forever.
+- precompress() writes .gz (and .br when the `brotli` package is installed)
+  siblings for HTML, CSS, JS, SVG and JSON files with WhiteNoise's compressor,
+  spread over a process pool. Up-to-date siblings are left alone, and so are
+  files the compressor skipped because compression did not pay off; those
+  are recorded in SKIPPED_NAME with the mtime and size they were checked at.
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from whitenoise.compress import Compressor
+
+COMPRESSIBLE_SUFFIXES = ('.html', '.css', '.js', '.svg', '.json')
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+SKIPPED_NAME = '.precompress-skipped.json'
+
+# name.<12 hex digits>.ext, as produced by ManifestStaticFilesStorage
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+def is_generated_asset(name):
+    """True for files the export derives from collected assets (hashed copies, compressed siblings, manifest)"""
+    return (
+        name.endswith(COMPRESSED_SUFFIXES)
+        or HASHED_NAME.search(name) is not None
+        or name == ExportAssetStorage.manifest_name
+    )
+
+
+class ExportAssetStorage(ManifestStaticFilesStorage):
+    """Hashes files in place inside the export's static directory"""
+
+    # Unknown references (e.g. CDN URLs in CSS) are left untouched
+    manifest_strict = False
+
+
+class SourceAssetStorage(ExportAssetStorage):
+    """
+    Hashes assets straight from their source files without writing anything,
+    for archive exports. A hashed copy with unchanged content is recorded as
+    an alias of its source file; rewritten CSS and the manifest are kept in
+    memory.
+    """
+
+    def __init__(self, sources):
+        self.sources = {name: Path(path) for name, path in sources.items()}
+        self._source_paths = {str(path) for path in self.sources.values()}
+        self.saved = {}
+        super().__init__(location=os.devnull)
+
+    def exists(self, name):
+        return name in self.saved or name in self.sources
+
+    def _open(self, name, mode='rb'):
+        saved = self.saved.get(name, self.sources.get(name))
+        if saved is None:
+            raise FileNotFoundError(name)
+        if isinstance(saved, bytes):
+            return ContentFile(saved, name=name)
+        return File(open(saved, 'rb'))
+
+    def _save(self, name, content):
+        source = getattr(content, 'name', None)
+        if isinstance(content, File) and source in self._source_paths:
+            self.saved[name] = Path(source)
+        else:
+            content.seek(0)
+            self.saved[name] = content.read()
+        return name
+
+    def delete(self, name):
+        self.saved.pop(name, None)
+
+    def entries(self):
+        """(name, source Path or bytes) of every asset to export, sorted by name"""
+        files = dict(self.sources)
+        files.update(self.saved)
+        return sorted(files.items())
+
+
+def source_asset_entries(sources):
+    """
+    Fingerprint `sources` ({name: path}) in memory.
+    Returns ({name: hashed_name}, sorted [(name, Path or bytes)]).
+    """
+    storage = SourceAssetStorage(sources)
+    for name, hashed_name, processed in storage.post_process({name: (storage, name) for name in sources}):
+        if isinstance(processed, Exception):
+            raise processed
+    asset_map = {name: storage.hashed_files[name] for name in sources if name in storage.hashed_files}
+    return asset_map, storage.entries()
+
+
+def fingerprint_assets(static_dir, names):
+    """
+    Create hashed copies of `names` (paths relative to `static_dir`) and
+    return {name: hashed_name}. Hashed files from earlier runs that are no
+    longer current are deleted.
+    """
+    storage = ExportAssetStorage(location=str(static_dir))
+    paths = {name: (storage, name) for name in names}
+    for name, hashed_name, processed in storage.post_process(paths):
+        if isinstance(processed, Exception):
+            raise processed
+    asset_map = {name: storage.hashed_files[name] for name in names if name in storage.hashed_files}
+
+    current = set(asset_map.values())
+    for path in Path(static_dir).rglob('*'):
+        name = path.relative_to(static_dir).as_posix()
+        if path.is_file() and HASHED_NAME.search(name) and name not in current:
+            path.unlink()
+    return asset_map
+
+
+def _siblings(path):
+    return [path.with_name(path.name + suffix) for suffix in COMPRESSED_SUFFIXES]
+
+
+def _stamp(path):
+    stat = path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _is_fresh(path, skipped_stamp=None):
+    """
+    True if a compressed sibling exists and is at least as new as `path`, or
+    compressing `path` was skipped as ineffective and it has not changed since
+    """
+    if skipped_stamp is not None and skipped_stamp == _stamp(path):
+        return True
+    mtime = path.stat().st_mtime
+    return any(sibling.exists() and sibling.stat().st_mtime >= mtime for sibling in _siblings(path))
+
+
+def _load_skipped(output_dir):
+    try:
+        return json.loads((output_dir / SKIPPED_NAME).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_skipped(output_dir, skipped):
+    target = output_dir / SKIPPED_NAME
+    temporary = target.with_name(target.name + '.tmp')
+    temporary.write_text(json.dumps(skipped, sort_keys=True), encoding='utf-8')
+    os.replace(temporary, target)
+
+
+def compress_file(path):
+    """Write compressed siblings of `path`; returns (original size, sizes written)"""
+    path = Path(path)
+    for sibling in _siblings(path):
+        sibling.unlink(missing_ok=True)
+    written = Compressor(quiet=True).compress(str(path))
+    return path.stat().st_size, [os.path.getsize(name) for name in written]
+
+
+def precompress(output_dir, workers=1):
+    """
+    Compress every HTML/CSS/JS/SVG/JSON file under `output_dir` whose siblings are
+    missing or stale and drop siblings whose original is gone. Files the
+    compressor writes nothing for are recorded as skipped, so they are not
+    compressed again until they change.
+    Returns (files compressed, original bytes, compressed bytes written).
+    """
+    output_dir = Path(output_dir)
+    recorded = _load_skipped(output_dir)
+    skipped = {}
+    pending = []
+    for path in sorted(output_dir.rglob('*')):
+        if not path.is_file():
+            continue
+        if path.suffix in COMPRESSED_SUFFIXES:
+            if not path.with_suffix('').exists():
+                path.unlink()
+        elif path.suffix in COMPRESSIBLE_SUFFIXES and not path.name.startswith('.'):
+            name = path.relative_to(output_dir).as_posix()
+            if not _is_fresh(path, recorded.get(name)):
+                pending.append(str(path))
+            elif name in recorded:
+                skipped[name] = recorded[name]
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(compress_file, pending, chunksize=16))
+    else:
+        results = [compress_file(path) for path in pending]
+    for path, (_, sizes) in zip(pending, results):
+        if not sizes:
+            path = Path(path)
+            skipped[path.relative_to(output_dir).as_posix()] = _stamp(path)
+    if skipped != recorded:
+        _save_skipped(output_dir, skipped)
+    return (
+        len(results),
+        sum(size for size, _ in results),
+        sum(sum(sizes) for _, sizes in results),
+    )
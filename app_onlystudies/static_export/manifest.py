@@ -0,0 +1,109 @@
+"""
+Export manifest used by incremental builds.
+
+The manifest sits in the export root and records, for every page written:
+its URL, the source rows and dependency digest it was rendered from, and a
+hash of the HTML produced. A page is re-rendered only when its sources or
+dependencies differ from the recorded ones (or its file has gone missing);
+pages that are no longer produced are removed. A change to any template or
+to the manifest format, or to the fingerprinted asset names pages link to,
+invalidates every page.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+MANIFEST_NAME = '.export-manifest.json'
+MANIFEST_VERSION = 2
+
+
+def template_fingerprint():
+    """Digest of every template file the pages may be rendered with"""
+    roots = [Path(directory) for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+    roots.append(Path(__file__).resolve().parent.parent / 'templates')
+    hasher = hashlib.sha256()
+    for root in roots:
+        if not root.exists():
+            continue
+        for path in sorted(root.rglob('*')):
+            if path.is_file():
+                hasher.update(str(path.relative_to(root)).encode())
+                hasher.update(path.read_bytes())
+    return hasher.hexdigest()
+
+
+def build_fingerprint(asset_map=None):
+    """Digest of everything that affects every page: templates and asset names"""
+    assets = json.dumps(asset_map or {}, sort_keys=True)
+    return hashlib.sha256(f'{template_fingerprint()}:{assets}'.encode()).hexdigest()
+
+
+class ExportManifest:
+    """
+    Page records of one export directory, keyed by output path.
+    Use `ExportManifest.load()`; records from an incompatible build are dropped.
+    """
+
+    def __init__(self, output_dir, build, pages=None):
+        self.output_dir = Path(output_dir)
+        self.build = build
+        self.pages = pages or {}
+
+    @classmethod
+    def load(cls, output_dir, build=None):
+        build = build or build_fingerprint()
+        try:
+            data = json.loads((Path(output_dir) / MANIFEST_NAME).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return cls(output_dir, build)
+        if data.get('version') != MANIFEST_VERSION or data.get('build') != build:
+            return cls(output_dir, build)
+        return cls(output_dir, build, data.get('pages'))
+
+    @staticmethod
+    def _sources(page):
+        return [list(source) for source in page.sources]
+
+    def is_current(self, page):
+        """True if `page` was already rendered from the same data and its file still exists"""
+        entry = self.pages.get(page.path)
+        return (
+            entry is not None
+            and entry['url'] == page.url
+            and entry['depends'] == page.depends
+            and entry['sources'] == self._sources(page)
+            and (self.output_dir / page.path).is_file()
+        )
+
+    def record(self, page, digest):
+        self.pages[page.path] = {
+            'url': page.url,
+            'sources': self._sources(page),
+            'depends': page.depends,
+            'hash': digest,
+        }
+
+    def forget(self, path):
+        self.pages.pop(path, None)
+
+    def prune(self, keep):
+        """Delete files of recorded pages whose path is not in `keep`; returns their paths"""
+        removed = sorted(path for path in self.pages if path not in keep)
+        for path in removed:
+            (self.output_dir / path).unlink(missing_ok=True)
+            del self.pages[path]
+        return removed
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run never leaves it half-written"""
+        target = self.output_dir / MANIFEST_NAME
+        temporary = target.with_name(target.name + '.tmp')
+        temporary.write_text(
+            json.dumps({'version': MANIFEST_VERSION, 'build': self.build, 'pages': self.pages}, sort_keys=True),
+            encoding='utf-8',
+        )
+        os.replace(temporary, target)
@@ -0,0 +1,156 @@
+"""
+Enumerates the public pages of the site, where each one is written and what
+data it was rendered from.
+
+Every page carries:
+- sources: (model, id, updated_at, ...) of the objects the page is about;
+  blog posts add their featured image and a digest of its variant manifest,
+  which bulk updates and background jobs rewrite without bumping updated_at;
+- depends: a digest of the wider data it also shows (the navbar taxonomy,
+  the post list of a feed, related posts of the same category...).
+Incremental exports re-render a page only when either of them changes.
+
+Paginated lists are exported page by page; `pagination` holds the paths of
+their first page and of page N so `?page=N` links can be rewritten to them.
+All queries stream with .iterator(), so memory stays flat however large
+the site is.
+"""
+
+import hashlib
+import json
+import math
+from collections import namedtuple
+
+from django.db.models import Count, Max
+from django.urls import reverse
+
+from app_onlystudies.models import BlogPost, ForumQuestion
+from app_onlystudies.taxonomy import get_taxonomy
+from app_onlystudies.views import BlogFeedView, ForumView
+
+# url: path requested from Django; path: output file relative to the export root
+ExportPage = namedtuple(
+    'ExportPage', ['url', 'path', 'sources', 'depends', 'pagination'], defaults=((), '', None),
+)
+
+BLOG_PAGINATION = ('blog.html', 'blog/page/{}.html')
+FORUM_PAGINATION = ('forum.html', 'forum/page/{}.html')
+
+
+def _digest(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def image_digest(featured_image, image_variants):
+    """Digest of what a post's image markup is made from"""
+    return _digest(featured_image or '', json.dumps(image_variants or {}, sort_keys=True))
+
+
+def taxonomy_digest(taxonomy):
+    """Digest of the category tree, which every page shows in its navbar"""
+    hasher = hashlib.sha1()
+    for category in taxonomy.categories:
+        hasher.update(f'{category.pk}:{category.slug}:{category.name}:{category.description}|'.encode())
+        for subcategory in category.subcategory_list:
+            hasher.update(f'{subcategory.pk}:{subcategory.slug}:{subcategory.name}:{subcategory.description}|'.encode())
+    return hasher.hexdigest()
+
+
+def blog_digests():
+    """
+    One pass over published posts: a digest of all of them (the feed) and
+    one per category (the related posts shown on each detail page).
+    """
+    feed = hashlib.sha1()
+    by_category = {}
+    rows = (
+        BlogPost.objects.filter(is_published=True)
+        .order_by('pk')
+        .values_list('pk', 'updated_at', 'category_id', 'featured_image', 'image_variants')
+        .iterator(chunk_size=2000)
+    )
+    for pk, updated_at, category_id, featured_image, image_variants in rows:
+        entry = f'{pk}:{updated_at.isoformat()}:{image_digest(featured_image, image_variants)}|'.encode()
+        feed.update(entry)
+        by_category.setdefault(category_id, hashlib.sha1()).update(entry)
+    return feed.hexdigest(), {key: hasher.hexdigest() for key, hasher in by_category.items()}
+
+
+def forum_rows():
+    """Stream (pk, slug, updated_at, views, is_answered, answer count, latest answer) per question"""
+    return (
+        ForumQuestion.objects.order_by('pk')
+        .annotate(answer_total=Count('answers'), answer_latest=Max('answers__updated_at'))
+        .values_list('pk', 'slug', 'updated_at', 'views', 'is_answered', 'answer_total', 'answer_latest')
+        .iterator(chunk_size=2000)
+    )
+
+
+def forum_digest():
+    """Digest of everything the forum list shows: questions and answer activity"""
+    hasher = hashlib.sha1()
+    for pk, _, updated_at, views, is_answered, answer_total, _ in forum_rows():
+        hasher.update(f'{pk}:{updated_at.isoformat()}:{views}:{is_answered}:{answer_total}|'.encode())
+    return hasher.hexdigest()
+
+
+def iter_list_pages(url, count, per_page, pagination, depends):
+    """Yield one page per paginated page of a list of `count` items"""
+    first_path, page_path = pagination
+    yield ExportPage(url, first_path, depends=depends, pagination=pagination)
+    for number in range(2, math.ceil(count / per_page) + 1):
+        yield ExportPage(f'{url}?page={number}', page_path.format(number), depends=depends, pagination=pagination)
+
+
+def iter_pages():
+    """Yield every page to export, in a stable order"""
+    taxonomy = get_taxonomy()
+    site = taxonomy_digest(taxonomy)
+    feed, related = blog_digests()
+
+    yield ExportPage('/', 'index.html', depends=site)
+    yield ExportPage('/about/', 'about.html', depends=site)
+    yield from iter_list_pages(
+        reverse('blog_feed'), BlogPost.objects.filter(is_published=True).count(),
+        BlogFeedView.paginate_by, BLOG_PAGINATION, _digest(site, feed),
+    )
+    yield from iter_list_pages(
+        reverse('forum'), ForumQuestion.objects.count(),
+        ForumView.paginate_by, FORUM_PAGINATION, _digest(site, forum_digest()),
+    )
+
+    for category in taxonomy.categories:
+        yield ExportPage(reverse('category', args=[category.slug]), f'categories/{category.slug}.html', depends=site)
+
+    for category in taxonomy.categories:
+        for subcategory in category.subcategory_list:
+            yield ExportPage(
+                reverse('subcategory', args=[category.slug, subcategory.slug]),
+                f'categories/{category.slug}/{subcategory.slug}.html',
+                depends=site,
+            )
+
+    posts = (
+        BlogPost.objects.filter(is_published=True)
+        .order_by('pk')
+        .values_list('pk', 'slug', 'updated_at', 'category_id', 'featured_image', 'image_variants')
+        .iterator(chunk_size=2000)
+    )
+    for pk, slug, updated_at, category_id, featured_image, image_variants in posts:
+        yield ExportPage(
+            reverse('blog_detail', args=[slug]),
+            f'blog/{slug}.html',
+            sources=((
+                'blogpost', pk, updated_at.isoformat(),
+                featured_image or '', image_digest(featured_image, image_variants),
+            ),),
+            depends=_digest(site, related.get(category_id, '')),
+        )
+
+    for pk, slug, updated_at, views, _, answer_total, answer_latest in forum_rows():
+        yield ExportPage(
+            reverse('forum_question', args=[slug]),
+            f'forum/{slug}.html',
+            sources=(('forumquestion', pk, updated_at.isoformat()),),
+            depends=_digest(site, views, answer_total, answer_latest),
+        )
@@ -0,0 +1,213 @@
+"""
+Renders export pages, either in-process or across a pool of worker processes.
+
+Two render modes are available:
+- direct (default): each URL is resolved to its view and called with an
+  anonymous RequestFactory request, skipping the middleware stack (sessions,
+  CSRF, messages...). Requests carry a per-process `static_export_cache` so
+  views can share lookups across pages.
+- client: each page goes through django.test.Client and the full stack,
+  exactly like a browser request.
+
+Each worker process owns its own database connection and writes the pages
+it renders straight to disk, so only small result tuples
+travel back to the parent. Results are yielded in submission order, and at
+most a bounded window of pages is in flight, so memory stays flat however
+many pages are exported.
+"""
+
+import hashlib
+import multiprocessing
+import re
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.urls import resolve, reverse
+
+from . import EXPORT_ENVIRON_KEY
+
+SEARCH_PAGE = 'search.html'
+
+# status is the HTTP status (None if rendering raised); error holds the message;
+# digest is the sha256 of the page written (None if nothing was written);
+# content holds the page itself when rendering without an output directory
+PageResult = namedtuple(
+    'PageResult', ['page', 'status', 'elapsed', 'error', 'digest', 'content'], defaults=(None, None),
+)
+
+RENDER_MODES = ('direct', 'client')
+
+# Pool workers start from a fresh server process rather than a fork of this
+# one, which may hold database connections again by the time a worker starts
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Per-process state, set up by init_worker()
+_fetch = None
+_client = None
+_factory = None
+_export_cache = None
+_output_dir = None
+_asset_map = None
+_asset_link = None
+_search_action = None
+
+PAGE_LINK = re.compile(rb'href="\?page=(\d+)"')
+
+
+def fetch_with_client(url):
+    """Request `url` through the full middleware stack; returns (status, content)"""
+    response = _client.get(url, **{EXPORT_ENVIRON_KEY: '1'})
+    return response.status_code, response.content
+
+
+def anonymous_request(url):
+    """An anonymous GET request for `url` as made by the exporter"""
+    # Imported here: pool workers load this module before django.setup()
+    from django.contrib.auth.models import AnonymousUser
+    request = (_factory or RequestFactory()).get(url, **{EXPORT_ENVIRON_KEY: '1'})
+    request.user = AnonymousUser()
+    return request
+
+
+def fetch_direct(url):
+    """Call the view for `url` with an anonymous request; returns (status, content)"""
+    request = anonymous_request(url)
+    request.static_export_cache = _export_cache
+    match = resolve(request.path_info)
+    request.resolver_match = match
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return 404, b''
+    if callable(getattr(response, 'render', None)):
+        response = response.render()
+    return response.status_code, response.content
+
+
+def init_worker(output_dir, close_connections=True, asset_map=None, mode='direct'):
+    """
+    Prepare this process for rendering.
+    Pool workers drop any connection inherited from the parent so each one
+    opens its own. `asset_map` maps static names to their fingerprinted names.
+    Without an `output_dir` pages are returned to the caller instead of written.
+    """
+    global _fetch, _client, _factory, _export_cache, _output_dir, _asset_map, _asset_link, _search_action
+    import django
+    django.setup()
+    if close_connections:
+        connections.close_all()
+    if mode == 'client':
+        _client = Client()
+        _fetch = fetch_with_client
+    else:
+        _factory = RequestFactory()
+        _export_cache = {}
+        _fetch = fetch_direct
+    _output_dir = Path(output_dir) if output_dir is not None else None
+    _asset_map = {name.encode(): hashed.encode() for name, hashed in (asset_map or {}).items()}
+    _asset_link = re.compile(rb'(?<=["\'(=])' + re.escape(settings.STATIC_URL.encode()) + rb'([^"\'()?#\s]+)')
+    # Search forms point at the static search page instead of the search view
+    _search_action = (f'action="{reverse("search")}"'.encode(), f'action="/{SEARCH_PAGE}"'.encode())
+
+
+def rewrite_page_links(content, pagination):
+    """Point `?page=N` links of a paginated list at the exported file of page N"""
+    first_path, page_path = pagination
+
+    def replace(match):
+        number = int(match.group(1))
+        path = first_path if number == 1 else page_path.format(number)
+        return b'href="/' + path.encode() + b'"'
+
+    return PAGE_LINK.sub(replace, content)
+
+
+def rewrite_asset_links(content):
+    """Point static asset references at their fingerprinted names"""
+    def replace(match):
+        hashed = _asset_map.get(match.group(1))
+        return match.group(0) if hashed is None else settings.STATIC_URL.encode() + hashed
+
+    return _asset_link.sub(replace, content)
+
+
+def finish_content(content, pagination=None):
+    """Apply the export's link rewrites to rendered HTML"""
+    if pagination:
+        content = rewrite_page_links(content, pagination)
+    if _asset_map:
+        content = rewrite_asset_links(content)
+    return content.replace(*_search_action)
+
+
+def write_page(path, content):
+    """Write `content` under the output directory, if there is one; returns its sha256"""
+    if _output_dir is not None:
+        output_file = _output_dir / path
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        output_file.write_bytes(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def render_template_page(template_name, path, context=None):
+    """
+    Render a template that has no URL of its own (e.g. the static search
+    page) and write it like a page; returns the content.
+    Requires init_worker() in this process.
+    """
+    request = anonymous_request('/' + path)
+    content = finish_content(render_to_string(template_name, context, request=request).encode())
+    write_page(path, content)
+    return content
+
+
+def render_page(page):
+    """Render one page and write it under the output directory"""
+    started = time.perf_counter()
+    try:
+        status, content = _fetch(page.url)
+        digest = None
+        if status == 200:
+            content = finish_content(content, page.pagination)
+            digest = write_page(page.path, content)
+        returned = content if _output_dir is None and status == 200 else None
+        return PageResult(page, status, time.perf_counter() - started, None, digest, returned)
+    except Exception as e:
+        return PageResult(page, None, time.perf_counter() - started, str(e))
+
+
+def render_pages(pages, output_dir, workers=1, window_per_worker=32, asset_map=None, mode='direct'):
+    """
+    Render `pages` (any iterable) and yield a PageResult for each, in order.
+    With workers > 1 pages are spread over a process pool. `pages` is still
+    consumed lazily then: workers never fork from this process, so listing
+    pages may query the database while they start.
+    """
+    if workers <= 1:
+        init_worker(output_dir, close_connections=False, asset_map=asset_map, mode=mode)
+        for page in pages:
+            yield render_page(page)
+        return
+
+    # Children must not share the parent's sockets
+    connections.close_all()
+    window = workers * window_per_worker
+    initargs = (output_dir and str(output_dir), True, asset_map, mode)
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(POOL_START_METHOD),
+        initializer=init_worker, initargs=initargs,
+    ) as executor:
+        pending = deque()
+        for page in pages:
+            pending.append(executor.submit(render_page, page))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
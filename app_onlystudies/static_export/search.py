@@ -0,0 +1,185 @@
+"""
+Client-side search index for the static export.
+
+Exported blog posts and forum threads are tokenised and stemmed (the same
+rules are implemented in static/js/static-search.js) into an inverted index
+without positions: term -> [doc, term frequency, ...] with doc ids
+delta-encoded. The index is written as small JSON shards keyed by term
+prefix, and a prefix is split further while its shard exceeds
+`max_shard_bytes`, so a query downloads only the shards of its own terms.
+Document titles and URLs live in fixed-size `docs/<n>.json` shards, fetched
+only for the results being shown.
+
+search/
+  manifest.json     shard prefixes, document count, docs per shard
+  index/<prefix>.json
+  docs/<n>.json
+"""
+
+import json
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from app_onlystudies.models import BlogPost, ForumAnswer, ForumQuestion
+
+SEARCH_DIR = 'search'
+DOCS_PER_SHARD = 500
+MAX_SHARD_BYTES = 64 * 1024
+TITLE_WEIGHT = 3
+
+TOKEN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by can do for from has have how i if in into is it its of on or '
+    'so that the their then there these this to was we what when where which who why will with '
+    'you your'.split()
+)
+# (suffix, replacement, minimum stem length left), first match wins
+SUFFIX_RULES = (
+    ('sses', 'ss', 2),
+    ('ies', 'y', 2),
+    ('ing', '', 3),
+    ('ed', '', 3),
+    ('ly', '', 3),
+    ('s', '', 3),
+)
+
+
+def stem(word):
+    """Light suffix stripping; must stay in sync with stem() in static-search.js"""
+    for suffix, replacement, minimum in SUFFIX_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= minimum:
+            if suffix == 's' and word.endswith(('ss', 'us', 'is')):
+                return word
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def tokenize(text):
+    """Yield index terms of `text`"""
+    for word in TOKEN.findall(text.lower()):
+        if len(word) > 1 and word not in STOP_WORDS:
+            yield stem(word)
+
+
+def iter_documents():
+    """
+    Yield (key, title, url, text) for every exported post and thread, then
+    (key, None, None, text) for each forum answer to merge into its thread.
+    """
+    posts = (
+        BlogPost.objects.filter(is_published=True).order_by('pk')
+        .values_list('pk', 'slug', 'title', 'content').iterator(chunk_size=2000)
+    )
+    for pk, slug, title, content in posts:
+        yield ('blogpost', pk), title, f'/blog/{slug}.html', content
+    questions = (
+        ForumQuestion.objects.order_by('pk')
+        .values_list('pk', 'slug', 'title', 'content').iterator(chunk_size=2000)
+    )
+    for pk, slug, title, content in questions:
+        yield ('forumquestion', pk), title, f'/forum/{slug}.html', content
+    answers = ForumAnswer.objects.order_by('question_id').values_list('question_id', 'content').iterator(chunk_size=2000)
+    for question_id, content in answers:
+        yield ('forumquestion', question_id), None, None, content
+
+
+def write_if_changed(path, data):
+    """Write `data` unless the file already holds it (keeps mtimes of unchanged shards)"""
+    content = json.dumps(data, separators=(',', ':'), sort_keys=True)
+    if path.exists() and path.read_text(encoding='utf-8') == content:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding='utf-8')
+
+
+def shard_postings(postings, max_shard_bytes, prefix_length=2):
+    """Group terms into {prefix: {term: postings}}, splitting oversized prefixes"""
+    groups = defaultdict(dict)
+    for term, encoded in postings.items():
+        groups[term[:prefix_length]][term] = encoded
+    shards = {}
+    for prefix, terms in groups.items():
+        size = len(json.dumps(terms, separators=(',', ':')))
+        longer = [term for term in terms if len(term) > prefix_length]
+        if size > max_shard_bytes and longer:
+            # Terms equal to the prefix itself stay in the prefix shard
+            shards[prefix] = {term: encoded for term, encoded in terms.items() if len(term) <= prefix_length}
+            shards.update(shard_postings(
+                {term: terms[term] for term in longer}, max_shard_bytes, prefix_length + 1,
+            ))
+        else:
+            shards[prefix] = terms
+    return {prefix: terms for prefix, terms in shards.items() if terms}
+
+
+def build_search_index(output_dir, docs_per_shard=DOCS_PER_SHARD, max_shard_bytes=MAX_SHARD_BYTES, write=None):
+    """
+    Build the search index under `output_dir`/search; returns (documents, shards).
+    With `write(name, content)` files are handed to it (e.g. an archive) instead.
+    """
+    if write is None:
+        root = Path(output_dir) / SEARCH_DIR
+        save = lambda name, data: write_if_changed(root / name, data)
+    else:
+        save = lambda name, data: write(f'{SEARCH_DIR}/{name}', json.dumps(data, separators=(',', ':'), sort_keys=True))
+    doc_ids = {}
+    doc_shard = []
+    postings = defaultdict(list)  # term -> [(doc, tf), ...] in doc order
+
+    def index(doc, counts):
+        for term, count in counts.items():
+            postings[term].append((doc, count))
+
+    for key, title, url, text in iter_documents():
+        if title is None:
+            # Answers arrive after every thread has an id; append extra counts
+            doc = doc_ids.get(key)
+            if doc is not None:
+                index(doc, Counter(tokenize(text)))
+            continue
+        doc = doc_ids[key] = len(doc_ids)
+        counts = Counter(tokenize(text))
+        for term in tokenize(title):
+            counts[term] += TITLE_WEIGHT
+        index(doc, counts)
+        doc_shard.append([title, url])
+        if len(doc_shard) == docs_per_shard:
+            save(f'docs/{doc // docs_per_shard}.json', doc_shard)
+            doc_shard = []
+    if doc_shard:
+        save(f'docs/{(len(doc_ids) - 1) // docs_per_shard}.json', doc_shard)
+
+    encoded = {}
+    for term, entries in postings.items():
+        merged = Counter()
+        for doc, count in entries:
+            merged[doc] += count
+        flat, previous = [], 0
+        for doc in sorted(merged):
+            flat += [doc - previous, merged[doc]]
+            previous = doc
+        encoded[term] = flat
+    del postings
+
+    shards = shard_postings(encoded, max_shard_bytes)
+    for prefix in sorted(shards):
+        save(f'index/{prefix}.json', shards[prefix])
+    save('manifest.json', {
+        'documents': len(doc_ids),
+        'docs_per_shard': docs_per_shard,
+        'shards': sorted(shards),
+    })
+
+    if write is not None:
+        return len(doc_ids), len(shards)
+
+    # Drop shards left over from a previous, differently shaped index
+    doc_shards = {f'{number}.json' for number in range((len(doc_ids) + docs_per_shard - 1) // docs_per_shard)}
+    for path in (root / 'docs').glob('*.json'):
+        if path.name not in doc_shards:
+            path.unlink()
+    for path in (root / 'index').glob('*.json'):
+        if path.stem not in shards:
+            path.unlink()
+    return len(doc_ids), len(shards)
@@ -0,0 +1,87 @@
+"""
+Streaming sitemap writer for the static export.
+
+URLs are written to `sitemap-<n>.xml` shards as they are produced, a new
+shard being started every `shard_size` URLs (50,000 is the protocol limit),
+and `sitemap.xml` is written last as a sitemap index pointing at the shards.
+Only the open shard is ever held, so memory does not grow with the site.
+When writing into an archive the open shard is buffered and added to the
+archive once complete.
+"""
+
+import io
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+MAX_URLS_PER_SHARD = 50000
+
+URLSET_OPEN = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = '</urlset>\n'
+
+
+class SitemapWriter:
+    """
+    Write sitemap shards and their index under `output_dir`.
+    Call add() for every URL, then close().
+    """
+
+    def __init__(self, output_dir, base_url, shard_size=MAX_URLS_PER_SHARD, archive=None):
+        self.output_dir = Path(output_dir) if output_dir is not None else None
+        self.archive = archive
+        self.base_url = base_url.rstrip('/')
+        self.shard_size = shard_size
+        self.shards = 0
+        self.urls = 0
+        self._file = None
+        self._in_shard = 0
+
+    def _open(self, name):
+        if self.archive is not None:
+            return io.StringIO()
+        return open(self.output_dir / name, 'w', encoding='utf-8')
+
+    def _close(self, name, file):
+        if self.archive is not None:
+            self.archive.write(name, file.getvalue())
+        file.close()
+
+    def _open_shard(self):
+        self.shards += 1
+        self._file = self._open(f'sitemap-{self.shards}.xml')
+        self._file.write(URLSET_OPEN)
+        self._in_shard = 0
+
+    def _close_shard(self):
+        if self._file is not None:
+            self._file.write(URLSET_CLOSE)
+            self._close(f'sitemap-{self.shards}.xml', self._file)
+            self._file = None
+
+    def add(self, path, lastmod=None):
+        """Add the page at `path` (relative to the export root)"""
+        if self._file is None or self._in_shard >= self.shard_size:
+            self._close_shard()
+            self._open_shard()
+        entry = f'  <url><loc>{escape(f"{self.base_url}/{path}")}</loc>'
+        if lastmod:
+            entry += f'<lastmod>{lastmod}</lastmod>'
+        self._file.write(entry + '</url>\n')
+        self._in_shard += 1
+        self.urls += 1
+
+    def close(self):
+        """Finish the open shard, write the index and remove shards left by a larger previous run"""
+        self._close_shard()
+        index = self._open('sitemap.xml')
+        index.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        index.write('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+        for number in range(1, self.shards + 1):
+            index.write(f'  <sitemap><loc>{escape(f"{self.base_url}/sitemap-{number}.xml")}</loc></sitemap>\n')
+        index.write('</sitemapindex>\n')
+        self._close('sitemap.xml', index)
+        if self.output_dir is None:
+            return
+        for stale in self.output_dir.glob('sitemap-*.xml'):
+            number = stale.stem.partition('-')[2]
+            if not number.isdigit() or int(number) > self.shards:
+                stale.unlink()
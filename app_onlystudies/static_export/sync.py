@@ -0,0 +1,116 @@
+"""
+rsync-style synchronisation of STATICFILES_DIRS into the export.
+
+A file is copied only when it is missing from the destination or differs
+from its source. Size and mtime are compared first; the content hash is
+computed only when sizes match but mtimes do not, so unchanged files cost
+one stat() each. Copies are hardlinked when source and destination share a
+filesystem and fall back to a regular copy otherwise (a hardlinked file
+shares its bytes with the source, so exported copies are never edited in
+place; new content is always written to a new file). Destination files
+without a source are deleted unless `keep` says they are generated.
+"""
+
+import hashlib
+import os
+import shutil
+from collections import namedtuple
+from pathlib import Path
+
+SyncStats = namedtuple(
+    'SyncStats', ['copied', 'linked', 'skipped', 'deleted', 'bytes_copied', 'bytes_skipped'],
+)
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def source_files(locations):
+    """
+    Map relative name -> source path over all `locations`.
+    As with Django's finders, the first location providing a name wins.
+    """
+    files = {}
+    for location in locations:
+        location = Path(location)
+        if not location.exists():
+            continue
+        for path in sorted(location.rglob('*')):
+            if path.is_file():
+                files.setdefault(path.relative_to(location).as_posix(), path)
+    return files
+
+
+def is_same(source, dest):
+    """True if `dest` already holds the content of `source`"""
+    try:
+        source_stat, dest_stat = source.stat(), dest.stat()
+    except FileNotFoundError:
+        return False
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    if file_digest(source) == file_digest(dest):
+        # Same bytes: align the mtime so the next run takes the fast path
+        shutil.copystat(source, dest)
+        return True
+    return False
+
+
+def place(source, dest, link=True):
+    """Replace `dest` with `source`; returns True if a hardlink was used"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    temporary = dest.with_name(f'.{dest.name}.sync')
+    temporary.unlink(missing_ok=True)
+    linked = False
+    if link:
+        try:
+            os.link(source, temporary)
+            linked = True
+        except OSError:
+            pass
+    if not linked:
+        shutil.copy2(source, temporary)
+    os.replace(temporary, dest)
+    return linked
+
+
+def sync_tree(locations, dest, keep=None, link=True):
+    """
+    Make `dest` mirror the files of `locations`.
+    `keep(name)` marks extra destination files (by relative name) that must
+    survive orphan deletion. Returns (names synced, SyncStats).
+    """
+    dest = Path(dest)
+    files = source_files(locations)
+    copied = linked = skipped = deleted = bytes_copied = bytes_skipped = 0
+
+    for name, source in files.items():
+        target = dest / name
+        size = source.stat().st_size
+        if is_same(source, target):
+            skipped += 1
+            bytes_skipped += size
+            continue
+        if place(source, target, link=link):
+            linked += 1
+        else:
+            copied += 1
+        bytes_copied += size
+
+    if dest.exists():
+        for path in sorted(dest.rglob('*'), reverse=True):
+            name = path.relative_to(dest).as_posix()
+            if path.is_file() and name not in files and not (keep and keep(name)):
+                path.unlink()
+                deleted += 1
+            elif path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+
+    return sorted(files), SyncStats(copied, linked, skipped, deleted, bytes_copied, bytes_skipped)
@@ -0,0 +1,181 @@
+"""
+Content-addressed media storage.
+
+ContentAddressedStorage wraps the configured media storage (the local
+filesystem in development, Cloudinary in production). Uploads are hashed
+while they are streamed into a spooled temporary file and stored under
+their SHA-256:
+
+    blog/3f/a9c4...e1.png
+
+so uploading the same bytes again, under any file name, resolves to the
+object already stored: nothing is written, and the CDN caches one URL.
+
+Every stored object has a MediaBlob row whose refcount counts the model
+fields pointing at it; signals keep it up to date (see signals.py) and
+`manage.py gc_media` deletes objects nobody references any more.
+`manage.py dedupe_media` moves files stored before this to their
+content-addressed names.
+
+media_url() resolves names to URLs once per process: a content-addressed
+name always denotes the same bytes, so its URL never changes, and storages
+that sign URLs (Cloudinary) are asked only the first time an image is shown.
+"""
+
+import hashlib
+import posixpath
+import re
+import tempfile
+from functools import lru_cache
+
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.core.signals import setting_changed
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+# Uploads larger than this are spooled to disk while they are hashed
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# Resolved URLs kept per process
+URL_CACHE_SIZE = 4096
+
+CONTENT_NAME = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{62}(?:\.[\w]+)?$')
+
+
+def is_content_name(name):
+    """True if `name` is a content-addressed storage name"""
+    return bool(CONTENT_NAME.search(name or ''))
+
+
+def content_name(directory, digest, extension):
+    return posixpath.join(directory, digest[:2], digest[2:] + extension.lower())
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    """
+    Storage that names files by the SHA-256 of their content.
+    `backend` is the storage the objects are kept in (default_storage when None).
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend or default_storage
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content, which never collides
+        return name
+
+    def _save(self, name, content):
+        hasher = hashlib.sha256()
+        size = 0
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks(HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+            digest = hasher.hexdigest()
+            directory, filename = posixpath.split(name)
+            target = content_name(directory, digest, posixpath.splitext(filename)[1])
+            if not self.backend.exists(target):
+                spool.seek(0)
+                saved = self.backend.save(target, File(spool, name=target))
+                if saved != target:
+                    # Another upload of the same bytes won the race; keep its copy
+                    self.backend.delete(saved)
+        register_blob(target, digest, size)
+        return target
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def delete(self, name):
+        self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+def file_digest(storage, name):
+    """(sha256, size) of the file `name` in `storage`"""
+    hasher = hashlib.sha256()
+    size = 0
+    with storage.open(name, 'rb') as stream:
+        while chunk := stream.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    """Storage of content-addressed model file fields"""
+    return content_addressed_storage
+
+
+def register_blob(name, digest, size):
+    """Record the stored object `name`; new objects start unreferenced"""
+    from .models import MediaBlob
+    MediaBlob.objects.get_or_create(name=name, defaults={'sha256': digest, 'size': size})
+
+
+def adjust_references(added=None, removed=None, count=1):
+    """Count `count` fields pointing at `added` instead of `removed` (either may be empty)"""
+    from .models import MediaBlob
+    if added == removed:
+        return
+    if added:
+        MediaBlob.objects.filter(name=added).update(refcount=F('refcount') + count)
+    if removed:
+        MediaBlob.objects.filter(name=removed).update(refcount=F('refcount') - count)
+
+
+def media_url(name, storage=None):
+    """
+    URL of the stored file `name` ('' for an empty name). Absolute URLs
+    saved in the field are returned as they are; others are resolved by
+    `storage` (default_storage when None) once and then cached.
+    """
+    if not name:
+        return ''
+    if name.startswith(('http://', 'https://')):
+        return name
+    return _resolve_url(storage or default_storage, name)
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _resolve_url(storage, name):
+    if isinstance(storage, ContentAddressedStorage):
+        # Key on the backend so wrappers of one storage share entries
+        return _resolve_url(storage.backend, name)
+    return storage.url(name)
+
+
+@receiver(setting_changed)
+def reset_url_cache(setting, **kwargs):
+    if setting in ('MEDIA_URL', 'STORAGES'):
+        _resolve_url.cache_clear()
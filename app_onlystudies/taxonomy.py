@@ -0,0 +1,109 @@
+"""
+Process-wide cache of the category/subcategory tree.
+
+The tree changes rarely but is read on almost every request (navbar, filters,
+category pages). Each process keeps one immutable snapshot built from a single
+query and rebuilds it only when the shared version key in the `taxonomy`
+cache (a database cache, shared by all processes) changes. Saving or deleting a
+Category/SubCategory bumps that version once its transaction commits (see
+signals.py), so no process can rebuild from uncommitted rows under the new
+version. A process reads the version at most every VERSION_CHECK_SECONDS and
+trusts its snapshot in between: every process picks a change up within that
+time, and in steady state almost no lookup touches the cache or the database.
+"""
+
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Category, SubCategory
+
+CACHE_ALIAS = 'taxonomy'
+VERSION_KEY = 'app_onlystudies:taxonomy-version'
+# How long a process serves its snapshot before reading the version again
+VERSION_CHECK_SECONDS = 5
+
+# Model.from_db() expects values in concrete field order
+CATEGORY_FIELDS = [field.attname for field in Category._meta.concrete_fields]
+SUBCATEGORY_FIELDS = [field.attname for field in SubCategory._meta.concrete_fields]
+
+_snapshot = None
+_checked_at = None
+
+
+class Taxonomy:
+    """
+    Immutable snapshot of the category tree.
+    Categories are real model instances (usable in templates and ORM filters)
+    with their subcategories preloaded as `category.subcategory_list`.
+    """
+
+    def __init__(self, version, categories):
+        self.version = version
+        self.categories = categories
+        self._by_slug = {category.slug: category for category in categories}
+        self._subcategories = {
+            (category.slug, subcategory.slug): subcategory
+            for category in categories
+            for subcategory in category.subcategory_list
+        }
+
+    def get_category(self, slug):
+        """Return the category with `slug`, or None"""
+        return self._by_slug.get(slug)
+
+    def get_subcategory(self, category_slug, subcategory_slug):
+        """Return the subcategory with these slugs, or None"""
+        return self._subcategories.get((category_slug, subcategory_slug))
+
+
+def build_taxonomy(version=None):
+    """Build a snapshot with one LEFT JOIN query over categories and subcategories"""
+    db = Category.objects.db
+    rows = Category.objects.order_by('pk', 'subcategories__pk').values_list(
+        *CATEGORY_FIELDS,
+        *(f'subcategories__{field.name}' for field in SubCategory._meta.concrete_fields),
+    )
+    width = len(CATEGORY_FIELDS)
+    categories = []
+    for row in rows:
+        if not categories or categories[-1].pk != row[0]:
+            category = Category.from_db(db, CATEGORY_FIELDS, row[:width])
+            category.subcategory_list = []
+            categories.append(category)
+        if row[width] is not None:
+            subcategory = SubCategory.from_db(db, SUBCATEGORY_FIELDS, row[width:])
+            subcategory.category = categories[-1]
+            categories[-1].subcategory_list.append(subcategory)
+    return Taxonomy(version, categories)
+
+
+def get_taxonomy():
+    """Return the current snapshot, rebuilding it if the version has moved on"""
+    global _snapshot, _checked_at
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is not None and now - _checked_at < VERSION_CHECK_SECONDS:
+        return snapshot
+    cache = caches[CACHE_ALIAS]
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    if snapshot is None or snapshot.version != version:
+        snapshot = _snapshot = build_taxonomy(version)
+    _checked_at = now
+    return snapshot
+
+
+def publish_version():
+    global _snapshot
+    _snapshot = None
+    caches[CACHE_ALIAS].set(VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def invalidate_taxonomy():
+    """Publish a new version, once the current transaction commits, so every process rebuilds its snapshot"""
+    transaction.on_commit(publish_version)
@@ -0,0 +1,86 @@
+from functools import lru_cache
+from pathlib import PurePosixPath
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from app_onlystudies.images import MIME_TYPES, MODERN_FORMATS, modern_sources, post_manifest, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(post, sizes):
+    """
+    srcset and sizes attributes for the featured image of `post`, to add to
+    its <img> tag; empty when the image has no variants.
+    Usage: <img src="..." {% image_srcset post "(min-width: 768px) 50vw, 100vw" %}>
+    """
+    candidates = srcset(post_manifest(post))
+    if not candidates:
+        return ''
+    return format_html('srcset="{}" sizes="{}"', candidates, sizes)
+
+
+@register.simple_tag
+def image_sources(post, sizes):
+    """
+    <source> elements offering the AVIF/WebP variants of the featured image
+    of `post`, to put before its <img> inside a <picture>.
+    Usage: <picture>{% image_sources post sizes %}<img ...></picture>
+    """
+    return format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime_type, candidates, sizes) for mime_type, candidates in modern_sources(post_manifest(post))),
+    )
+
+
+@register.simple_tag
+def image_size(post, width, height):
+    """
+    width and height attributes with the intrinsic size of the featured image
+    of `post`, or the given defaults when it is not known.
+    Usage: <img src="..." {% image_size post 400 180 %}>
+    """
+    manifest = post_manifest(post)
+    return format_html(
+        'width="{}" height="{}"', manifest.get('width', width), manifest.get('height', height),
+    )
+
+
+@register.simple_tag
+def image_placeholder(post):
+    """
+    CSS painting the inline placeholder of the featured image of `post` as the
+    background of its <img>, to append to the style attribute; empty without one.
+    Usage: <img src="..." style="object-fit: cover;{% image_placeholder post %}">
+    """
+    placeholder = post_manifest(post).get('placeholder')
+    if not placeholder:
+        return ''
+    return format_html(" background: url('{}') center / cover no-repeat;", placeholder)
+
+
+@lru_cache(maxsize=None)
+def static_siblings(path):
+    """Static paths of the converted copies of `path` that exist, best format first"""
+    siblings = []
+    for extension, pillow_format, options in MODERN_FORMATS:
+        sibling = str(PurePosixPath(path).with_suffix(f'.{extension}'))
+        if finders.find(sibling):
+            siblings.append((MIME_TYPES[extension], sibling))
+    return tuple(siblings)
+
+
+@register.simple_tag
+def static_sources(path):
+    """
+    <source> elements for the .avif/.webp copies of the static image `path`
+    made by convert_static_images, to put before its <img> inside a <picture>.
+    """
+    return format_html_join(
+        '', '<source type="{}" srcset="{}">',
+        ((mime_type, static(sibling)) for mime_type, sibling in static_siblings(path)),
+    )
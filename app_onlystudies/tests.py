@@ -1,8 +1,35 @@
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth.models import User
 from django.urls import reverse
-from datetime import datetime
-from app_onlystudies.models import Category, SubCategory, BlogPost, Notification
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.paginator import EmptyPage
+from django.core.files.storage import FileSystemStorage
+from django.core import signing
+from django.core.cache import caches
+from io import BytesIO, StringIO
+from pathlib import Path
+import csv
+import tempfile
+import time
+from unittest import mock
+from django.utils import timezone
+from datetime import datetime, timedelta
+from app_onlystudies.models import (
+    Category, SubCategory, BlogPost, Notification, Task, Appointment, SentReminder, ForumQuestion, ForumAnswer, MediaBlob,
+)
+from app_onlystudies import ical
+from app_onlystudies.images import MODERN_FORMATS, modern_sources, refresh_in_background, srcset, variant_name
+from app_onlystudies.pagination import EstimatedCountPaginator
+from app_onlystudies.taxonomy import VERSION_CHECK_SECONDS, VERSION_KEY, get_taxonomy, invalidate_taxonomy
+from app_onlystudies.forms import AppointmentForm
+from app_onlystudies.scheduling import IntervalIndex, appointments_between, day_start, find_conflict, next_free_slots
+from app_onlystudies.static_export.sitemap import SitemapWriter
+from app_onlystudies.static_export.assets import precompress
+from app_onlystudies.static_export.sync import sync_tree
+from app_onlystudies.static_export.search import build_search_index, tokenize
 import json
 
 
@@ -213,6 +240,18 @@ class BlogPostModelTest(TestCase):
         posts = list(BlogPost.objects.all())
         self.assertEqual(posts[0], blog2)  # Most recent first
 
+    def test_featured_image_url(self):
+        """Test featured_image_url passes remote URLs through and resolves stored names once"""
+        self.assertEqual(self.blog_post.featured_image_url, '')
+        self.blog_post.featured_image = 'https://res.cloudinary.com/demo/image/upload/sample.jpg'
+        self.assertEqual(self.blog_post.featured_image_url, 'https://res.cloudinary.com/demo/image/upload/sample.jpg')
+
+        self.blog_post.featured_image = 'blog/aa/cached.png'
+        with mock.patch.object(FileSystemStorage, 'url', autospec=True, return_value='/media/blog/aa/cached.png') as url:
+            for _ in range(3):
+                self.assertEqual(self.blog_post.featured_image_url, '/media/blog/aa/cached.png')
+        self.assertEqual(url.call_count, 1)
+
 
 class NotificationModelTest(TestCase):
     """Test cases for Notification model"""
@@ -404,4 +443,1340 @@ class NotificationsAPITest(TestCase):
                 self.assertIn(field, notif)
 
 
+class CalendarFeedTest(TestCase):
+    """Test cases for the tokenised iCalendar feed"""
+
+    def setUp(self):
+        """Create a user with an appointment and a dated task"""
+        self.client = Client()
+        self.user = User.objects.create_user(username='feeduser', password='testpass123')
+        self.other_user = User.objects.create_user(username='otheruser', password='testpass123')
+        soon = timezone.now() + timedelta(days=2)
+        Appointment.objects.create(
+            title='Career counselling, room 4',
+            appointment_datetime=soon,
+            created_by=self.user,
+        )
+        Task.objects.create(title='Submit thesis', due_date=soon, created_by=self.user)
+        Task.objects.create(title='Undated task', created_by=self.user)
+        Appointment.objects.create(
+            title='Someone else',
+            appointment_datetime=soon,
+            created_by=self.other_user,
+        )
+        self.url = f"{reverse('calendar_feed')}?token={ical.make_feed_token(self.user)}"
+
+    def test_feed_requires_valid_token(self):
+        """Test feed returns 404 for a missing or tampered token"""
+        self.assertEqual(self.client.get(reverse('calendar_feed')).status_code, 404)
+        response = self.client.get(f"{reverse('calendar_feed')}?token={self.user.pk}:forged")
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_contains_users_events_and_todos(self):
+        """Test feed streams the user's appointments and dated tasks only"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn('SUMMARY:Career counselling\\, room 4', body)
+        self.assertIn('SUMMARY:Submit thesis', body)
+        self.assertNotIn('Undated task', body)
+        self.assertNotIn('Someone else', body)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertEqual(body.count('BEGIN:VTODO'), 1)
+
+    def test_rotating_the_key_revokes_feed_links(self):
+        """Test resetting the calendar link revokes old tokens, including unversioned ones"""
+        legacy = f"{reverse('calendar_feed')}?token={signing.Signer(salt=ical.FEED_TOKEN_SALT).sign(str(self.user.pk))}"
+        self.assertEqual(self.client.get(legacy).status_code, 200)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('rotate_calendar_feed')).status_code, 405)
+        response = self.client.post(reverse('rotate_calendar_feed'))
+        self.assertRedirects(response, reverse('appointments'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(legacy).status_code, 404)
+
+        new_url = f"{reverse('calendar_feed')}?token={ical.make_feed_token(self.user)}"
+        self.assertNotEqual(new_url, self.url)
+        self.assertEqual(self.client.get(new_url).status_code, 200)
+        self.assertContains(self.client.get(reverse('appointments')), new_url.replace('&', '&amp;'))
+        other = f"{reverse('calendar_feed')}?token={ical.make_feed_token(self.other_user)}"
+        self.assertEqual(self.client.get(other).status_code, 200)
+
+    def test_feed_etag_returns_not_modified(self):
+        """Test polling with a matching ETag returns 304 until data changes"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Task.objects.create(title='New task', due_date=timezone.now() + timedelta(days=1), created_by=self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_long_lines_are_folded(self):
+        """Test content lines are folded to 75 octets"""
+        line = ical.fold_line('DESCRIPTION:' + 'é' * 80)
+        for part in line.split('\r\n'):
+            self.assertLessEqual(len(part.encode('utf-8')), 75)
+
+
+class AppointmentSchedulingTest(TestCase):
+    """Test cases for appointment durations, overlap detection and free slots"""
+
+    def setUp(self):
+        """Create a user with a 10:00-11:00 appointment tomorrow"""
+        self.client = Client()
+        self.user = User.objects.create_user(username='scheduser', password='testpass123')
+        self.day = (timezone.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        self.appointment = Appointment.objects.create(
+            title='Tutoring',
+            appointment_datetime=self.day,
+            duration_minutes=60,
+            created_by=self.user,
+        )
+
+    def test_end_datetime_derived_from_duration(self):
+        """Test end_datetime is computed on save"""
+        self.assertEqual(self.appointment.end_datetime, self.day + timedelta(hours=1))
+        self.appointment.duration_minutes = 30
+        self.appointment.save(update_fields=['duration_minutes'])
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.end_datetime, self.day + timedelta(minutes=30))
+
+    def test_find_conflict(self):
+        """Test overlapping ranges conflict and touching ranges do not"""
+        self.assertEqual(
+            find_conflict(self.user, self.day + timedelta(minutes=30), self.day + timedelta(minutes=90)),
+            self.appointment,
+        )
+        self.assertIsNone(find_conflict(self.user, self.day + timedelta(hours=1), self.day + timedelta(hours=2)))
+        self.assertIsNone(find_conflict(self.user, self.day, self.day + timedelta(hours=1), exclude_pk=self.appointment.pk))
+
+    def test_form_rejects_overlapping_booking(self):
+        """Test the booking form reports a conflict"""
+        form = AppointmentForm(data={
+            'title': 'Overlap',
+            'appointment_datetime': (self.day + timedelta(minutes=45)).strftime('%Y-%m-%dT%H:%M'),
+            'duration_minutes': 30,
+        }, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('appointment_datetime', form.errors)
+
+    def test_admin_enforces_duration_bounds_and_overlaps(self):
+        """Test the admin change form runs the same duration and overlap checks as the booking form"""
+        admin = User.objects.create_superuser(username='scheduler', email='s@test.com', password='testpass123')
+        self.client.force_login(admin)
+        url = reverse('admin:app_onlystudies_appointment_add')
+        data = {
+            'title': 'Overlap', 'notes': '', 'created_by': self.user.pk,
+            'appointment_datetime_0': timezone.localtime(self.day).strftime('%Y-%m-%d'),
+            'appointment_datetime_1': timezone.localtime(self.day + timedelta(minutes=30)).strftime('%H:%M:%S'),
+            'duration_minutes': 30,
+        }
+        response = self.client.post(url, data)
+        self.assertContains(response, 'This overlaps &quot;Tutoring&quot;')
+        response = self.client.post(url, {**data, 'duration_minutes': 5000, 'appointment_datetime_0': '2030-01-01'})
+        self.assertContains(response, 'Duration must be between 5 minutes and 12 hours.')
+        self.assertEqual(Appointment.objects.count(), 1)
+
+        response = self.client.post(url, {**data, 'appointment_datetime_0': '2030-01-01'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_booking_view_creates_non_overlapping_appointment(self):
+        """Test booking a free slot succeeds"""
+        self.client.login(username='scheduser', password='testpass123')
+        response = self.client.post(reverse('book_appointment'), {
+            'title': 'Free slot',
+            'appointment_datetime': (self.day + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            'duration_minutes': 30,
+        })
+        self.assertRedirects(response, reverse('appointments'))
+        self.assertEqual(Appointment.objects.filter(created_by=self.user).count(), 2)
+
+    def test_interval_index_gaps(self):
+        """Test the in-memory index finds overlaps and gaps"""
+        index = IntervalIndex([(1, 3), (5, 6), (2, 4)])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.overlapping(3, 5), (1, 4))
+        self.assertIsNone(index.overlapping(4, 5))
+        self.assertEqual(list(index.gaps(0, 8)), [(0, 1), (4, 5), (6, 8)])
+        with self.assertRaises(ValueError):
+            index.add(5, 7)
+
+    def test_next_free_slots_skip_booked_time(self):
+        """Test free slot search steps around existing appointments"""
+        slots = next_free_slots(self.user, timedelta(hours=1), after=self.day - timedelta(hours=1), count=3)
+        self.assertEqual([start for start, end in slots], [
+            self.day - timedelta(hours=1),
+            self.day + timedelta(hours=1),
+            self.day + timedelta(hours=2),
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            slots = next_free_slots(self.user, timedelta(hours=1), after=self.day + timedelta(minutes=30), count=1)
+        self.assertEqual(slots, [(self.day + timedelta(hours=1), self.day + timedelta(hours=2))])
+        self.assertIn('"appointment_datetime" >=', queries.captured_queries[0]['sql'])
+
+    def test_free_slots_api(self):
+        """Test free slots API requires login and returns slots"""
+        self.assertEqual(self.client.get(reverse('appointment_free_slots_api')).status_code, 401)
+        self.client.login(username='scheduser', password='testpass123')
+        response = self.client.get(reverse('appointment_free_slots_api'), {'duration': 30, 'count': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['slots']), 2)
+
+
+class AppointmentCalendarTest(TestCase):
+    """Test cases for the range-bounded appointment API and calendar view"""
+
+    def setUp(self):
+        """Create a long appointment history plus one appointment in the test window"""
+        self.client = Client()
+        self.user = User.objects.create_user(username='caluser', password='testpass123')
+        self.client.login(username='caluser', password='testpass123')
+        past = timezone.now() - timedelta(days=400)
+        for i in range(30):
+            Appointment.objects.create(
+                title=f'Old {i}',
+                appointment_datetime=past + timedelta(days=i),
+                created_by=self.user,
+            )
+        self.start = (timezone.now() + timedelta(days=3)).replace(hour=23, minute=30, second=0, microsecond=0)
+        self.appointment = Appointment.objects.create(
+            title='Late review',
+            appointment_datetime=self.start,
+            duration_minutes=60,
+            created_by=self.user,
+        )
+        self.first_day = timezone.localdate(self.start) - timedelta(days=1)
+        self.params = {
+            'start': self.first_day.isoformat(),
+            'end': (self.first_day + timedelta(days=6)).isoformat(),
+        }
+
+    def test_api_groups_by_day_within_window(self):
+        """Test API only returns the window and lists midnight-spanning appointments on both days"""
+        response = self.client.get(reverse('appointments_api'), self.params)
+        self.assertEqual(response.status_code, 200)
+        days = json.loads(response.content)['days']
+        self.assertEqual(len(days), 7)
+        titles = [(day['date'], appt['title']) for day in days for appt in day['appointments']]
+        self.assertEqual([title for _, title in titles], ['Late review', 'Late review'])
+
+    def test_api_validates_range(self):
+        """Test API rejects missing, inverted and oversized ranges"""
+        self.assertEqual(self.client.get(reverse('appointments_api')).status_code, 400)
+        response = self.client.get(reverse('appointments_api'), {'start': '2026-02-01', 'end': '2026-01-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('appointments_api'), {'start': '2026-01-01', 'end': '2026-12-31'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_cache_validators(self):
+        """Test API sends ETag/Last-Modified and honours If-None-Match"""
+        response = self.client.get(reverse('appointments_api'), self.params)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(reverse('appointments_api'), self.params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_api_is_one_query(self):
+        """Test the window is served by one appointment query regardless of history"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('appointments_api'), self.params)
+        appointment_queries = [q for q in queries.captured_queries if 'app_onlystudies_appointment' in q['sql']]
+        self.assertEqual(len(appointment_queries), 1)
+        self.assertIn('"appointment_datetime" >=', appointment_queries[0]['sql'])
+
+    def test_window_includes_appointments_started_before_it(self):
+        """Test the lower bound on start still finds the longest appointment reaching into the window"""
+        window_start = day_start(self.first_day)
+        long = Appointment.objects.create(
+            title='Overnight', appointment_datetime=window_start - timedelta(hours=11),
+            duration_minutes=720, created_by=self.user,
+        )
+        appointments = list(appointments_between(self.user, window_start, window_start + timedelta(days=7)))
+        self.assertEqual(appointments, [long, self.appointment])
+
+    def test_calendar_view_renders_month_and_week(self):
+        """Test the calendar page renders both modes"""
+        for mode in ('month', 'week'):
+            response = self.client.get(reverse('appointment_calendar'), {'view': mode, 'date': self.start.date().isoformat()})
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Late review')
+
+    def test_list_view_defaults_to_upcoming(self):
+        """Test the list shows upcoming appointments unless history is requested"""
+        response = self.client.get(reverse('appointments'))
+        self.assertEqual([a.title for a in response.context['appointments']], ['Late review'])
+        response = self.client.get(reverse('appointments'), {'show': 'past'})
+        self.assertEqual(response.context['appointments'][0].title, 'Old 29')
+
+
+class RunRemindersCommandTest(TestCase):
+    """Test cases for the run_reminders management command"""
+
+    def setUp(self):
+        """Create users with items inside and outside the reminder windows"""
+        self.user = User.objects.create_user(username='reminduser', password='testpass123')
+        now = timezone.now()
+        self.soon = Appointment.objects.create(
+            title='Soon', appointment_datetime=now + timedelta(minutes=30), created_by=self.user,
+        )
+        self.later = Appointment.objects.create(
+            title='Later', appointment_datetime=now + timedelta(hours=5), created_by=self.user,
+        )
+        Task.objects.create(title='Due tomorrow', due_date=now + timedelta(hours=20), created_by=self.user)
+        Task.objects.create(title='Due next week', due_date=now + timedelta(days=7), created_by=self.user)
+
+    def run_reminders(self):
+        call_command('run_reminders', stdout=StringIO())
+
+    def reminder_titles(self):
+        return sorted(Notification.objects.filter(notification_type='reminder').values_list('title', flat=True))
+
+    def test_sends_reminders_for_items_in_lead_window(self):
+        """Test reminders are sent only for items inside their lead window"""
+        self.run_reminders()
+        self.assertEqual(self.reminder_titles(), ['Task due soon: Due tomorrow', 'Upcoming appointment: Soon'])
+        self.assertEqual(SentReminder.objects.count(), 2)
+
+    def test_reruns_are_idempotent(self):
+        """Test running again does not duplicate reminders"""
+        self.run_reminders()
+        self.run_reminders()
+        self.assertEqual(Notification.objects.filter(notification_type='reminder').count(), 2)
+
+    def test_rescheduled_item_is_picked_up(self):
+        """Test an item moved into an already scanned window still gets a reminder"""
+        self.run_reminders()
+        self.later.appointment_datetime = timezone.now() + timedelta(minutes=20)
+        self.later.save()
+        self.run_reminders()
+        self.assertIn('Upcoming appointment: Later', self.reminder_titles())
+
+    def test_query_count_independent_of_user_count(self):
+        """Test many users are handled without per-user queries"""
+        for i in range(40):
+            user = User.objects.create_user(username=f'bulk{i}', password='x')
+            Appointment.objects.create(
+                title=f'Bulk {i}',
+                appointment_datetime=timezone.now() + timedelta(minutes=10),
+                created_by=user,
+            )
+        with CaptureQueriesContext(connection) as queries:
+            self.run_reminders()
+        self.assertLess(len(queries), 30)
+        self.assertEqual(Notification.objects.filter(notification_type='reminder').count(), 42)
+
+
+class TaxonomyCacheTest(TestCase):
+    """Test cases for the cached category tree and generated navbar"""
+
+    def setUp(self):
+        """Create a small category tree and start from a fresh snapshot"""
+        self.client = Client()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_taxonomy()
+            self.mba = Category.objects.create(name='MBA', slug='mba')
+            SubCategory.objects.create(category=self.mba, name='Finance', slug='finance')
+            SubCategory.objects.create(category=self.mba, name='Marketing', slug='marketing')
+            Category.objects.create(name='Law', slug='law')
+
+    def test_snapshot_built_with_one_query_then_cached(self):
+        """Test the tree is built in one query (after one version read) and later lookups hit no database"""
+        with self.assertNumQueries(2):
+            taxonomy = get_taxonomy()
+        self.assertEqual([c.slug for c in taxonomy.categories], ['mba', 'law'])
+        self.assertEqual([s.slug for s in taxonomy.get_category('mba').subcategory_list], ['finance', 'marketing'])
+        with self.assertNumQueries(0):
+            subcategory = get_taxonomy().get_subcategory('mba', 'finance')
+            self.assertEqual(str(subcategory), 'MBA - Finance')
+
+    def test_signals_bump_version(self):
+        """Test saving a category invalidates the snapshot once the transaction commits"""
+        version = get_taxonomy().version
+        with self.captureOnCommitCallbacks(execute=True):
+            SubCategory.objects.create(category=self.mba, name='Operations', slug='operations')
+            self.assertEqual(get_taxonomy().version, version)
+        taxonomy = get_taxonomy()
+        self.assertNotEqual(taxonomy.version, version)
+        self.assertIsNotNone(taxonomy.get_subcategory('mba', 'operations'))
+
+    def test_versions_published_elsewhere_are_picked_up(self):
+        """Test a version bumped by another process is seen once the check interval has passed"""
+        taxonomy = get_taxonomy()
+        caches['taxonomy'].set(VERSION_KEY, 'elsewhere', timeout=None)
+        self.assertIs(get_taxonomy(), taxonomy)
+        later = time.monotonic() + VERSION_CHECK_SECONDS
+        with mock.patch('app_onlystudies.taxonomy.time.monotonic', return_value=later):
+            self.assertEqual(get_taxonomy().version, 'elsewhere')
+
+    def test_navbar_generated_from_database(self):
+        """Test the navbar lists database categories and subcategories"""
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, reverse('subcategory', args=['mba', 'marketing']))
+        self.assertContains(response, reverse('category', args=['law']))
+
+    def test_category_pages_use_snapshot(self):
+        """Test category and subcategory pages render from the cache and 404 on unknown slugs"""
+        get_taxonomy()
+        response = self.client.get(reverse('category', args=['mba']))
+        self.assertContains(response, 'Finance')
+        response = self.client.get(reverse('subcategory', args=['mba', 'finance']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('category', args=['nope'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('subcategory', args=['law', 'finance'])).status_code, 404)
+
+
+class GenerateStaticSiteTest(TestCase):
+    """Test cases for the generate_static_site management command"""
+
+    def setUp(self):
+        """Create content to export and a scratch output directory"""
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_taxonomy()
+        self.user = User.objects.create_user(username='exporter', password='testpass123')
+        self.category = Category.objects.create(name='Engineering', slug='engineering')
+        SubCategory.objects.create(category=self.category, name='Civil', slug='civil')
+        BlogPost.objects.create(
+            title='Bridges 101', content='Content ' * 20, author=self.user,
+            category=self.category, slug='bridges-101',
+        )
+        BlogPost.objects.create(
+            title='Draft', content='Draft', author=self.user, slug='draft', is_published=False,
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = Path(self.tmp.name) / 'site'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('generate_static_site', '--output', str(self.output), *args, stdout=out)
+        return out.getvalue()
+
+    def test_exports_public_pages_with_summary(self):
+        """Test pages are written and a timing summary is reported"""
+        output = self.export()
+        for path in ('index.html', 'blog.html', 'categories/engineering.html', 'blog/bridges-101.html'):
+            self.assertTrue((self.output / path).exists(), path)
+        self.assertFalse((self.output / 'blog' / 'draft.html').exists())
+        self.assertIn('0 failed', output)
+        self.assertIn('Slowest pages:', output)
+
+    def test_rejects_invalid_worker_count(self):
+        """Test --workers must be positive"""
+        with self.assertRaises(CommandError):
+            self.export('--workers', '0')
+
+    def test_incremental_rerenders_changed_pages_and_removes_deleted(self):
+        """Test --incremental skips unchanged pages, re-renders changed ones and prunes deleted posts"""
+        self.export()
+        post = BlogPost.objects.create(
+            title='Tunnels', content='Content', author=self.user, slug='tunnels',
+        )
+        output = self.export('--incremental')
+        self.assertIn('Generated blog/tunnels.html', output)
+        self.assertIn('Generated blog.html', output)
+        self.assertNotIn('Generated blog/bridges-101.html', output)
+        self.assertNotIn('Generated about.html', output)
+
+        post.delete()
+        output = self.export('--incremental')
+        self.assertIn('Removed blog/tunnels.html', output)
+        self.assertFalse((self.output / 'blog' / 'tunnels.html').exists())
+        self.assertTrue((self.output / 'blog' / 'bridges-101.html').exists())
+
+    def test_incremental_rerenders_posts_whose_image_changed_in_bulk(self):
+        """Test image fields rewritten without touching updated_at still re-render the post's pages"""
+        self.export()
+        post = BlogPost.objects.get(slug='bridges-101')
+        BlogPost.objects.filter(pk=post.pk).update(featured_image='blog/bridge.png', updated_at=post.updated_at)
+        output = self.export('--incremental')
+        self.assertIn('Generated blog/bridges-101.html', output)
+        self.assertIn('Generated blog.html', output)
+
+        BlogPost.objects.filter(pk=post.pk).update(image_variants={'source': 'blog/bridge.png'})
+        output = self.export('--incremental')
+        self.assertIn('Generated blog/bridges-101.html', output)
+        self.assertNotIn('Generated about.html', output)
+
+    def test_exports_every_list_page_thread_and_sitemap(self):
+        """Test paginated lists, forum threads, nested subcategories and the sitemap are exported"""
+        for number in range(10):
+            BlogPost.objects.create(
+                title=f'Post {number}', content='Content', author=self.user, slug=f'post-{number}',
+            )
+        question = ForumQuestion.objects.create(
+            title='How do arches work?', content='Explain', author=self.user, slug='arches',
+        )
+        self.export('--base-url', 'https://example.com')
+
+        self.assertTrue((self.output / 'categories' / 'engineering' / 'civil.html').exists())
+        self.assertTrue((self.output / 'forum' / 'arches.html').exists())
+        question.refresh_from_db()
+        self.assertEqual(question.views, 0)
+
+        page_two = (self.output / 'blog' / 'page' / '2.html').read_text(encoding='utf-8')
+        self.assertIn('href="/blog.html"', page_two)
+        self.assertNotIn('?page=', page_two)
+        self.assertFalse((self.output / 'blog' / 'page' / '3.html').exists())
+
+        index = (self.output / 'sitemap.xml').read_text(encoding='utf-8')
+        self.assertIn('<loc>https://example.com/sitemap-1.xml</loc>', index)
+        shard = (self.output / 'sitemap-1.xml').read_text(encoding='utf-8')
+        self.assertIn('<loc>https://example.com/forum/arches.html</loc>', shard)
+        self.assertIn('<loc>https://example.com/blog/page/2.html</loc>', shard)
+
+    def test_sitemap_writer_shards_urls(self):
+        """Test the sitemap is split into shards and stale shards are removed"""
+        output = Path(self.tmp.name)
+        (output / 'sitemap-9.xml').write_text('stale')
+        writer = SitemapWriter(output, 'https://example.com/', shard_size=2)
+        for number in range(5):
+            writer.add(f'page-{number}.html')
+        writer.close()
+        self.assertEqual(writer.shards, 3)
+        self.assertEqual(sorted(path.name for path in output.glob('sitemap-*.xml')),
+                         ['sitemap-1.xml', 'sitemap-2.xml', 'sitemap-3.xml'])
+        self.assertEqual((output / 'sitemap-3.xml').read_text().count('<url>'), 1)
+
+    def test_assets_fingerprinted_and_precompressed(self):
+        """Test HTML links to hashed assets and text files get compressed siblings"""
+        self.export()
+        html = (self.output / 'index.html').read_text(encoding='utf-8')
+        self.assertNotIn('/static/css/style.css', html)
+        hashed = sorted((self.output / 'static' / 'css').glob('style.*.css'))
+        self.assertEqual(len(hashed), 1)
+        self.assertIn(f'/static/css/{hashed[0].name}', html)
+        self.assertTrue((self.output / 'index.html.gz').exists())
+        self.assertTrue(hashed[0].with_name(hashed[0].name + '.gz').exists())
+        self.assertFalse((self.output / 'static' / 'img' / 'logo.png.gz').exists())
+        self.assertIn(f'/static/css/{hashed[0].name}\n  Cache-Control', (self.output / '_headers').read_text())
+
+    def test_precompress_remembers_ineffective_compression(self):
+        """Test files not worth compressing are skipped on later runs until they change"""
+        root = Path(self.tmp.name) / 'compress'
+        root.mkdir()
+        (root / 'page.html').write_text('<p>repeated</p>' * 200)
+        (root / 'tiny.json').write_text('{}')
+        self.assertEqual(precompress(root)[0], 2)
+        self.assertTrue((root / 'page.html.gz').exists())
+        self.assertFalse((root / 'tiny.json.gz').exists())
+
+        self.assertEqual(precompress(root)[0], 0)
+        (root / 'tiny.json').write_text('[]')
+        self.assertEqual(precompress(root)[0], 1)
+        self.assertEqual(precompress(root)[0], 0)
+
+    def test_sync_copies_only_changed_files_and_removes_orphans(self):
+        """Test the static sync skips unchanged files, updates changed ones and deletes orphans"""
+        source = Path(self.tmp.name) / 'src'
+        dest = Path(self.tmp.name) / 'dest'
+        (source / 'css').mkdir(parents=True)
+        (source / 'css' / 'a.css').write_text('body {}')
+        (source / 'b.js').write_text('var b;')
+        # Copies rather than hardlinks, so editing a source does not change the destination
+        names, stats = sync_tree([source], dest, link=False)
+        self.assertEqual(names, ['b.js', 'css/a.css'])
+        self.assertEqual(stats.copied, 2)
+
+        (source / 'b.js').write_text('var c;')
+        (dest / 'old.js').write_text('orphan')
+        (dest / 'old.js.gz').write_text('generated')
+        _, stats = sync_tree([source], dest, keep=lambda name: name.endswith('.gz'), link=False)
+        self.assertEqual((stats.skipped, stats.copied, stats.deleted), (1, 1, 1))
+        self.assertEqual(stats.bytes_skipped, len('body {}'))
+        self.assertEqual((dest / 'b.js').read_text(), 'var c;')
+        self.assertFalse((dest / 'old.js').exists())
+        self.assertTrue((dest / 'old.js.gz').exists())
+
+    def test_direct_render_matches_client_render(self):
+        """Test the direct render mode writes the same pages as the full request cycle"""
+        BlogPost.objects.create(
+            title='Beams', content='Content', author=self.user, category=self.category, slug='beams',
+        )
+        self.export('--render', 'client')
+        client_pages = {
+            path: (self.output / path).read_bytes()
+            for path in ('index.html', 'blog.html', 'blog/bridges-101.html', 'blog/beams.html')
+        }
+        self.export()
+        for path, content in client_pages.items():
+            self.assertEqual((self.output / path).read_bytes(), content, path)
+        self.assertIn(b'Beams', client_pages['blog/bridges-101.html'])
+
+    def test_search_index_shards_and_page(self):
+        """Test the search index finds posts and threads by stemmed terms and is sharded by prefix"""
+        question = ForumQuestion.objects.create(
+            title='Load paths', content='Where does the load go?', author=self.user, slug='load-paths',
+        )
+        question.answers.create(content='Through the suspension cables.', author=self.user)
+        self.assertEqual(list(tokenize('The Bridges are loading')), ['bridge', 'load'])
+
+        output = self.export()
+        self.assertIn('Search index: 2 documents', output)
+        html = (self.output / 'index.html').read_text(encoding='utf-8')
+        self.assertIn('action="/search.html"', html)
+        self.assertIn('static-search', (self.output / 'search.html').read_text(encoding='utf-8'))
+
+        search = self.output / 'search'
+        manifest = json.loads((search / 'manifest.json').read_text())
+        self.assertIn('ca', manifest['shards'])
+        cables = json.loads((search / 'index' / 'ca.json').read_text())['cable']
+        docs = json.loads((search / 'docs' / '0.json').read_text())
+        self.assertEqual(docs[cables[0]], ['Load paths', '/forum/load-paths.html'])
+
+        # A tiny shard budget splits prefixes into longer ones
+        build_search_index(self.output, max_shard_bytes=1)
+        manifest = json.loads((search / 'manifest.json').read_text())
+        self.assertIn('cable', manifest['shards'])
+        self.assertFalse((search / 'index' / 'ca.json').exists())
+
+    def test_archive_export_is_reproducible(self):
+        """Test --archive streams the export into zip and tar.gz archives with identical bytes on every run"""
+        import tarfile
+        import zipfile
+        first = Path(self.tmp.name) / 'first.zip'
+        second = Path(self.tmp.name) / 'second.zip'
+        call_command('generate_static_site', '--archive', str(first), stdout=StringIO())
+        call_command('generate_static_site', '--archive', str(second), stdout=StringIO())
+        self.assertEqual(first.read_bytes(), second.read_bytes())
+        self.assertFalse(self.output.exists())
+
+        names = zipfile.ZipFile(first).namelist()
+        for name in ('index.html', 'index.html.gz', 'blog/bridges-101.html', 'sitemap.xml',
+                     'search.html', 'search/manifest.json', 'README.md', '_headers'):
+            self.assertIn(name, names)
+        self.assertNotIn('blog/draft.html', names)
+        self.assertTrue(any(name.startswith('static/css/style.') for name in names))
+
+        tarball = Path(self.tmp.name) / 'site.tar.gz'
+        call_command('generate_static_site', '--archive', str(tarball), stdout=StringIO())
+        with tarfile.open(tarball) as tar:
+            self.assertEqual(tar.getnames(), names)
+            self.assertEqual({member.mtime for member in tar.getmembers()}, {tar.getmembers()[0].mtime})
+
+        with self.assertRaises(CommandError):
+            call_command('generate_static_site', '--archive', str(Path(self.tmp.name) / 'site.rar'), stdout=StringIO())
+
+
+class UploadToCloudinaryTest(TestCase):
+    """Test cases for the upload_to_cloudinary management command"""
+
+    def setUp(self):
+        """Create posts, matching source images and a local stand-in for the storage"""
+        self.user = User.objects.create_user(username='uploader', password='testpass123')
+        self.post = BlogPost.objects.create(
+            title='Time Management', content='Content', author=self.user, slug='time-management',
+        )
+        self.other = BlogPost.objects.create(
+            title='Becoming a Teacher', content='Content', author=self.user, slug='becomeateacher',
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp.name) / 'source'
+        self.target = Path(self.tmp.name) / 'target'
+        self.source.mkdir()
+        for name in ('Time_Management.png', 'BECOMEATEACHER.png', 'unrelated.png', 'notes.txt'):
+            (self.source / name).write_bytes(b'image ' + name.encode())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def upload(self):
+        out = StringIO()
+        call_command(
+            'upload_to_cloudinary', '--source', str(self.source), '--target-dir', str(self.target),
+            '--workers', '2', stdout=out,
+        )
+        return out.getvalue()
+
+    def test_matches_exactly_uploads_and_resumes(self):
+        """Test files are matched by slug or title, uploaded, and skipped on a resumed run"""
+        BlogPost.objects.filter(pk=self.post.pk).update(image_variants={'source': 'blog/old.png'})
+        output = self.upload()
+        self.assertIn('2 uploaded', output)
+        self.assertIn('1 unmatched', output)
+        self.post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.post.featured_image.name, 'blog/Time_Management.png')
+        self.assertEqual(self.post.image_variants, {})
+        self.assertEqual(self.other.featured_image.name, 'blog/BECOMEATEACHER.png')
+        self.assertEqual((self.target / 'blog' / 'Time_Management.png').read_bytes(), b'image Time_Management.png')
+
+        (self.source / 'BECOMEATEACHER.png').write_bytes(b'new image')
+        output = self.upload()
+        self.assertIn('1 uploaded', output)
+        self.assertIn('1 skipped', output)
+
+    def test_retries_with_backoff(self):
+        """Test failed calls are retried with growing delays until they succeed"""
+        from app_onlystudies.media_upload import with_retries
+        calls, delays = [], []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ConnectionError('timeout')
+            return 'ok'
+
+        self.assertEqual(with_retries(flaky, retries=3, backoff=1, sleep=delays.append), ('ok', 3))
+        self.assertEqual(len(delays), 2)
+        self.assertLess(delays[0], delays[1] * 1.5)
+        calls.clear()
+        with self.assertRaises(ConnectionError):
+            with_retries(flaky, retries=1, sleep=delays.append)
+
+
+class ImageVariantsTest(TestCase):
+    """Test cases for responsive featured image variants"""
+
+    def setUp(self):
+        """Store media in a scratch directory and create a post author"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = self.settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        inline = self.settings(IMAGE_VARIANT_WORKERS=0)
+        inline.enable()
+        self.addCleanup(inline.disable)
+        self.user = User.objects.create_user(username='imager', password='testpass123')
+
+    def image_upload(self, name, width=1000, height=500):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), (30, 120, 200)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_creates_variants_and_srcset(self):
+        """Test saving a post with an image stores width variants, a manifest and a srcset"""
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(
+                title='Hero', content='Content', author=self.user, slug='hero',
+                featured_image=self.image_upload('hero.png'),
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['width'], 1000)
+        variants = post.image_variants['variants']['png']
+        self.assertEqual([width for width, name in variants], [320, 480, 640, 960])
+        smallest = variant_name(post.featured_image.name, 320, 'png')
+        self.assertEqual(variants[0][1], smallest)
+        self.assertTrue((Path(self.tmp.name) / smallest).exists())
+
+        modern = [extension for extension, pillow_format, options in MODERN_FORMATS]
+        for extension in modern:
+            self.assertEqual(
+                [width for width, name in post.image_variants['variants'][extension]], [320, 480, 640, 960, 1000],
+            )
+
+        response = self.client.get(reverse('blog_feed'))
+        self.assertContains(response, f'/media/{smallest} 320w')
+        self.assertContains(response, 'sizes="(min-width: 1400px) 440px')
+        for extension in modern:
+            self.assertContains(
+                response,
+                f'<source type="image/{extension}" srcset="/media/'
+                f'{variant_name(post.featured_image.name, 320, extension)} 320w',
+            )
+        feed = self.client.get(reverse('blog_feed_api')).json()['blogs'][0]
+        self.assertEqual(
+            [source['type'] for source in feed['featured_image_sources']], [f'image/{extension}' for extension in modern],
+        )
+
+        post.featured_image = self.image_upload('other.png', width=400, height=200)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        post.refresh_from_db()
+        self.assertEqual([width for width, name in post.image_variants['variants']['png']], [320])
+        self.assertFalse((Path(self.tmp.name) / smallest).exists())
+
+    def test_variants_are_encoded_after_commit_in_the_background(self):
+        """Test saving a post only queues its variants, on the background pool once the transaction commits"""
+        with self.settings(IMAGE_VARIANT_WORKERS=1), mock.patch('app_onlystudies.images.get_executor') as executor:
+            with self.captureOnCommitCallbacks() as callbacks:
+                post = BlogPost.objects.create(
+                    title='Hero', content='Content', author=self.user, slug='hero',
+                    featured_image=self.image_upload('hero.png'),
+                )
+            post.refresh_from_db()
+            self.assertEqual(post.image_variants, {})
+            self.assertEqual(len(callbacks), 1)
+            callbacks[0]()
+        executor.return_value.submit.assert_called_once_with(refresh_in_background, post.pk)
+
+    def test_fallback_format_does_not_depend_on_key_order(self):
+        """Test the <img> srcset uses the original's format even when the database reorders the variants"""
+        storage = FileSystemStorage(location=self.tmp.name, base_url='/media/')
+        variants = {'avif': [[320, 'blog/v/320w.avif']], 'webp': [[320, 'blog/v/320w.webp']]}
+        manifest = {'source': 'blog/hero.webp', 'width': 800, 'format': 'webp', 'variants': variants}
+        self.assertEqual(srcset(manifest, storage), '/media/blog/v/320w.webp 320w, /media/blog/hero.webp 800w')
+        modern = [extension for extension, pillow_format, options in MODERN_FORMATS]
+        self.assertEqual(
+            [mime_type for mime_type, candidates in modern_sources(manifest, storage)],
+            ['image/avif'] if 'avif' in modern else [],
+        )
+        legacy = {**manifest, 'variants': {**variants, 'png': [[320, 'blog/v/320w.png']]}}
+        del legacy['format']
+        self.assertTrue(srcset(legacy, storage).startswith('/media/blog/v/320w.png 320w'))
+
+    def test_manifest_of_a_replaced_image_is_ignored(self):
+        """Test templates and the API ignore variants of an image rewritten without a save"""
+        post = BlogPost.objects.create(
+            title='Hero', content='Content', author=self.user, slug='hero',
+            featured_image=self.image_upload('hero.png'),
+        )
+        smallest = variant_name(post.featured_image.name, 320, 'png')
+        BlogPost.objects.update(featured_image='blog/replaced.png')
+        response = self.client.get(reverse('blog_feed'))
+        self.assertContains(response, '/media/blog/replaced.png')
+        self.assertNotContains(response, smallest)
+        self.assertNotContains(response, '/variants/')
+        self.assertNotContains(response, 'data:image/jpeg')
+        feed = self.client.get(reverse('blog_feed_api')).json()['blogs'][0]
+        self.assertEqual((feed['featured_image_srcset'], feed['featured_image_width']), ('', None))
+
+    def test_backfill_command(self):
+        """Test generate_image_variants fills missing manifests and skips remote images"""
+        post = BlogPost.objects.create(
+            title='Hero', content='Content', author=self.user, slug='hero',
+            featured_image=self.image_upload('hero.png'),
+        )
+        remote = BlogPost.objects.create(
+            title='Remote', content='Content', author=self.user, slug='remote',
+            featured_image='https://res.cloudinary.com/demo/image/upload/hero.png',
+        )
+        BlogPost.objects.update(image_variants={})
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '1', stdout=out)
+        post.refresh_from_db()
+        remote.refresh_from_db()
+        self.assertEqual(len(post.image_variants['variants']['png']), 4)
+        self.assertEqual(remote.image_variants, {'source': remote.featured_image.name})
+        self.assertIn(f'{4 + 5 * len(MODERN_FORMATS)} variant(s) for 1 image(s), 1 skipped', out.getvalue())
+
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '1', stdout=out)
+        self.assertIn('0 image(s) to process', out.getvalue())
+
+    def test_placeholder_and_intrinsic_size(self):
+        """Test uploads get an inline placeholder and size, and the backfill adds placeholders only"""
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(
+                title='Hero', content='Content', author=self.user, slug='hero',
+                featured_image=self.image_upload('hero.png', width=800, height=600),
+            )
+        post.refresh_from_db()
+        placeholder = post.image_variants['placeholder']
+        self.assertTrue(placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(placeholder), 1000)
+
+        response = self.client.get(reverse('blog_feed'))
+        self.assertContains(
+            response, f"object-fit: cover; background: url('{placeholder}') center / cover no-repeat;\" "
+            'width="800" height="600"',
+        )
+        feed = self.client.get(reverse('blog_feed_api')).json()['blogs'][0]
+        self.assertEqual(feed['featured_image_placeholder'], placeholder)
+
+        variants = post.image_variants['variants']
+        legacy = {key: value for key, value in post.image_variants.items() if key != 'placeholder'}
+        BlogPost.objects.update(image_variants=legacy)
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '1', stdout=out)
+        self.assertIn('1 image(s) to process (1 only need a placeholder)', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['placeholder'], placeholder)
+        self.assertEqual(post.image_variants['variants'], variants)
+
+    def test_static_image_conversion(self):
+        """Test static images get smaller AVIF/WebP siblings that are only rewritten when stale"""
+        from app_onlystudies.images import convert_static_image
+        from PIL import Image
+        source = Path(self.tmp.name) / 'logo.png'
+        Image.effect_noise((200, 200), 40).convert('RGB').save(source)
+        written = convert_static_image(source)
+        self.assertEqual([path.name for path in written], [f'logo.{extension}' for extension, *_ in MODERN_FORMATS])
+        for path in written:
+            self.assertLess(path.stat().st_size, source.stat().st_size)
+        self.assertEqual(convert_static_image(source), [])
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Test cases for content-addressed media storage and its maintenance commands"""
+
+    def setUp(self):
+        """Store media in a scratch directory and create a post author"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = self.settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.media = Path(self.tmp.name)
+        self.user = User.objects.create_user(username='hasher', password='testpass123')
+
+    def upload(self, name, content=b'same bytes'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return SimpleUploadedFile(name, content, content_type='image/png')
+
+    def create_post(self, slug, image):
+        return BlogPost.objects.create(title=slug, content='Content', author=self.user, slug=slug, featured_image=image)
+
+    def test_identical_uploads_share_one_reference_counted_object(self):
+        """Test identical uploads resolve to one stored object whose refcount follows the posts"""
+        first = self.create_post('first', self.upload('hero.png'))
+        second = self.create_post('second', self.upload('hero_copy.PNG'))
+        self.assertEqual(first.featured_image.name, second.featured_image.name)
+        self.assertRegex(first.featured_image.name, r'^blog/[0-9a-f]{2}/[0-9a-f]{62}\.png$')
+        self.assertEqual(len([path for path in self.media.rglob('*') if path.is_file()]), 1)
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+
+        second.delete()
+        first = BlogPost.objects.get(pk=first.pk)
+        first.featured_image = self.upload('new.png', b'other bytes')
+        first.save()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 0)
+
+        out = StringIO()
+        call_command('gc_media', stdout=out)
+        self.assertIn('Deleted 0 object(s)', out.getvalue())
+        call_command('gc_media', '--grace-hours', '0', stdout=out)
+        self.assertFalse(MediaBlob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse((self.media / blob.name).exists())
+        self.assertTrue((self.media / first.featured_image.name).exists())
+
+    def test_post_created_with_a_stored_name_counts_its_reference(self):
+        """Test a post created with the stored name of another post's image keeps the object alive"""
+        first = self.create_post('first', self.upload('hero.png'))
+        second = self.create_post('second', first.featured_image.name)
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+
+        first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        call_command('gc_media', '--grace-hours', '0', stdout=StringIO())
+        self.assertTrue((self.media / second.featured_image.name).exists())
+
+    def test_deferred_featured_image(self):
+        """Test saving and deleting posts loaded without their featured image keeps refcounts exact"""
+        post = self.create_post('first', self.upload('hero.png'))
+        blob = MediaBlob.objects.get()
+
+        BlogPost.objects.only('pk', 'title').get(pk=post.pk).save()
+        deferred = BlogPost.objects.defer('featured_image').get(pk=post.pk)
+        deferred.title = 'Renamed'
+        deferred.save()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+
+        deferred = BlogPost.objects.defer('featured_image').get(pk=post.pk)
+        deferred.featured_image = self.upload('new.png', b'other bytes')
+        deferred.save()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 0)
+        self.assertEqual(MediaBlob.objects.get(name=deferred.featured_image.name).refcount, 1)
+
+        BlogPost.objects.defer('featured_image').get(pk=post.pk).delete()
+        self.assertEqual(MediaBlob.objects.get(name=deferred.featured_image.name).refcount, 0)
+
+    def test_dedupe_moves_legacy_files(self):
+        """Test dedupe_media repoints posts at content names and deletes duplicate originals"""
+        blog = self.media / 'blog'
+        blog.mkdir()
+        for name in ('logo.png', 'logo_CBbS82B.png', 'logo_unused.png'):
+            (blog / name).write_bytes(b'logo bytes')
+        (blog / 'other.png').write_bytes(b'other bytes')
+        first = self.create_post('first', 'blog/logo.png')
+        second = self.create_post('second', 'blog/logo_CBbS82B.png')
+
+        call_command('dedupe_media', stdout=StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.featured_image.name, second.featured_image.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.featured_image.name).refcount, 2)
+        self.assertEqual(sorted(path.name for path in blog.iterdir() if path.is_file()), ['other.png'])
+        self.assertEqual((self.media / first.featured_image.name).read_bytes(), b'logo bytes')
+
+    def test_dedupe_rerenders_exported_pages(self):
+        """Test an incremental export re-renders pages of posts dedupe_media repointed"""
+        (self.media / 'blog').mkdir()
+        (self.media / 'blog' / 'logo.png').write_bytes(b'logo bytes')
+        post = self.create_post('logo-post', 'blog/logo.png')
+        output = Path(self.tmp.name) / 'site'
+        call_command('generate_static_site', '--output', str(output), stdout=StringIO())
+        self.assertIn(b'/media/blog/logo.png', (output / 'blog' / 'logo-post.html').read_bytes())
+
+        call_command('dedupe_media', stdout=StringIO())
+        post.refresh_from_db()
+        out = StringIO()
+        call_command('generate_static_site', '--output', str(output), '--incremental', stdout=out)
+        self.assertIn('Generated blog/logo-post.html', out.getvalue())
+        page = (output / 'blog' / 'logo-post.html').read_bytes()
+        self.assertNotIn(b'/media/blog/logo.png', page)
+        self.assertIn(f'/media/{post.featured_image.name}'.encode(), page)
+
+
+class ClearFeaturedImagesTest(TestCase):
+    """Test cases for the clear_featured_images management command"""
+
+    def setUp(self):
+        """Create posts pointing at present and missing image files"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = self.settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        (Path(self.tmp.name) / 'blog').mkdir()
+        (Path(self.tmp.name) / 'blog' / 'present.png').write_bytes(b'image')
+        self.user = User.objects.create_user(username='clearer', password='testpass123')
+        self.category = Category.objects.create(name='Medical', slug='medical')
+        self.present = BlogPost.objects.create(
+            title='Present', content='Content', author=self.user, slug='present', featured_image='blog/present.png',
+        )
+        self.missing = BlogPost.objects.create(
+            title='Missing', content='Content', author=self.user, slug='missing', featured_image='blog/gone.png',
+            category=self.category,
+        )
+
+    def clear(self, *args):
+        out = StringIO()
+        call_command('clear_featured_images', *args, stdout=out)
+        return out.getvalue()
+
+    def test_missing_only_clears_in_one_update_without_touching_updated_at(self):
+        """Test --missing-only clears just the broken reference with a single UPDATE"""
+        updated_at = self.missing.updated_at
+        self.assertIn('Would clear featured images from 1 blog post(s)', self.clear('--missing-only', '--dry-run'))
+        self.assertEqual(BlogPost.objects.get(pk=self.missing.pk).featured_image.name, 'blog/gone.png')
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self.clear('--missing-only')
+        self.assertIn('cleared featured images from 1 blog post(s)', output)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "app_onlystudies_blogpost"')]), 1)
+        self.missing.refresh_from_db()
+        self.present.refresh_from_db()
+        self.assertFalse(self.missing.featured_image)
+        self.assertEqual(self.missing.updated_at, updated_at)
+        self.assertEqual(self.present.featured_image.name, 'blog/present.png')
+
+    def test_filters(self):
+        """Test category, author and date filters narrow the cleared posts"""
+        self.assertIn('No blog posts', self.clear('--author', 'nobody'))
+        self.assertIn('from 1 blog post(s)', self.clear('--category', 'medical'))
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        self.assertIn('No blog posts', self.clear('--since', tomorrow))
+        self.assertIn('from 1 blog post(s)', self.clear('--until', tomorrow))
+        with self.assertRaises(CommandError):
+            self.clear('--since', 'yesterday')
+
+
+class AdminQueryBudgetTest(TestCase):
+    """Test cases for the number of queries admin pages run on large tables"""
+
+    ROWS = 1200
+    # Session, user, count, page of rows, filter choices
+    CHANGELIST_BUDGET = 5
+    # Session, user, object, content type (history link), the objects selected in relation widgets
+    CHANGE_FORM_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create an admin and over a thousand rows of every model, spread over many users"""
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='testpass123')
+        users = User.objects.bulk_create(User(username=f'student{i}') for i in range(50))
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}', slug=f'category-{i}') for i in range(20))
+        SubCategory.objects.bulk_create(
+            SubCategory(category=categories[i % 20], name=f'Sub {i}', slug=f'sub-{i}') for i in range(cls.ROWS)
+        )
+        BlogPost.objects.bulk_create(
+            BlogPost(title=f'Post {i}', content='Content', author=users[i % 50], category=categories[i % 20], slug=f'post-{i}')
+            for i in range(cls.ROWS)
+        )
+        Notification.objects.bulk_create(
+            Notification(user=users[i % 50], title=f'Notice {i}', message='Message') for i in range(cls.ROWS)
+        )
+        questions = ForumQuestion.objects.bulk_create(
+            ForumQuestion(title=f'Question {i}', content='Content', author=users[i % 50], slug=f'question-{i}')
+            for i in range(cls.ROWS)
+        )
+        ForumAnswer.objects.bulk_create(
+            ForumAnswer(question=questions[i % 10], content='Answer', author=users[i % 50]) for i in range(cls.ROWS)
+        )
+        start = timezone.now()
+        Task.objects.bulk_create(
+            Task(title=f'Task {i}', created_by=users[i % 50], category=categories[i % 20], due_date=start)
+            for i in range(cls.ROWS)
+        )
+        Appointment.objects.bulk_create(
+            Appointment(
+                title=f'Appointment {i}', created_by=users[i % 50],
+                appointment_datetime=start + timedelta(hours=i), end_datetime=start + timedelta(hours=i + 1),
+            )
+            for i in range(cls.ROWS)
+        )
+        cls.question = ForumQuestion.objects.create(title='Small question', content='Content', author=users[0])
+        ForumAnswer.objects.bulk_create(
+            ForumAnswer(question=cls.question, content='Answer', author=users[i]) for i in range(5)
+        )
+
+    def setUp(self):
+        """Log in as the admin"""
+        self.client.force_login(self.admin)
+
+    def assertQueryBudget(self, url, budget):
+        """Assert a GET of `url` succeeds with at most `budget` queries"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{url} ran {len(queries)} queries:\n' + '\n'.join(query['sql'] for query in queries),
+        )
+
+    def test_changelists(self):
+        """Test every changelist renders a page of 100 rows within a fixed query budget"""
+        for model in (SubCategory, BlogPost, Notification, ForumQuestion, ForumAnswer, Task, Appointment):
+            with self.subTest(model=model.__name__):
+                self.assertQueryBudget(
+                    reverse(f'admin:app_onlystudies_{model._meta.model_name}_changelist'), self.CHANGELIST_BUDGET,
+                )
+
+    def test_change_forms(self):
+        """Test change forms render within a fixed query budget"""
+        for obj in (
+            SubCategory.objects.first(), BlogPost.objects.first(), Notification.objects.first(), self.question,
+            ForumAnswer.objects.first(), Task.objects.first(), Appointment.objects.first(),
+        ):
+            with self.subTest(model=type(obj).__name__):
+                self.assertQueryBudget(
+                    reverse(f'admin:app_onlystudies_{obj._meta.model_name}_change', args=[obj.pk]),
+                    self.CHANGE_FORM_BUDGET,
+                )
+
+    def test_user_autocomplete(self):
+        """Test user relations render only the selected user and are searched through the autocomplete view"""
+        post = BlogPost.objects.select_related('author').first()
+        response = self.client.get(reverse('admin:app_onlystudies_blogpost_change', args=[post.pk]))
+        self.assertContains(response, 'class="admin-autocomplete" data-ajax--cache="true"', count=2)
+        self.assertContains(response, f'<option value="{post.author.pk}" selected>{post.author.username}</option>', html=True)
+        self.assertEqual(response.content.count(b'>student'), 1)
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'app_onlystudies', 'model_name': 'task', 'field_name': 'created_by', 'term': 'student4',
+        })
+        results = response.json()['results']
+        self.assertEqual([result['text'] for result in results], ['student4'] + [f'student{i}' for i in range(40, 50)])
+
+
+class EstimatedPaginationTest(TestCase):
+    """Test cases for the estimated-count paginator and elided page ranges"""
+
+    def setUp(self):
+        """Create enough published posts for three feed pages"""
+        self.user = User.objects.create_user(username='paginator', password='testpass123')
+        BlogPost.objects.bulk_create(
+            BlogPost(title=f'Post {i}', content='Content', author=self.user, slug=f'post-{i}') for i in range(25)
+        )
+
+    def test_exact_count_without_estimates(self):
+        """Test querysets are counted exactly when the database gives no estimate (SQLite)"""
+        paginator = EstimatedCountPaginator(BlogPost.objects.all(), 10)
+        self.assertEqual(paginator.count, 25)
+        self.assertFalse(paginator.is_estimated)
+
+    def test_large_estimate_skips_count(self):
+        """Test a large estimate replaces COUNT(*) and the feed shows an elided page range"""
+        with mock.patch('app_onlystudies.pagination.estimate_count', return_value=2000000):
+            paginator = EstimatedCountPaginator(BlogPost.objects.all(), 10)
+            self.assertEqual(paginator.num_pages, 200000)
+            self.assertTrue(paginator.is_estimated)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('blog_feed'), {'page': 2})
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql'] and 'blogpost' in query['sql']])
+        self.assertContains(response, '<a class="page-link" href="?page=200000">200000</a>', html=True)
+        self.assertContains(response, '<span class="page-link">…</span>', html=True)
+        self.assertNotContains(response, 'href="?page=100"')
+
+        with mock.patch('app_onlystudies.pagination.estimate_count', return_value=500):
+            paginator = EstimatedCountPaginator(BlogPost.objects.all(), 10)
+            self.assertEqual(paginator.count, 25)
+            self.assertFalse(paginator.is_estimated)
+
+
+    def test_pages_are_not_bounded_by_the_estimate(self):
+        """Test pages past a low estimate open and "next" follows the rows, not the estimate"""
+        with mock.patch.object(EstimatedCountPaginator, 'threshold', 1):
+            with mock.patch('app_onlystudies.pagination.estimate_count', return_value=8):
+                paginator = EstimatedCountPaginator(BlogPost.objects.order_by('pk'), 10)
+                self.assertEqual(paginator.num_pages, 1)
+                self.assertTrue(paginator.page(1).has_next())
+                page = paginator.page(3)
+                self.assertEqual(len(page), 5)
+                self.assertFalse(page.has_next())
+                with self.assertRaises(EmptyPage):
+                    paginator.page(4)
+                response = self.client.get(reverse('blog_feed'), {'page': 3})
+                self.assertEqual(len(response.context['page_obj']), 5)
+
+            with mock.patch('app_onlystudies.pagination.estimate_count', return_value=500):
+                page = EstimatedCountPaginator(BlogPost.objects.order_by('pk'), 10).page(3)
+                self.assertFalse(page.has_next())
+                page = EstimatedCountPaginator(BlogPost.objects.order_by('pk'), 5).page(5)
+                self.assertFalse(page.has_next())
+
+
+class ForumAnswerInlineTest(TestCase):
+    """Test cases for the paginated answers inline of the forum question admin"""
+
+    def setUp(self):
+        """Create a question with more answers than one inline page"""
+        self.admin = User.objects.create_superuser(username='moderator', email='mod@test.com', password='testpass123')
+        self.client.force_login(self.admin)
+        self.question = ForumQuestion.objects.create(title='Busy thread', content='Content', author=self.admin)
+        ForumAnswer.objects.bulk_create(
+            ForumAnswer(question=self.question, content=f'Answer {i}', author=self.admin) for i in range(45)
+        )
+        self.change_url = reverse('admin:app_onlystudies_forumquestion_change', args=[self.question.pk])
+        self.answers_url = reverse('admin:app_onlystudies_forumquestion_answers', args=[self.question.pk])
+
+    def test_change_form_renders_and_saves_first_page(self):
+        """Test the change form holds the first 20 answers and saves them"""
+        response = self.client.get(self.change_url)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 20)
+        self.assertContains(response, 'id="load-more-answers"')
+
+        data = {
+            'title': 'Busy thread', 'slug': self.question.slug, 'author': self.admin.pk, 'content': 'Content',
+            'is_answered': '', '_save': 'Save',
+            f'{formset.prefix}-TOTAL_FORMS': '20', f'{formset.prefix}-INITIAL_FORMS': '20',
+        }
+        for i, form in enumerate(formset.forms):
+            data[f'{formset.prefix}-{i}-id'] = form.instance.pk
+            data[f'{formset.prefix}-{i}-question'] = self.question.pk
+            data[f'{formset.prefix}-{i}-content'] = form.instance.content
+        first = formset.forms[0].instance
+        data[f'{formset.prefix}-0-is_accepted'] = 'on'
+        response = self.client.post(self.change_url, data)
+        self.assertEqual(response.status_code, 302)
+        first.refresh_from_db()
+        self.assertTrue(first.is_accepted)
+
+    def test_accepting_elsewhere_does_not_rebind_submitted_forms(self):
+        """Test answers accepted between rendering and saving the form do not shift the rows it edits"""
+        response = self.client.get(self.change_url)
+        formset = response.context['inline_admin_formsets'][0].formset
+        data = {
+            'title': 'Busy thread', 'slug': self.question.slug, 'author': self.admin.pk, 'content': 'Content',
+            'is_answered': '', '_save': 'Save',
+            f'{formset.prefix}-TOTAL_FORMS': '20', f'{formset.prefix}-INITIAL_FORMS': '20',
+        }
+        for i, form in enumerate(formset.forms):
+            data[f'{formset.prefix}-{i}-id'] = form.instance.pk
+            data[f'{formset.prefix}-{i}-question'] = self.question.pk
+            data[f'{formset.prefix}-{i}-content'] = form.instance.content
+        data[f'{formset.prefix}-19-content'] = 'Edited'
+        ForumAnswer.objects.filter(content='Answer 44').update(is_accepted=True)
+
+        response = self.client.post(self.change_url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ForumAnswer.objects.get(pk=formset.forms[19].instance.pk).content, 'Edited')
+        self.assertEqual(ForumAnswer.objects.count(), 45)
+        self.assertEqual(ForumAnswer.objects.filter(content='Answer 44', is_accepted=True).count(), 1)
+
+    def test_load_more_and_accept(self):
+        """Test further answers page through the JSON view and can be accepted from it"""
+        page = self.client.get(self.answers_url, {'offset': 20}).json()
+        self.assertEqual(len(page['answers']), 20)
+        self.assertEqual(page['next_offset'], 40)
+        page = self.client.get(self.answers_url, {'offset': 40}).json()
+        self.assertEqual([answer['content'] for answer in page['answers']], [f'Answer {i}' for i in range(40, 45)])
+        self.assertIsNone(page['next_offset'])
+        self.assertEqual(self.client.get(self.answers_url, {'offset': 'x'}).status_code, 400)
+
+        last = page['answers'][-1]
+        self.assertEqual(self.client.get(last['accept_url']).status_code, 405)
+        response = self.client.post(last['accept_url'], {'is_accepted': 'true'})
+        self.assertEqual(response.json(), {'id': last['id'], 'is_accepted': True})
+        self.assertTrue(ForumAnswer.objects.get(pk=last['id']).is_accepted)
+
+        User.objects.create_user(username='student', password='testpass123', is_staff=True)
+        self.client.login(username='student', password='testpass123')
+        self.assertEqual(self.client.get(self.answers_url).status_code, 403)
+
+
+class AdminExportTest(TestCase):
+    """Test cases for the streaming CSV/JSONL exports of the admin"""
+
+    def setUp(self):
+        """Create read and unread notifications and log in an admin"""
+        self.admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='testpass123')
+        self.client.force_login(self.admin)
+        for i in range(5):
+            Notification.objects.create(user=self.admin, title=f'Note {i}', message='Hello, "world"', is_read=i < 2)
+        self.changelist_url = reverse('admin:app_onlystudies_notification_changelist')
+
+    def export(self, export_format, query=''):
+        url = reverse('admin:app_onlystudies_notification_export', args=[export_format])
+        return self.client.get(url + query)
+
+    def test_changelist_export_follows_filters(self):
+        """Test the changelist buttons export every filtered row, not just one page"""
+        response = self.client.get(self.changelist_url, {'is_read__exact': '0'})
+        export_url = reverse('admin:app_onlystudies_notification_export', args=['csv'])
+        self.assertContains(response, f'{export_url}?is_read__exact=0')
+
+        response = self.export('csv', '?is_read__exact=0')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="notification-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,user__username,title,message,notification_type,is_read,related_url,created_at')
+        self.assertEqual(len(lines), 4)
+        self.assertIn('"Hello, ""world"""', lines[1])
+
+        response = self.export('jsonl', '?q=Note+4')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Note 4'])
+        self.assertEqual(rows[0]['user__username'], 'admin')
+
+        self.assertEqual(self.export('xml').status_code, 404)
+        self.assertEqual(self.export('csv', '?bogus=1').status_code, 302)
+
+    def test_csv_escapes_formulas(self):
+        """Test CSV cells a spreadsheet would run as formulas are quoted"""
+        Notification.objects.all().delete()
+        for title in ['=HYPERLINK("http://evil")', '+1', '-1', '@SUM(A1)', '\tTab', '\rReturn', 'Plain - text']:
+            Notification.objects.create(user=self.admin, title=title, message='Hi')
+        response = self.export('csv')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(sorted(row[2] for row in rows[1:]), sorted([
+            "'=HYPERLINK(\"http://evil\")", "'+1", "'-1", "'@SUM(A1)", "'\tTab", "'\rReturn", 'Plain - text',
+        ]))
+
+        response = self.export('jsonl', '?q=HYPERLINK')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows[0]['title'], '=HYPERLINK("http://evil")')
+
+    def test_export_selected_action(self):
+        """Test the export actions stream only the selected rows"""
+        selected = Notification.objects.filter(title__in=['Note 1', 'Note 3'])
+        response = self.client.post(self.changelist_url, {
+            'action': 'export_jsonl', '_selected_action': [n.pk for n in selected],
+        })
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(sorted(row['title'] for row in rows), ['Note 1', 'Note 3'])
 
+        User.objects.create_user(username='student', password='testpass123', is_staff=True)
+        self.client.login(username='student', password='testpass123')
+        self.assertEqual(self.export('csv').status_code, 403)
@@ -18,10 +18,16 @@ urlpatterns = [
         views.UpdateTaskView.as_view(), name='edit_task'),
     path('appointments/', 
         views.AppointmentListView.as_view(), name='appointments'),
+    path('appointments/calendar/', 
+        views.AppointmentCalendarView.as_view(), name='appointment_calendar'),
     path('appointments/book/', 
         views.AppointmentCreateView.as_view(), name='book_appointment'),
     path('appointments/<int:pk>/edit/', 
         views.UpdateAppointmentView.as_view(), name='edit_appointment'),
+    path('calendar.ics', 
+        views.calendar_feed, name='calendar_feed'),
+    path('calendar.ics/reset/', 
+        views.rotate_calendar_feed, name='rotate_calendar_feed'),
     path('search/', 
         views.SearchResultsView.as_view(), name='search'),
     path('category/<slug:category_slug>/', 
@@ -70,4 +76,8 @@ urlpatterns = [
         views.blog_feed_api, name='blog_feed_api'),
     path('api/notifications/', 
         views.notifications_api, name='notifications_api'),
+    path('api/appointments/', 
+        views.appointments_api, name='appointments_api'),
+    path('api/appointments/free-slots/', 
+        views.appointment_free_slots_api, name='appointment_free_slots_api'),
 ]
@@ -1,17 +1,36 @@
+import calendar
+import hashlib
+from datetime import timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q
 from django.views.generic import TemplateView, CreateView, ListView, DetailView, DeleteView, UpdateView
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
-from django.urls import reverse_lazy
-from django.views.decorators.http import require_http_methods
-from django.http import HttpResponse, JsonResponse
+from django.urls import reverse, reverse_lazy
+from django.views.decorators.http import condition, require_http_methods
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
 from django.core.exceptions import PermissionDenied
 from .forms import SignUpForm, ForumQuestionForm, ForumAnswerForm, AppointmentForm, BlogPostForm, TaskForm
-from .models import Category, SubCategory, BlogPost, Notification, ForumQuestion, ForumAnswer, Task, Appointment
+from .models import (
+    BlogPost, Notification, ForumQuestion, ForumAnswer, Task, Appointment, CalendarFeedKey,
+    MAX_APPOINTMENT_MINUTES, MIN_APPOINTMENT_MINUTES,
+)
+from . import ical
+from .images import modern_sources, post_manifest, srcset
+from .pagination import EstimatedPaginationMixin
+from .taxonomy import get_taxonomy
+from .static_export import EXPORT_ENVIRON_KEY
+from .scheduling import appointments_between, day_start, group_by_day, next_free_slots
 
 
 class HomePage(TemplateView):
@@ -28,7 +47,7 @@ class AboutView(TemplateView):
     template_name = 'about.html'
 
 
-class TaskListView(LoginRequiredMixin, ListView):
+class TaskListView(LoginRequiredMixin, EstimatedPaginationMixin, ListView):
     """
     List view for tasks with filtering and sorting by due date, priority, and category.
     """
@@ -85,7 +104,7 @@ class TaskListView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx['categories'] = Category.objects.all()
+        ctx['categories'] = get_taxonomy().categories
         ctx['selected'] = {
             'category': self.request.GET.get('category') or '',
             'priority': self.request.GET.get('priority') or '',
@@ -194,12 +213,12 @@ class CategoryView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category_slug = self.kwargs.get('category_slug')
-        category = get_object_or_404(Category, slug=category_slug)
-        subcategories = category.subcategories.all()
+        category = get_taxonomy().get_category(self.kwargs.get('category_slug'))
+        if category is None:
+            raise Http404('No Category matches the given query.')
         
         context['category'] = category
-        context['subcategories'] = subcategories
+        context['subcategories'] = category.subcategory_list
         context['page_title'] = f'{category.name} - OnlyStudies'
         
         return context
@@ -213,13 +232,13 @@ class SubCategoryView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category_slug = self.kwargs.get('category_slug')
-        subcategory_slug = self.kwargs.get('subcategory_slug')
-        
-        category = get_object_or_404(Category, slug=category_slug)
-        subcategory = get_object_or_404(SubCategory, category=category, slug=subcategory_slug)
+        subcategory = get_taxonomy().get_subcategory(
+            self.kwargs.get('category_slug'), self.kwargs.get('subcategory_slug')
+        )
+        if subcategory is None:
+            raise Http404('No SubCategory matches the given query.')
         
-        context['category'] = category
+        context['category'] = subcategory.category
         context['subcategory'] = subcategory
         context['page_title'] = f'{subcategory.name} - OnlyStudies'
         
@@ -236,13 +255,22 @@ def blog_feed_api(request):
     blog_data = []
     
     for post in blog_posts:
+        manifest = post_manifest(post)
         blog_data.append({
             'id': post.id,
             'title': post.title,
             'content': post.content[:200],  # First 200 characters
             'author': post.author.get_full_name() or post.author.username,
             'category': post.category.name if post.category else 'General',
-            'featured_image': post.featured_image.url if post.featured_image else None,
+            'featured_image': post.featured_image_url or None,
+            'featured_image_srcset': srcset(manifest),
+            'featured_image_width': manifest.get('width'),
+            'featured_image_height': manifest.get('height'),
+            'featured_image_placeholder': manifest.get('placeholder') or None,
+            'featured_image_sources': [
+                {'type': mime_type, 'srcset': candidates}
+                for mime_type, candidates in modern_sources(manifest)
+            ],
             'created_at': post.created_at.isoformat(),
             'slug': post.slug,
         })
@@ -279,7 +307,123 @@ def notifications_api(request):
         return JsonResponse({'notifications': [], 'error': str(e)})
 
 
-class NotificationsView(LoginRequiredMixin, ListView):
+def _calendar_feed_sources(request):
+    """
+    Resolve the feed token and build the querysets for the feed window.
+    Memoised on the request so the ETag check and the body share the work.
+    """
+    if not hasattr(request, '_calendar_feed_sources'):
+        user_id = ical.read_feed_token(request.GET.get('token', ''))
+        sources = None
+        if user_id is not None:
+            start, end = ical.feed_window(
+                past_days=settings.CALENDAR_FEED_PAST_DAYS,
+                future_days=settings.CALENDAR_FEED_FUTURE_DAYS,
+            )
+            sources = {
+                'start': start,
+                'appointments': Appointment.objects.filter(
+                    created_by_id=user_id,
+                    appointment_datetime__gte=start,
+                    appointment_datetime__lt=end,
+                ).order_by('appointment_datetime', 'pk'),
+                'tasks': Task.objects.filter(
+                    created_by_id=user_id,
+                    due_date__gte=start,
+                    due_date__lt=end,
+                ).select_related('category').order_by('due_date', 'pk'),
+            }
+        request._calendar_feed_sources = sources
+    return request._calendar_feed_sources
+
+
+def calendar_feed_etag(request):
+    """
+    ETag for a calendar feed: the latest change and row count of each source.
+    Costs two aggregate queries, so polling clients get a cheap 304.
+    """
+    sources = _calendar_feed_sources(request)
+    if sources is None:
+        return None
+    parts = [sources['start'].date().isoformat()]
+    for key in ('appointments', 'tasks'):
+        stats = sources[key].order_by().aggregate(latest=Max('updated_at'), total=Count('pk'))
+        parts.append(f"{stats['total']}:{stats['latest'].timestamp() if stats['latest'] else 0}")
+    return '-'.join(parts)
+
+
+@condition(etag_func=calendar_feed_etag)
+def calendar_feed(request):
+    """
+    iCalendar feed of a user's appointments and dated tasks.
+    Authenticated by a signed per-user token so calendar apps can poll it.
+    """
+    sources = _calendar_feed_sources(request)
+    if sources is None:
+        raise Http404('Unknown calendar feed')
+
+    chunk_size = settings.CALENDAR_FEED_CHUNK_SIZE
+    response = StreamingHttpResponse(
+        ical.iter_calendar(
+            sources['appointments'].iterator(chunk_size=chunk_size),
+            sources['tasks'].iterator(chunk_size=chunk_size),
+            host=request.get_host().split(':')[0],
+        ),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'inline; filename="calendar.ics"'
+    patch_cache_control(response, private=True, max_age=300)
+    return response
+
+
+@require_http_methods(['POST'])
+def rotate_calendar_feed(request):
+    """
+    Revoke the user's calendar feed link and hand out a new one, for when
+    the old link leaked
+    """
+    if not request.user.is_authenticated:
+        messages.error(request, 'You must be logged in to reset your calendar link.')
+        return redirect('login')
+    CalendarFeedKey.rotate(request.user)
+    messages.success(request, 'Your calendar link has been reset. Subscribe again with the new link.')
+    return redirect('appointments')
+
+
+def appointment_free_slots_api(request):
+    """
+    API endpoint listing the user's next free appointment slots
+    Query params: duration (minutes, default 60), after (ISO datetime), count (max 20)
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required'}, status=401)
+
+    try:
+        duration = int(request.GET.get('duration', 60))
+        count = min(int(request.GET.get('count', 5)), 20)
+    except ValueError:
+        return JsonResponse({'detail': 'duration and count must be integers'}, status=400)
+    if not MIN_APPOINTMENT_MINUTES <= duration <= MAX_APPOINTMENT_MINUTES or count < 1:
+        return JsonResponse({
+            'detail': f'duration must be {MIN_APPOINTMENT_MINUTES}-{MAX_APPOINTMENT_MINUTES} minutes '
+                      'and count positive',
+        }, status=400)
+
+    after = None
+    if request.GET.get('after'):
+        after = parse_datetime(request.GET['after'])
+        if after is None:
+            return JsonResponse({'detail': 'after must be an ISO 8601 datetime'}, status=400)
+        if timezone.is_naive(after):
+            after = timezone.make_aware(after)
+
+    slots = next_free_slots(request.user, timedelta(minutes=duration), after=after, count=count)
+    return JsonResponse({
+        'slots': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in slots],
+    })
+
+
+class NotificationsView(LoginRequiredMixin, EstimatedPaginationMixin, ListView):
     """Full notifications list for the current user"""
     model = Notification
     template_name = 'notifications.html'
@@ -290,7 +434,7 @@ class NotificationsView(LoginRequiredMixin, ListView):
         return Notification.objects.filter(user=self.request.user).order_by('-created_at')
 
 
-class BlogFeedView(ListView):
+class BlogFeedView(EstimatedPaginationMixin, ListView):
     """
     View for displaying blog feed
     Shows all published blog posts
@@ -331,17 +475,31 @@ class BlogPostDetailView(DetailView):
         context['page_title'] = context['post'].title
         
         # Get related posts from the same category (exclude current post)
-        post = context['post']
-        related_posts = BlogPost.objects.filter(
-            is_published=True,
-            category=post.category
-        ).exclude(id=post.id).select_related('author', 'category')[:4]
-        context['related_posts'] = related_posts
+        context['related_posts'] = self.get_related_posts(context['post'])
         
         return context
 
+    def get_related_posts(self, post, limit=4):
+        """
+        Up to `limit` other published posts from the post's category.
+        The static exporter attaches a per-process `static_export_cache` to
+        its requests; the newest posts of each category are then fetched once
+        and shared by every post of that category.
+        """
+        posts = BlogPost.objects.filter(
+            is_published=True,
+            category_id=post.category_id
+        ).select_related('author', 'category')
+        cache = getattr(self.request, 'static_export_cache', None)
+        if cache is None:
+            return posts.exclude(id=post.id)[:limit]
+        key = ('related_posts', post.category_id)
+        if key not in cache:
+            cache[key] = list(posts[:limit + 1])
+        return [related for related in cache[key] if related.pk != post.pk][:limit]
 
-class ForumView(ListView):
+
+class ForumView(EstimatedPaginationMixin, ListView):
     """
     View for displaying forum questions
     """
@@ -358,7 +516,7 @@ class ForumView(ListView):
         """Add additional context"""
         context = super().get_context_data(**kwargs)
         context['page_title'] = 'Student Forum'
-        context['categories'] = Category.objects.all()
+        context['categories'] = get_taxonomy().categories
         return context
 
 
@@ -371,10 +529,11 @@ class ForumQuestionDetailView(DetailView):
     context_object_name = 'question'
     
     def get_object(self):
-        """Get question and increment view count"""
+        """Get question and increment view count (not for static export renders)"""
         question = get_object_or_404(ForumQuestion, slug=self.kwargs['slug'])
-        question.views += 1
-        question.save(update_fields=['views'])
+        if not self.request.META.get(EXPORT_ENVIRON_KEY):
+            question.views += 1
+            question.save(update_fields=['views'])
         return question
     
     def get_context_data(self, **kwargs):
@@ -412,7 +571,7 @@ class AskQuestionView(LoginRequiredMixin, CreateView):
         return context
 
 
-class AppointmentListView(LoginRequiredMixin, ListView):
+class AppointmentListView(LoginRequiredMixin, EstimatedPaginationMixin, ListView):
     """
     List all appointments for the current user.
     """
@@ -423,14 +582,132 @@ class AppointmentListView(LoginRequiredMixin, ListView):
     login_url = reverse_lazy('login')
 
     def get_queryset(self):
-        return Appointment.objects.filter(created_by=self.request.user).order_by('appointment_datetime')
+        """Upcoming appointments by default; ?show=past lists history, newest first"""
+        qs = Appointment.objects.filter(created_by=self.request.user)
+        if self.request.GET.get('show') == 'past':
+            return qs.filter(end_datetime__lt=timezone.now()).order_by('-appointment_datetime')
+        return qs.filter(end_datetime__gte=timezone.now()).order_by('appointment_datetime')
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx['page_title'] = 'My Appointments'
+        ctx['show_past'] = self.request.GET.get('show') == 'past'
+        ctx['calendar_feed_url'] = self.request.build_absolute_uri(
+            f"{reverse('calendar_feed')}?token={ical.make_feed_token(self.request.user)}"
+        )
+        return ctx
+
+
+class AppointmentCalendarView(LoginRequiredMixin, TemplateView):
+    """
+    Month or week calendar of the current user's appointments.
+    Only the visible window is queried, in a single range query.
+    """
+    template_name = 'appointment_calendar.html'
+    login_url = reverse_lazy('login')
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        mode = 'week' if self.request.GET.get('view') == 'week' else 'month'
+        anchor = parse_date(self.request.GET.get('date') or '') or timezone.localdate()
+
+        if mode == 'week':
+            first_day = anchor - timedelta(days=anchor.weekday())
+            last_day = first_day + timedelta(days=6)
+            previous_date, next_date = first_day - timedelta(days=7), first_day + timedelta(days=7)
+            heading = f"Week of {first_day:%b %d, %Y}"
+        else:
+            weeks = calendar.Calendar().monthdatescalendar(anchor.year, anchor.month)
+            first_day, last_day = weeks[0][0], weeks[-1][-1]
+            month_start = anchor.replace(day=1)
+            previous_date = (month_start - timedelta(days=1)).replace(day=1)
+            next_date = (month_start + timedelta(days=31)).replace(day=1)
+            heading = f"{month_start:%B %Y}"
+
+        days = group_by_day(
+            appointments_between(self.request.user, day_start(first_day), day_start(last_day + timedelta(days=1))),
+            first_day,
+            last_day,
+        )
+        cells = [
+            {'date': day, 'appointments': items, 'in_month': mode == 'week' or day.month == anchor.month}
+            for day, items in days.items()
+        ]
+        ctx.update({
+            'page_title': 'Appointment Calendar',
+            'view_mode': mode,
+            'heading': heading,
+            'weeks': [cells[i:i + 7] for i in range(0, len(cells), 7)],
+            'today': timezone.localdate(),
+            'anchor': anchor,
+            'previous_date': previous_date,
+            'next_date': next_date,
+        })
         return ctx
 
 
+def appointments_api(request):
+    """
+    API endpoint returning the user's appointments between two dates, grouped per day
+    Query params: start, end (YYYY-MM-DD, inclusive; at most 62 days apart)
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required'}, status=401)
+
+    first_day = parse_date(request.GET.get('start') or '')
+    last_day = parse_date(request.GET.get('end') or '')
+    if first_day is None or last_day is None:
+        return JsonResponse({'detail': 'start and end must be YYYY-MM-DD dates'}, status=400)
+    if not 0 <= (last_day - first_day).days <= settings.APPOINTMENTS_API_MAX_DAYS:
+        return JsonResponse(
+            {'detail': f'end must be on or after start and at most {settings.APPOINTMENTS_API_MAX_DAYS} days later'},
+            status=400,
+        )
+
+    appointments = list(appointments_between(
+        request.user, day_start(first_day), day_start(last_day + timedelta(days=1))
+    ))
+
+    # Validators come from the rows already fetched: no extra query
+    fingerprint = hashlib.md5(f'{first_day}:{last_day}'.encode())
+    for appointment in appointments:
+        fingerprint.update(f'|{appointment.pk}:{appointment.updated_at.timestamp()}'.encode())
+    etag = f'"{fingerprint.hexdigest()}"'
+    last_modified = max((a.updated_at for a in appointments), default=None)
+    last_modified = last_modified.timestamp() if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        days = group_by_day(appointments, first_day, last_day)
+        response = JsonResponse({
+            'start': first_day.isoformat(),
+            'end': last_day.isoformat(),
+            'days': [
+                {
+                    'date': day.isoformat(),
+                    'appointments': [
+                        {
+                            'id': appointment.id,
+                            'title': appointment.title,
+                            'notes': appointment.notes,
+                            'start': appointment.appointment_datetime.isoformat(),
+                            'end': appointment.end_datetime.isoformat(),
+                            'duration_minutes': appointment.duration_minutes,
+                            'url': reverse('edit_appointment', args=[appointment.id]),
+                        }
+                        for appointment in items
+                    ],
+                }
+                for day, items in days.items()
+            ],
+        })
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 class AppointmentCreateView(LoginRequiredMixin, CreateView):
     """
     Simple booking view for creating an appointment.
@@ -440,10 +717,22 @@ class AppointmentCreateView(LoginRequiredMixin, CreateView):
     template_name = 'book_appointment.html'
     login_url = reverse_lazy('login')
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
         form.instance.created_by = self.request.user
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except IntegrityError:
+            # Lost a race against a concurrent booking (PostgreSQL exclusion constraint)
+            form.add_error('appointment_datetime', 'This time slot was just booked. Please pick another.')
+            return self.form_invalid(form)
         messages.success(self.request, 'Your appointment has been booked successfully!')
-        return super().form_valid(form)
+        return response
 
     def get_success_url(self):
         return reverse_lazy('appointments')
@@ -632,10 +921,21 @@ class UpdateAppointmentView(LoginRequiredMixin, UpdateView):
             return redirect('appointments')
         return super().dispatch(request, *args, **kwargs)
     
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
         """Update the appointment and show success message"""
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except IntegrityError:
+            form.add_error('appointment_datetime', 'This time slot was just booked. Please pick another.')
+            return self.form_invalid(form)
         messages.success(self.request, 'Your appointment has been updated successfully!')
-        return super().form_valid(form)
+        return response
     
     def get_success_url(self):
         """Redirect back to appointments"""
@@ -104,6 +104,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app_onlystudies.context_processors.taxonomy',
             ],
         },
     },
@@ -125,6 +126,20 @@ DATABASES = {
    'default': dj_database_url.parse(os.environ.get("DATABASE_URL"))
 }
 
+# `default` is Django's own per-process cache. `taxonomy` holds the
+# taxonomy's version key and is shared by every worker process and dyno, so
+# a change reaches all of them at once. Create its table with
+# `python manage.py createcachetable` (run on release, see Procfile).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'taxonomy': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+}
+
 
 
 # Password validation
@@ -195,6 +210,24 @@ else:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Calendar feed (/calendar.ics) window and streaming batch size
+CALENDAR_FEED_PAST_DAYS = int(os.environ.get('CALENDAR_FEED_PAST_DAYS', 30))
+CALENDAR_FEED_FUTURE_DAYS = int(os.environ.get('CALENDAR_FEED_FUTURE_DAYS', 365))
+CALENDAR_FEED_CHUNK_SIZE = 500
+
+# Rows fetched per query by the streaming admin CSV/JSONL exports
+ADMIN_EXPORT_CHUNK_SIZE = 2000
+
+# Background threads per process encoding featured image variants after a
+# post is saved (0: encode in the saving thread once its transaction commits)
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 1))
+
+# Widest window /api/appointments/?start=&end= will serve in one request
+APPOINTMENTS_API_MAX_DAYS = 62
+
+# Public URL the static export is hosted at (used for sitemap locations)
+STATIC_EXPORT_BASE_URL = os.environ.get('STATIC_EXPORT_BASE_URL', 'http://localhost:8000')
+
 # Django Allauth Configuration
 SITE_ID = 1
 
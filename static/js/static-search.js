@@ -0,0 +1,134 @@
+/*
+ * Search for the static site export.
+ *
+ * Reads ?q= from the page URL, fetches only the index shards for the query
+ * terms (see app_onlystudies/static_export/search.py for the format), ranks
+ * documents containing every term by summed term frequency, and fetches the
+ * document shards needed for the results shown.
+ */
+(function () {
+    'use strict';
+
+    var root = document.getElementById('static-search');
+    if (!root) {
+        return;
+    }
+    var base = root.getAttribute('data-index-url');
+    var maxResults = 50;
+
+    var STOP_WORDS = new Set((
+        'a an and are as at be but by can do for from has have how i if in into is it its of on or ' +
+        'so that the their then there these this to was we what when where which who why will with ' +
+        'you your').split(' '));
+    // Must stay in sync with SUFFIX_RULES in search.py
+    var SUFFIX_RULES = [['sses', 'ss', 2], ['ies', 'y', 2], ['ing', '', 3], ['ed', '', 3], ['ly', '', 3], ['s', '', 3]];
+
+    function stem(word) {
+        for (var i = 0; i < SUFFIX_RULES.length; i++) {
+            var suffix = SUFFIX_RULES[i][0];
+            if (word.endsWith(suffix) && word.length - suffix.length >= SUFFIX_RULES[i][2]) {
+                if (suffix === 's' && /(ss|us|is)$/.test(word)) {
+                    return word;
+                }
+                return word.slice(0, word.length - suffix.length) + SUFFIX_RULES[i][1];
+            }
+        }
+        return word;
+    }
+
+    function tokenize(text) {
+        var words = text.toLowerCase().match(/[a-z0-9]+/g) || [];
+        return words.filter(function (word) {
+            return word.length > 1 && !STOP_WORDS.has(word);
+        }).map(stem);
+    }
+
+    var cache = {};
+    function fetchJSON(path) {
+        if (!cache[path]) {
+            cache[path] = fetch(base + path).then(function (response) {
+                return response.ok ? response.json() : {};
+            });
+        }
+        return cache[path];
+    }
+
+    function shardFor(term, prefixes) {
+        // Longest shard prefix the term starts with
+        for (var length = term.length; length > 0; length--) {
+            if (prefixes.has(term.slice(0, length))) {
+                return term.slice(0, length);
+            }
+        }
+        return null;
+    }
+
+    function decode(flat) {
+        var postings = new Map();
+        var doc = 0;
+        for (var i = 0; i < flat.length; i += 2) {
+            doc += flat[i];
+            postings.set(doc, flat[i + 1]);
+        }
+        return postings;
+    }
+
+    function search(query, manifest) {
+        var terms = Array.from(new Set(tokenize(query)));
+        var prefixes = new Set(manifest.shards);
+        return Promise.all(terms.map(function (term) {
+            var shard = shardFor(term, prefixes);
+            return shard === null ? {} : fetchJSON('index/' + shard + '.json');
+        })).then(function (shards) {
+            var scores = null;
+            terms.forEach(function (term, i) {
+                var postings = decode(shards[i][term] || []);
+                var next = new Map();
+                postings.forEach(function (count, doc) {
+                    if (scores === null || scores.has(doc)) {
+                        next.set(doc, (scores === null ? 0 : scores.get(doc)) + count);
+                    }
+                });
+                scores = next;
+            });
+            return Array.from(scores || []).sort(function (a, b) {
+                return b[1] - a[1] || a[0] - b[0];
+            }).slice(0, maxResults).map(function (entry) {
+                return entry[0];
+            });
+        }).then(function (docs) {
+            return Promise.all(docs.map(function (doc) {
+                return fetchJSON('docs/' + Math.floor(doc / manifest.docs_per_shard) + '.json').then(function (shard) {
+                    return shard[doc % manifest.docs_per_shard];
+                });
+            }));
+        });
+    }
+
+    function render(query, results) {
+        var list = root.querySelector('[data-results]');
+        var summary = root.querySelector('[data-summary]');
+        list.textContent = '';
+        summary.textContent = results.length
+            ? results.length + ' result(s) for "' + query + '"'
+            : 'No results for "' + query + '"';
+        results.forEach(function (result) {
+            var link = document.createElement('a');
+            link.className = 'list-group-item list-group-item-action';
+            link.href = result[1];
+            link.textContent = result[0];
+            list.appendChild(link);
+        });
+    }
+
+    var query = new URLSearchParams(window.location.search).get('q') || '';
+    root.querySelector('input[name="q"]').value = query;
+    if (!tokenize(query).length) {
+        return;
+    }
+    fetchJSON('manifest.json').then(function (manifest) {
+        return search(query, manifest);
+    }).then(function (results) {
+        render(query, results);
+    });
+})();